@@ -0,0 +1,243 @@
+"""
+Batched article writer for collection runs
+
+Buffers collected articles and writes them with one bulk
+INSERT ... ON CONFLICT (url) DO UPDATE per batch, followed by one bulk
+INSERT ... ON CONFLICT DO NOTHING into article_keyword. This replaces the
+per-article transaction of store_article_in_db during collection. Works on
+SQLite and PostgreSQL and keeps the same upgrade rules for existing rows:
+images are only replaced when the stored one is missing or a placeholder,
+and content only when the stored one is empty, short or a placeholder.
+Each batch is also tagged locally with every active keyword its articles
+mention (see keyword_tagger), and the daily rollups of the days its
+articles were published on are recomputed (see rollups).
+"""
+
+import os
+import logging
+import datetime
+from sqlalchemy import and_, case, func, not_, or_, select
+
+from models import db, Article, article_keyword
+from fetch_thumbnails import placeholder_image_condition
+from keyword_tagger import TAG_NEW_ARTICLES, get_matcher
+from rollups import refresh_rollups_for_articles
+from response_cache import bump_data_version
+
+# Number of articles buffered before a flush
+DEFAULT_BATCH_SIZE = int(os.environ.get("ARTICLE_BATCH_SIZE", "50"))
+
+# Stored content shorter than this, or containing the marker, may be replaced
+MIN_CONTENT_LENGTH = 100
+PLACEHOLDER_CONTENT_MARKER = "This article is sourced from Google News"
+
+def dialect_insert(table):
+    """
+    Get a dialect-specific INSERT that supports ON CONFLICT clauses
+
+    Args:
+        table: The SQLAlchemy table to insert into
+
+    Returns:
+        An insert construct for the bound database's dialect
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Bulk upserts are not supported on {dialect}")
+    return insert(table)
+
+def is_thin_content(content):
+    """Check whether stored content is empty, short or a placeholder and may be replaced."""
+    return not content or len(content) < MIN_CONTENT_LENGTH or PLACEHOLDER_CONTENT_MARKER in content
+
+def is_substantial_content(content):
+    """Check whether new content is good enough to replace thin content."""
+    return bool(content) and len(content) > MIN_CONTENT_LENGTH and PLACEHOLDER_CONTENT_MARKER not in content
+
+def thin_content_condition(column):
+    """SQL equivalent of is_thin_content for a content column."""
+    return or_(column.is_(None),
+               func.length(column) < MIN_CONTENT_LENGTH,
+               column.contains(PLACEHOLDER_CONTENT_MARKER))
+
+def substantial_content_condition(column):
+    """SQL equivalent of is_substantial_content for a content column."""
+    return and_(func.length(func.coalesce(column, '')) > MIN_CONTENT_LENGTH,
+                not_(func.coalesce(column, '').contains(PLACEHOLDER_CONTENT_MARKER)))
+
+def ensure_article_image(article_data):
+    """
+    Fill in an image for a collected article that has none
+
+    Mirrors store_article_in_db: try the article's page for a thumbnail and
+    fall back to a branded placeholder. This may hit the network, so callers
+    should run it before handing the article to the writer.
+
+    Args:
+        article_data (dict): The collected article, updated in place
+    """
+    from main import get_image_from_og_tags, generate_placeholder_image
+
+    if article_data.get('image_url'):
+        return
+
+    og_image = get_image_from_og_tags(article_data['url'])
+    if og_image:
+        article_data['image_url'] = og_image
+        logging.info(f"Found OG image for article: {article_data['title']}")
+    else:
+        article_data['image_url'] = generate_placeholder_image(article_data['title'], article_data.get('source') or "unknown")
+        logging.info(f"Generated placeholder image for: {article_data['title']}")
+
+class ArticleBatchWriter:
+    """
+    Buffer collected articles and write them to the database in batches
+
+    Must be used inside an app context. Use it as a context manager so the
+    last partial batch is flushed on exit:
+
+        with ArticleBatchWriter(batch_size=100) as writer:
+            writer.add(article, [keyword.id])
+
+    After flushing, stored maps every written URL to its article ID.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = max(int(batch_size), 1)
+        self.pending = {}
+        self.stored = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def add(self, article_data, keyword_ids):
+        """
+        Buffer an article and flush when the batch is full
+
+        Args:
+            article_data (dict): Collected article with title, url, source,
+                published_date and optional content, summary and image_url
+            keyword_ids (iterable): Keywords to associate with the article
+        """
+        ensure_article_image(article_data)
+
+        # The same URL can arrive from several keywords; merge before the upsert
+        url = article_data['url']
+        if url in self.pending:
+            self.pending[url][1].update(keyword_ids)
+        else:
+            self.pending[url] = (article_data, set(keyword_ids))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered articles and keyword associations in one transaction
+
+        If the bulk write fails, the batch is retried article by article
+        through store_article_in_db so one bad row doesn't lose the batch.
+
+        Returns:
+            dict: Maps each URL in the batch to its article ID
+        """
+        if not self.pending:
+            return {}
+
+        batch = self.pending
+        self.pending = {}
+        if TAG_NEW_ARTICLES:
+            self._tag_batch(batch)
+
+        try:
+            url_to_id = self._write_batch(batch)
+            db.session.commit()
+            logging.info(f"Flushed batch of {len(batch)} articles")
+        except Exception as e:
+            logging.error(f"Error flushing article batch, storing articles one by one: {str(e)}")
+            db.session.rollback()
+            url_to_id = self._write_one_by_one(batch)
+
+        refresh_rollups_for_articles(url_to_id.values())
+        if url_to_id:
+            bump_data_version()
+        self.stored.update(url_to_id)
+        return url_to_id
+
+    def _tag_batch(self, batch):
+        """Add the keywords each article mentions to the keywords it was found for."""
+        try:
+            matcher = get_matcher()
+        except Exception as e:
+            logging.error(f"Error loading keyword tagger: {str(e)}")
+            db.session.rollback()
+            return
+        for article, keyword_ids in batch.values():
+            keyword_ids.update(matcher.match(article['title'], article.get('summary'), article.get('content')))
+
+    def _write_batch(self, batch):
+        table = Article.__table__
+        now = datetime.datetime.utcnow()
+        rows = [{
+            'title': article['title'],
+            'url': url,
+            'source': article['source'],
+            'published_date': article['published_date'],
+            'content': article.get('content', ''),
+            'summary': article.get('summary', ''),
+            'image_url': article.get('image_url'),
+            'collected_at': now
+        } for url, (article, _) in batch.items()]
+
+        stmt = dialect_insert(table).values(rows)
+        new = stmt.excluded
+
+        # Only upgrade placeholder images, and only with a real image
+        upgrade_image = and_(placeholder_image_condition(table.c.image_url),
+                             not_(placeholder_image_condition(new.image_url)))
+
+        # Only upgrade empty, short or placeholder content, and only with substantial content
+        upgrade_content = and_(thin_content_condition(table.c.content),
+                               substantial_content_condition(new.content))
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.url],
+            set_={
+                'image_url': case((upgrade_image, new.image_url), else_=table.c.image_url),
+                'content': case((upgrade_content, new.content), else_=table.c.content),
+                'summary': case((upgrade_content, new.summary), else_=table.c.summary)
+            }
+        )
+        db.session.execute(stmt)
+
+        url_to_id = dict(db.session.execute(
+            select(table.c.url, table.c.id).where(table.c.url.in_(list(batch)))
+        ).all())
+
+        links = [
+            {'article_id': url_to_id[url], 'keyword_id': keyword_id}
+            for url, (_, keyword_ids) in batch.items() if url in url_to_id
+            for keyword_id in keyword_ids
+        ]
+        if links:
+            db.session.execute(dialect_insert(article_keyword).values(links).on_conflict_do_nothing())
+
+        return url_to_id
+
+    def _write_one_by_one(self, batch):
+        from main import store_article_in_db
+
+        url_to_id = {}
+        for url, (article, keyword_ids) in batch.items():
+            article_id = store_article_in_db(article, list(keyword_ids))
+            if article_id:
+                url_to_id[url] = article_id
+        return url_to_id
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Concurrent collection engine for social commerce news
+
+Fans out the Google News RSS fetches, URL unwrapping and article downloads
+with asyncio instead of walking every keyword serially. Outbound work is
+bounded by a global concurrency limit and a per-host limit so a single
+publisher is never hit by more than a few requests at once. The blocking
+fetchers from main.py run in worker threads and articles are written through
+the same ArticleBatchWriter as the serial collector, so storage semantics match.
+As in the serial collector, feed entries are coalesced by article URL across
+keywords before any content is downloaded.
+
+Usage:
+  python async_collector.py [--max-concurrency=16] [--per-host=2] [--parse-workers=N] [--no-content] [--full-rescan] [--resume]
+
+Options:
+  --max-concurrency=N   Maximum number of requests in flight (default: 16)
+  --per-host=N          Maximum requests in flight per host (default: 2)
+  --parse-workers=N     Processes for HTML parsing and extraction, 0 to parse
+                        in the fetch threads (default: EXTRACTION_WORKERS or 0)
+  --no-content          Only store feed metadata, skip article downloads
+  --full-rescan         Ignore keyword watermarks and process every feed entry
+  --resume              Resume the latest unfinished collection run
+"""
+
+import os
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import http_client
+import rate_limiter
+from page_fetch import clear_page_cache
+from extraction import EXTRACTION_WORKERS, configure_extraction
+from url_resolver import flush_resolved_urls
+from thumbnail_cache import flush_thumbnail_cache
+from domain_health import load_domain_health, save_domain_health
+from domain_profiles import load_domain_profiles, save_domain_profiles
+from watermarks import load_keyword_watermarks, filter_entries_by_watermark, split_feed_entries, advance_watermark, save_keyword_watermarks
+from collection_runs import RunTracker, CollectionRunFailed
+from article_writer import ArticleBatchWriter, ensure_article_image, DEFAULT_BATCH_SIZE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("COLLECTOR_MAX_CONCURRENCY", "16"))
+DEFAULT_PER_HOST_CONCURRENCY = int(os.environ.get("COLLECTOR_PER_HOST_CONCURRENCY", "2"))
+DEFAULT_MAX_ERRORS = int(os.environ.get("COLLECTOR_MAX_ERRORS", "3"))
+
+def _in_app_context(func, *args):
+    """Run a database helper from a worker thread in its own app context."""
+    from main import app
+
+    with app.app_context():
+        return func(*args)
+
+class HostLimiter:
+    """
+    Global and per-host concurrency limits for outbound requests
+
+    The per-host slot is acquired before the global one so requests queued
+    behind a busy publisher never hold global capacity other hosts could use.
+    While the fetch thread sleeps for a rate limit token (e.g. for the
+    throttled Google News feeds), both slots are handed back and taken again
+    afterwards, so a throttled host doesn't idle capacity other hosts need.
+    """
+
+    def __init__(self, max_concurrency, per_host_concurrency):
+        self.global_slots = asyncio.Semaphore(max_concurrency)
+        self.host_slots = defaultdict(lambda: asyncio.Semaphore(per_host_concurrency))
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = urlparse(url).netloc.lower()
+        async with self.host_slots[host]:
+            async with self.global_slots:
+                token = rate_limiter.set_wait_hook(_SlotPause(self.host_slots[host], self.global_slots))
+                try:
+                    yield
+                finally:
+                    rate_limiter.reset_wait_hook(token)
+
+class _SlotPause:
+    """Rate limiter wait hook that frees a task's slots from its fetch thread while it sleeps."""
+
+    def __init__(self, host_slot, global_slot):
+        self.loop = asyncio.get_running_loop()
+        self.host_slot = host_slot
+        self.global_slot = global_slot
+
+    def pause(self):
+        if self._in_loop():
+            return
+        self.loop.call_soon_threadsafe(self.global_slot.release)
+        self.loop.call_soon_threadsafe(self.host_slot.release)
+
+    def resume(self):
+        if self._in_loop():
+            return
+        asyncio.run_coroutine_threadsafe(self._reacquire(), self.loop).result()
+
+    async def _reacquire(self):
+        # Same order as slot(), so slots are never taken in opposite orders
+        await self.host_slot.acquire()
+        await self.global_slot.acquire()
+
+    def _in_loop(self):
+        """Sleeps on the event loop thread itself can't hand slots back."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+class CollectionState:
+    """Shared limits, writer, counters and results for a single concurrent collection run."""
+
+    def __init__(self, limiter, writer, collect_content, max_errors, watermarks, tracker, should_stop=None):
+        self.limiter = limiter
+        self.writer = writer
+        self.collect_content = collect_content
+        # Writes are serialized so SQLite never sees concurrent writers
+        self.store_lock = asyncio.Lock()
+        self.max_errors = max_errors
+        self.error_count = 0
+        self.aborted = False
+        self.status = 'completed'
+        self.collected = []
+        self.watermarks = watermarks
+        self.tracker = tracker
+        self.should_stop = should_stop
+        # Unwrapped articles by feed link, and URLs that were already stored
+        self.articles_by_link = {}
+        self.known_urls = {}
+
+    def stopping(self):
+        """Check whether new work should be skipped, after too many errors or on request."""
+        if not self.aborted and self.should_stop and self.should_stop():
+            logging.info("Collection stopped on request")
+            self.aborted = True
+            self.status = 'cancelled'
+        return self.aborted
+
+    def record_error(self, stage, error):
+        self.tracker.record_error(stage, error)
+        self.error_count += 1
+        if self.error_count >= self.max_errors and not self.aborted:
+            logging.warning(f"Too many errors ({self.error_count}), stopping article collection")
+            self.aborted = True
+            self.status = 'aborted'
+
+def _checkpoint_keyword(state, keyword, complete):
+    """
+    Flush the writer and checkpoint a keyword's articles
+
+    A complete keyword has its watermark advanced past the entries whose
+    article was stored or already known, and is skipped if the run is
+    resumed. Otherwise only its URLs are recorded. Runs in an app context
+    with the store lock held.
+    """
+    state.writer.flush()
+    stored_urls = [url for url in keyword['queued'] if url in state.writer.stored]
+    if not complete:
+        state.tracker.record_urls(keyword['id'], stored_urls, keyword['failed'])
+        return
+    for url in set(keyword['queued']) - set(stored_urls):
+        state.tracker.record_error('store', f"Article not stored: {url}")
+    # Entries whose article failed to unwrap or store stay below the watermark
+    handled, failed_entries = split_feed_entries(
+        keyword['entries'], state.articles_by_link,
+        lambda url: url in state.known_urls or url in state.writer.stored or state.tracker.url_stored(url))
+    save_keyword_watermarks({keyword['id']: {
+        'watermark': advance_watermark(state.watermarks.get(keyword['id']), handled, failed_entries),
+        'new_count': len(keyword['entries']),
+        'skipped_count': keyword['skipped']
+    }})
+    state.tracker.complete_keyword(keyword['id'], stored_urls, keyword['failed'])
+
+async def _process_article(article, keyword_ids, keyword_name, state):
+    """
+    Download one article's content and queue it for the batched writer with all its keywords
+
+    Returns:
+        bool or None: True if the article was queued, False if it failed,
+            None if it was skipped because the run is stopping
+    """
+    from main import fetch_article_content
+
+    if state.stopping():
+        return None
+
+    try:
+        # Fetch full content if requested, then resolve an image while the page is still cached
+        async with state.limiter.slot(article['url']):
+            if state.collect_content:
+                state.tracker.record_fetch()
+                # In an app context, so the URL resolver and thumbnail cache use their database tiers
+                content_data = await asyncio.to_thread(_in_app_context, fetch_article_content, article['url'])
+                article.update(content_data)
+            await asyncio.to_thread(_in_app_context, ensure_article_image, article)
+
+        if state.aborted:
+            return None
+
+        async with state.store_lock:
+            await asyncio.to_thread(_in_app_context, state.writer.add, article, keyword_ids)
+        state.collected.append((article, keyword_name))
+        return True
+    except Exception as article_err:
+        logging.error(f"Error processing article {article.get('title', 'Unknown')}: {str(article_err)}")
+        state.record_error('content', article_err)
+        return False
+
+async def _unwrap_entry(entry, state):
+    """Resolve a feed entry to an article dict, or None on failure."""
+    from main import article_from_feed_entry
+
+    if state.stopping():
+        return None
+
+    try:
+        async with state.limiter.slot(entry.get('link', '')):
+            return await asyncio.to_thread(_in_app_context, article_from_feed_entry, entry)
+    except Exception as e:
+        logging.error(f"Error unwrapping feed entry {entry.get('link', '')}: {str(e)}")
+        state.tracker.record_error('unwrap', e)
+        return None
+
+async def _fetch_keyword_feed(keyword_id, keyword_name, state):
+    """Fetch one keyword's feed, returning (entries, skipped) or None on failure."""
+    from main import fetch_google_news_entries
+
+    if state.tracker.keyword_done(keyword_id) or state.stopping():
+        return None
+
+    logging.info(f"Fetching news for keyword: {keyword_name}")
+    try:
+        async with state.limiter.slot("https://news.google.com/rss"):
+            entries = await asyncio.to_thread(fetch_google_news_entries, keyword_name)
+    except Exception as e:
+        logging.error(f"Error fetching news for keyword '{keyword_name}': {str(e)}")
+        state.tracker.record_error('feed', e)
+        return None
+
+    # Drop entries already collected by earlier runs
+    entries, skipped = filter_entries_by_watermark(entries, state.watermarks.get(keyword_id))
+    logging.info(f"Found {len(entries)} feed entries for keyword {keyword_name} ({skipped} skipped by watermark)")
+    return entries, skipped
+
+async def _finish_keyword(keyword, state):
+    """Checkpoint a keyword once every article it found has been handled."""
+    # Entries and articles are skipped once the run is stopping, so such a keyword is redone on resume
+    complete = not state.aborted
+    async with state.store_lock:
+        await asyncio.to_thread(_in_app_context, _checkpoint_keyword, state, keyword, complete)
+
+async def _process_url(url, article, keyword_ids, keywords, state):
+    """Process one unique article URL, then finish the keywords that were waiting on it."""
+    # The keyword that found the URL first owns its checkpoint
+    owner = keywords[keyword_ids[0]]
+    outcome = await _process_article(article, keyword_ids, owner['name'], state)
+    if outcome:
+        owner['queued'].append(url)
+    elif outcome is False:
+        owner['failed'].append(url)
+
+    for keyword_id in keyword_ids:
+        keyword = keywords[keyword_id]
+        keyword['remaining'] -= 1
+        if keyword['remaining'] == 0:
+            await _finish_keyword(keyword, state)
+
+async def _collect_keywords(active_keywords, state):
+    """
+    Fetch every keyword's feed, then fetch each unique article URL once
+
+    Feeds are fetched first and their entries coalesced by URL, so a story
+    found for several keywords is downloaded once and written with all of
+    them. Each keyword is checkpointed as soon as all of its articles are
+    handled.
+    """
+    from main import coalesce_keyword_articles, link_known_articles
+
+    feeds = await asyncio.gather(*(
+        _fetch_keyword_feed(keyword_id, keyword_name, state)
+        for keyword_id, keyword_name in active_keywords
+    ))
+    keywords = {
+        keyword_id: {'id': keyword_id, 'name': keyword_name, 'entries': feed[0], 'skipped': feed[1],
+                     'remaining': 0, 'queued': [], 'failed': []}
+        for (keyword_id, keyword_name), feed in zip(active_keywords, feeds) if feed is not None
+    }
+
+    # Unwrap each distinct feed link once, however many keywords it appeared for
+    entries_by_link = {}
+    for keyword in keywords.values():
+        for entry in keyword['entries']:
+            entries_by_link.setdefault(entry.get('link'), entry)
+    unwrapped = await asyncio.gather(*(_unwrap_entry(entry, state) for entry in entries_by_link.values()))
+    articles_by_link = {link: article for link, article in zip(entries_by_link, unwrapped) if article}
+    state.articles_by_link = articles_by_link
+
+    articles_by_url, url_keywords, _ = coalesce_keyword_articles(
+        [(keyword_id, keyword['entries']) for keyword_id, keyword in keywords.items()], articles_by_link)
+
+    # Only fetch content for URLs we don't have yet, or this run hasn't finished with
+    try:
+        async with state.store_lock:
+            known = await asyncio.to_thread(_in_app_context, link_known_articles, url_keywords)
+    except Exception as e:
+        logging.error(f"Error checking stored articles: {str(e)}")
+        state.record_error('dedup', e)
+        state.aborted = True
+        state.status = 'failed'
+        known = url_keywords
+    state.known_urls = known
+    pending_urls = [url for url in url_keywords if url not in known and not state.tracker.url_done(url)]
+
+    for url in pending_urls:
+        for keyword_id in url_keywords[url]:
+            keywords[keyword_id]['remaining'] += 1
+    await asyncio.gather(*(
+        _finish_keyword(keyword, state) for keyword in keywords.values() if not keyword['remaining']
+    ))
+    await asyncio.gather(*(
+        _process_url(url, articles_by_url[url], url_keywords[url], keywords, state)
+        for url in pending_urls
+    ))
+
+async def collect_news_for_keywords_async(collect_content=True,
+                                          max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                                          per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+                                          max_errors=DEFAULT_MAX_ERRORS,
+                                          batch_size=DEFAULT_BATCH_SIZE,
+                                          full_rescan=False,
+                                          should_stop=None,
+                                          resume=False,
+                                          raise_on_failure=False):
+    """
+    Collect news articles for all active keywords concurrently
+
+    Args:
+        collect_content (bool): Whether to download full article content
+        max_concurrency (int): Maximum number of requests in flight
+        per_host_concurrency (int): Maximum requests in flight per host
+        max_errors (int): Stop scheduling new work after this many errors
+        batch_size (int): Number of articles written per database batch
+        full_rescan (bool): Ignore keyword watermarks and process every feed entry
+        should_stop (callable, optional): Checked before new work is started;
+            when it returns True no further work is scheduled
+        resume (bool): Resume the latest unfinished run instead of starting a new one
+        raise_on_failure (bool): Raise CollectionRunFailed if the run ends
+            aborted, as collect_news_for_keywords
+
+    Returns:
+        list: Summaries of the stored articles, as collect_news_for_keywords
+    """
+    from main import app
+    from models import Keyword
+
+    with app.app_context():
+        active_keywords = [(k.id, k.display_name) for k in Keyword.query.filter_by(active=True).all()]
+        if not active_keywords:
+            logging.warning("No active keywords found. Run import_initial_keywords() first.")
+            return []
+
+        tracker = RunTracker.start('async', [k[0] for k in active_keywords], full_rescan=full_rescan, resume=resume)
+        watermarks = {} if tracker.full_rescan else load_keyword_watermarks(k[0] for k in active_keywords)
+        # Skip publishers whose circuit breaker is still open from earlier runs
+        load_domain_health()
+        load_domain_profiles()
+
+    # Every blocking fetch runs in a thread, so the pool must fit the global limit
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency + 4, thread_name_prefix="collector")
+    loop.set_default_executor(executor)
+
+    state = CollectionState(
+        limiter=HostLimiter(max_concurrency, per_host_concurrency),
+        writer=ArticleBatchWriter(batch_size=batch_size),
+        collect_content=collect_content,
+        max_errors=max_errors,
+        watermarks=watermarks,
+        tracker=tracker,
+        should_stop=should_stop
+    )
+
+    # Each page is downloaded and parsed at most once per run
+    clear_page_cache()
+    try:
+        await _collect_keywords(active_keywords, state)
+        async with state.store_lock:
+            await asyncio.to_thread(_in_app_context, state.writer.flush)
+            await asyncio.to_thread(_in_app_context, flush_resolved_urls)
+            await asyncio.to_thread(_in_app_context, flush_thumbnail_cache)
+            await asyncio.to_thread(_in_app_context, save_domain_health)
+            await asyncio.to_thread(_in_app_context, save_domain_profiles)
+            await asyncio.to_thread(_in_app_context, tracker.finish, state.status)
+    except Exception as e:
+        tracker.record_error('store', e)
+        await asyncio.to_thread(_in_app_context, tracker.finish, 'failed')
+        raise
+    finally:
+        executor.shutdown(wait=False)
+        clear_page_cache()
+
+    stored = state.writer.stored
+    new_articles = [{
+        'id': stored[article['url']],
+        'title': article['title'],
+        'url': article['url'],
+        'source': article['source'],
+        'keyword': keyword_name
+    } for article, keyword_name in state.collected if article['url'] in stored]
+
+    logging.info(f"Collected {len(new_articles)} new articles across {len(active_keywords)} keywords")
+    http_client.log_connection_stats()
+    if raise_on_failure and state.status == 'aborted':
+        raise CollectionRunFailed(tracker.run_id, state.status, len(new_articles))
+    return new_articles
+
+def run_async_collection(collect_content=True,
+                         max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                         per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+                         full_rescan=False,
+                         parse_workers=None,
+                         should_stop=None,
+                         resume=False,
+                         raise_on_failure=False):
+    """Synchronous entry point for the concurrent collector; errors are logged unless raise_on_failure is set."""
+    # Move parsing off the fetch threads so it isn't serialized by the GIL;
+    # the workers are started here, before any fetch thread exists
+    configure_extraction(EXTRACTION_WORKERS if parse_workers is None else parse_workers)
+    try:
+        return asyncio.run(collect_news_for_keywords_async(
+            collect_content=collect_content,
+            max_concurrency=max_concurrency,
+            per_host_concurrency=per_host_concurrency,
+            full_rescan=full_rescan,
+            should_stop=should_stop,
+            resume=resume,
+            raise_on_failure=raise_on_failure
+        ))
+    except Exception as e:
+        if raise_on_failure:
+            raise
+        logging.error(f"Error in concurrent collection: {str(e)}")
+        return []
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Collect news articles concurrently")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"Maximum number of requests in flight (default: {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST_CONCURRENCY,
+                        help=f"Maximum requests in flight per host (default: {DEFAULT_PER_HOST_CONCURRENCY})")
+    parser.add_argument("--parse-workers", type=int, default=EXTRACTION_WORKERS,
+                        help=f"Processes for HTML parsing and extraction, 0 to parse in the fetch threads (default: {EXTRACTION_WORKERS})")
+    parser.add_argument("--no-content", action="store_true", help="Skip downloading article content")
+    parser.add_argument("--full-rescan", action="store_true", help="Ignore keyword watermarks and process every feed entry")
+    parser.add_argument("--resume", action="store_true", help="Resume the latest unfinished collection run")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_async_collection(
+        collect_content=not args.no_content,
+        max_concurrency=args.max_concurrency,
+        per_host_concurrency=args.per_host,
+        full_rescan=args.full_rescan,
+        parse_workers=args.parse_workers,
+        resume=args.resume
+    )
+    print(f"Stored {len(results)} articles")
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Benchmark parse-plus-extract time and text quality over a saved HTML corpus
+
+Runs each extraction engine over every page in the corpus and reports the
+time spent parsing and extracting per page, the size of the stored content,
+how often each engine picks the same image as the first engine listed and,
+for pages with a reference text, how well the content matches it.
+
+Reference texts are optional: save the hand-checked main text of a page
+next to it as <name>.txt. Quality is the word-level F1 score of the stored
+content against that text, so boilerplate lowers precision and missing
+paragraphs lower recall.
+
+Engines:
+  multipass    The pre-single-pass extractors, loaded from extraction.py as of
+               MULTIPASS_REVISION in the git history: content and preview
+               image extracted with separate passes over one parse
+  singlepass   One walk collecting text and scored image candidates
+               (extraction.scan_document), shared by content and preview
+  trafilatura  The single-pass scan for images plus trafilatura main-body
+               text (CONTENT_EXTRACTOR=trafilatura); needs trafilatura installed
+
+Usage:
+  python benchmark_extraction.py [--corpus=benchmark_pages] [--repeat=3] [--engines=singlepass,trafilatura]
+  python benchmark_extraction.py --save URL [URL ...]
+
+Options:
+  --corpus=DIR     Directory of saved .html pages (default: benchmark_pages)
+  --repeat=N       Times each page is processed per engine (default: 3)
+  --engines=LIST   Comma-separated engines to run (default: all)
+  --save URL ...   Download pages into the corpus instead of benchmarking
+"""
+
+import os
+import re
+import json
+import time
+import types
+import hashlib
+import argparse
+import subprocess
+import importlib.util
+import statistics
+from collections import Counter
+
+import extraction
+
+DEFAULT_CORPUS = "benchmark_pages"
+
+# Last commit with the multi-pass extract_article_content/extract_preview_image in extraction.py
+MULTIPASS_REVISION = "473f4ab8c2e42346ea0c545ff9f9ee1ad74c3a56"
+
+# The corpus index maps saved file names to the page URL
+INDEX_FILE = "index.json"
+
+_multipass = None
+
+def load_multipass(revision=MULTIPASS_REVISION):
+    """
+    Load the multi-pass extractors from git history rather than keeping a copy in the tree
+
+    Args:
+        revision (str): Commit whose extraction.py is loaded
+
+    Returns:
+        module: extraction.py as of that commit
+
+    Raises:
+        RuntimeError: If git or the commit isn't available
+    """
+    global _multipass
+    if _multipass is None:
+        try:
+            source = subprocess.run(['git', 'show', f'{revision}:extraction.py'], capture_output=True, text=True,
+                                    check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise RuntimeError(f"Could not read extraction.py at {revision[:12]} from git: {str(e)}")
+        module = types.ModuleType('extraction_multipass')
+        exec(compile(source, f'{revision[:12]}:extraction.py', 'exec'), module.__dict__)
+        _multipass = module
+    return _multipass
+
+def _run_multipass(html, url):
+    multipass = load_multipass()
+    started = time.perf_counter()
+    soup = extraction.parse_html(html)
+    parsed = time.perf_counter()
+    content = multipass.extract_article_content(soup, url)
+    preview = multipass.extract_preview_image(soup, url)
+    finished = time.perf_counter()
+    return parsed - started, finished - parsed, content['image_url'] or preview or None, content['content']
+
+def _run_singlepass(html, url):
+    started = time.perf_counter()
+    soup = extraction.parse_html(html)
+    parsed = time.perf_counter()
+    scan = extraction.scan_document(soup, url)
+    content = extraction.article_content_from_scan(scan)
+    preview = extraction.preview_image_from_scan(scan)
+    finished = time.perf_counter()
+    return parsed - started, finished - parsed, content['image_url'] or preview or None, content['content']
+
+def _run_trafilatura(html, url):
+    started = time.perf_counter()
+    soup = extraction.parse_html(html)
+    parsed = time.perf_counter()
+    scan = extraction.scan_document(soup, url)
+    content = extraction.article_content_from_scan(scan, extraction.extract_main_content(html, url))
+    preview = extraction.preview_image_from_scan(scan)
+    finished = time.perf_counter()
+    return parsed - started, finished - parsed, content['image_url'] or preview or None, content['content']
+
+ENGINES = {
+    'multipass': _run_multipass,
+    'singlepass': _run_singlepass,
+    'trafilatura': _run_trafilatura
+}
+
+# Engines that need an optional package
+ENGINE_REQUIREMENTS = {
+    'trafilatura': 'trafilatura'
+}
+
+_WORD = re.compile(r'\w+')
+
+def text_f1(text, reference):
+    """
+    Word-level F1 score of an extracted text against a reference text
+
+    Args:
+        text (str): Extracted text
+        reference (str): Reference main text
+
+    Returns:
+        float: F1 score between 0 and 1
+    """
+    words = Counter(_WORD.findall(text.lower()))
+    reference_words = Counter(_WORD.findall(reference.lower()))
+    overlap = sum((words & reference_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(words.values())
+    recall = overlap / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+def load_corpus(corpus_dir):
+    """
+    Load the saved pages of a corpus
+
+    Args:
+        corpus_dir (str): Corpus directory
+
+    Returns:
+        list: (file name, url, html, reference text or None) tuples, sorted
+            by file name
+    """
+    index_path = os.path.join(corpus_dir, INDEX_FILE)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(corpus_dir, name), encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        reference = None
+        reference_path = os.path.join(corpus_dir, name[:-len('.html')] + '.txt')
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as f:
+                reference = f.read()
+        pages.append((name, index.get(name, f"https://example.com/{name}"), html, reference))
+    return pages
+
+def save_pages(corpus_dir, urls):
+    """
+    Download pages into the corpus
+
+    Args:
+        corpus_dir (str): Corpus directory, created if missing
+        urls (list): Page URLs to save
+    """
+    import http_client
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    index_path = os.path.join(corpus_dir, INDEX_FILE)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+
+    for url in urls:
+        try:
+            response = http_client.get(url, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Skipping {url}: {str(e)}")
+            continue
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html'
+        with open(os.path.join(corpus_dir, name), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        index[name] = url
+        print(f"Saved {url} as {name}")
+
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+def run_benchmark(pages, engines, repeat=3):
+    """
+    Time every engine over every page
+
+    Args:
+        pages (list): Pages from load_corpus
+        engines (list): Engine names from ENGINES
+        repeat (int): Times each page is processed per engine; the fastest run counts
+
+    Returns:
+        dict: Maps engine name to a dict with per-page parse_ms, extract_ms,
+            total_ms and content_chars lists, the image picked for each page
+            and the F1 score of each page that has a reference text
+    """
+    results = {}
+    for engine in engines:
+        run = ENGINES[engine]
+        stats = {'parse_ms': [], 'extract_ms': [], 'total_ms': [], 'content_chars': [], 'images': [], 'f1': []}
+        for name, url, html, reference in pages:
+            best = None
+            for _ in range(max(repeat, 1)):
+                result = run(html, url)
+                if best is None or result[0] + result[1] < best[0] + best[1]:
+                    best = result
+            parse_time, extract_time, image_url, content = best
+            stats['parse_ms'].append(parse_time * 1000)
+            stats['extract_ms'].append(extract_time * 1000)
+            stats['total_ms'].append((parse_time + extract_time) * 1000)
+            stats['content_chars'].append(len(content or ''))
+            stats['images'].append(image_url)
+            if reference is not None:
+                stats['f1'].append(text_f1(content or '', reference))
+        results[engine] = stats
+    return results
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+def print_report(results, pages):
+    """Print a per-engine summary table."""
+    print(f"\n===== Extraction Benchmark ({len(pages)} pages, parser: {extraction.HTML_PARSER}) =====")
+    print(f"{'engine':<12} {'parse ms':>10} {'extract ms':>11} {'total ms':>10} {'p95 ms':>8} "
+          f"{'content chars':>14} {'same image':>11} {'text F1':>8}")
+
+    baseline = next(iter(results.values()))['images']
+    for engine, stats in results.items():
+        same = sum(1 for a, b in zip(stats['images'], baseline) if a == b)
+        f1 = f"{statistics.mean(stats['f1']):.3f}" if stats['f1'] else "n/a"
+        print(f"{engine:<12} {statistics.mean(stats['parse_ms']):>10.2f} "
+              f"{statistics.mean(stats['extract_ms']):>11.2f} "
+              f"{statistics.mean(stats['total_ms']):>10.2f} "
+              f"{_percentile(stats['total_ms'], 95):>8.2f} "
+              f"{statistics.mean(stats['content_chars']):>14.0f} "
+              f"{same / len(pages) * 100:>10.1f}% "
+              f"{f1:>8}")
+    references = len(next(iter(results.values()))['f1'])
+    if references:
+        print(f"Text F1 measured on {references} pages with a reference text")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark HTML parsing and extraction over a saved corpus")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"Directory of saved .html pages (default: {DEFAULT_CORPUS})")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each page is processed per engine (default: 3)")
+    parser.add_argument("--engines", default=','.join(ENGINES), help="Comma-separated engines to run (default: all)")
+    parser.add_argument("--save", nargs='+', metavar="URL", help="Download pages into the corpus instead of benchmarking")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.save:
+        save_pages(args.corpus, args.save)
+    else:
+        engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+        unknown = [engine for engine in engines if engine not in ENGINES]
+        if unknown:
+            raise SystemExit(f"Unknown engines: {', '.join(unknown)} (available: {', '.join(ENGINES)})")
+        for engine in list(engines):
+            requirement = ENGINE_REQUIREMENTS.get(engine)
+            if requirement and importlib.util.find_spec(requirement) is None:
+                print(f"Skipping {engine}: {requirement} is not installed")
+                engines.remove(engine)
+        if 'multipass' in engines:
+            try:
+                load_multipass()
+            except RuntimeError as e:
+                print(f"Skipping multipass: {str(e)}")
+                engines.remove('multipass')
+        pages = load_corpus(args.corpus) if os.path.isdir(args.corpus) else []
+        if not pages:
+            raise SystemExit(f"No .html pages in {args.corpus}; add some with --save URL")
+        print_report(run_benchmark(pages, engines, args.repeat), pages)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Checkpointed collection runs and run history
+
+Every collection run gets a collection_run row. When a keyword is fully
+processed its articles are flushed, its watermark advanced and the keyword
+recorded as completed on the run, together with the article URLs it stored
+or gave up on. An interrupted, aborted or failed run can then be resumed:
+completed keywords are skipped and, within the remaining keywords, URLs the
+run already finished with are not fetched again, so a run that stopped
+after too many errors does not retry the same failing pages straight away.
+
+A run still marked running is only resumed once it has not checkpointed for
+RUN_STALE_MINUTES, so a live run in another process is never taken over.
+URL checkpoints are deleted when a run completes; the run row itself stays
+as history with its duration, article counts and errors by stage.
+
+Usage:
+  python collection_runs.py [--limit=10]
+
+Prints the most recent runs.
+"""
+
+import os
+import json
+import logging
+import argparse
+import datetime
+import threading
+
+from sqlalchemy import delete
+
+from models import db, CollectionRun, CollectionRunUrl
+
+# A running run that hasn't checkpointed for this long is treated as interrupted
+RUN_STALE_MINUTES = int(os.environ.get("COLLECTION_RUN_STALE_MINUTES", "30"))
+
+# Stages errors are counted under
+ERROR_STAGES = ('feed', 'unwrap', 'dedup', 'content', 'store')
+
+# Run statuses that can be resumed
+RESUMABLE_STATUSES = ('running', 'aborted', 'cancelled', 'failed')
+
+class CollectionRunFailed(Exception):
+    """Raised by the collectors, when asked to, for a run that ended aborted or failed."""
+
+    def __init__(self, run_id, status, articles_stored=0):
+        super().__init__(f"Collection run {run_id} {status} after storing {articles_stored} articles")
+        self.run_id = run_id
+        self.status = status
+        self.articles_stored = articles_stored
+
+def _loads(value, default):
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+def find_resumable_run():
+    """
+    Find the most recent run that can be resumed
+
+    Returns:
+        CollectionRun or None: The run, None if the latest unfinished run is
+            still live or every run completed
+    """
+    run = CollectionRun.query.filter(
+        CollectionRun.status.in_(RESUMABLE_STATUSES)
+    ).order_by(CollectionRun.id.desc()).first()
+    if run is None:
+        return None
+    if run.status == 'running':
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(minutes=RUN_STALE_MINUTES)
+        if run.updated_at and run.updated_at > stale_before:
+            logging.info(f"Collection run {run.id} is still running, not resuming it")
+            return None
+    return run
+
+class RunTracker:
+    """
+    Progress, checkpoints and counters of one collection run
+
+    Created with start() inside an app context. The record_* methods only
+    update memory and are safe to call from several threads; complete_keyword(),
+    record_urls() and finish() write to the database and must be called inside
+    an app context, after the caller has flushed its ArticleBatchWriter.
+    """
+
+    def __init__(self, run, completed_keyword_ids=(), finished_urls=(), stored_urls=()):
+        self.run_id = run.id
+        self.full_rescan = bool(run.full_rescan)
+        self.resumed = bool(run.resume_count)
+        self.completed_keyword_ids = set(completed_keyword_ids)
+        self.finished_urls = set(finished_urls)
+        self.stored_urls = set(stored_urls)
+        self.errors_by_stage = dict.fromkeys(ERROR_STAGES, 0)
+        self.errors_by_stage.update(_loads(run.errors_by_stage, {}))
+        self.last_error = None
+        self.articles_fetched = 0
+        self._lock = threading.Lock()
+        self._last_checkpoint = datetime.datetime.utcnow()
+
+    @classmethod
+    def start(cls, engine, keyword_ids, full_rescan=False, resume=False):
+        """
+        Start a new run, or resume the latest unfinished one
+
+        Args:
+            engine (str): 'serial' or 'async'
+            keyword_ids (list): IDs of the keywords the run covers
+            full_rescan (bool): Whether the run ignores watermarks; a resumed
+                run keeps its original setting
+            resume (bool): Resume the latest unfinished run if there is one
+
+        Returns:
+            RunTracker: The tracker for the run
+        """
+        run = find_resumable_run() if resume else None
+        now = datetime.datetime.utcnow()
+        if run is None:
+            run = CollectionRun(engine=engine, status='running', full_rescan=full_rescan,
+                                started_at=now, updated_at=now, keywords_total=len(keyword_ids))
+            db.session.add(run)
+            db.session.commit()
+            logging.info(f"Started collection run {run.id}")
+            return cls(run)
+
+        completed = _loads(run.completed_keyword_ids, [])
+        finished = db.session.query(CollectionRunUrl.url, CollectionRunUrl.status).filter_by(run_id=run.id).all()
+        finished_urls = [url for url, _ in finished]
+        stored_urls = [url for url, status in finished if status == 'stored']
+        run.status = 'running'
+        run.engine = engine
+        run.updated_at = now
+        run.finished_at = None
+        run.resume_count = (run.resume_count or 0) + 1
+        run.keywords_total = len(set(keyword_ids) | set(completed))
+        db.session.commit()
+        logging.info(f"Resuming collection run {run.id}: {len(completed)} keywords and "
+                     f"{len(finished_urls)} articles already done")
+        return cls(run, completed, finished_urls, stored_urls)
+
+    def keyword_done(self, keyword_id):
+        """Check whether a keyword was completed before this run was resumed."""
+        return keyword_id in self.completed_keyword_ids
+
+    def url_done(self, url):
+        """Check whether an article URL was stored or given up on earlier in this run."""
+        return url in self.finished_urls
+
+    def url_stored(self, url):
+        """Check whether an article URL was stored earlier in this run."""
+        return url in self.stored_urls
+
+    def record_fetch(self):
+        """Count an article page fetched for content."""
+        with self._lock:
+            self.articles_fetched += 1
+
+    def record_error(self, stage, error):
+        """Count an error under one of ERROR_STAGES."""
+        with self._lock:
+            self.errors_by_stage[stage] = self.errors_by_stage.get(stage, 0) + 1
+            self.last_error = f"{stage}: {str(error)}"[:1000]
+
+    def _save(self, status=None, keyword_id=None, complete=False, stored_urls=(), failed_urls=()):
+        """Write URL checkpoints, keyword completion and the run's counters in one transaction."""
+        stored_urls = set(stored_urls)
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            fetched, self.articles_fetched = self.articles_fetched, 0
+            errors = dict(self.errors_by_stage)
+            last_error = self.last_error
+
+        rows = [{'run_id': self.run_id, 'url': url, 'keyword_id': keyword_id, 'status': 'stored'}
+                for url in stored_urls if url not in self.finished_urls]
+        rows += [{'run_id': self.run_id, 'url': url, 'keyword_id': keyword_id, 'status': 'failed'}
+                 for url in failed_urls if url not in self.finished_urls and url not in stored_urls]
+        try:
+            if rows:
+                from article_writer import dialect_insert
+                stmt = dialect_insert(CollectionRunUrl.__table__).values(rows)
+                db.session.execute(stmt.on_conflict_do_nothing(index_elements=['run_id', 'url']))
+
+            run = db.session.get(CollectionRun, self.run_id)
+            if complete:
+                run.completed_keyword_ids = json.dumps(sorted(self.completed_keyword_ids | {keyword_id}))
+            run.articles_fetched = (run.articles_fetched or 0) + fetched
+            run.articles_stored = (run.articles_stored or 0) + sum(1 for row in rows if row['status'] == 'stored')
+            run.errors_by_stage = json.dumps(errors)
+            run.error_count = sum(errors.values())
+            if last_error:
+                run.last_error = last_error
+            run.duration_seconds = (run.duration_seconds or 0.0) + (now - self._last_checkpoint).total_seconds()
+            run.updated_at = now
+            if status is not None:
+                run.status = status
+                if status == 'completed':
+                    run.finished_at = now
+                    db.session.execute(delete(CollectionRunUrl).where(CollectionRunUrl.run_id == self.run_id))
+            db.session.commit()
+            self._last_checkpoint = now
+            self.finished_urls.update(row['url'] for row in rows)
+            self.stored_urls.update(row['url'] for row in rows if row['status'] == 'stored')
+            if complete:
+                self.completed_keyword_ids.add(keyword_id)
+        except Exception as e:
+            logging.error(f"Error saving checkpoint for collection run {self.run_id}: {str(e)}")
+            db.session.rollback()
+            with self._lock:
+                self.articles_fetched += fetched
+
+    def complete_keyword(self, keyword_id, stored_urls, failed_urls=()):
+        """
+        Checkpoint a fully processed keyword
+
+        Args:
+            keyword_id (int): The keyword
+            stored_urls (list): Article URLs that are now stored for the keyword
+            failed_urls (list): Article URLs that were given up on
+        """
+        self._save(keyword_id=keyword_id, complete=True, stored_urls=stored_urls, failed_urls=failed_urls)
+
+    def record_urls(self, keyword_id, stored_urls, failed_urls=()):
+        """Checkpoint the articles of a keyword the run stopped in the middle of."""
+        if stored_urls or failed_urls:
+            self._save(keyword_id=keyword_id, stored_urls=stored_urls, failed_urls=failed_urls)
+
+    def finish(self, status):
+        """
+        Record how the run ended
+
+        Args:
+            status (str): 'completed', 'aborted' (too many errors), 'cancelled'
+                or 'failed'
+        """
+        self._save(status=status)
+        logging.info(f"Collection run {self.run_id} {status}")
+
+def run_to_dict(run):
+    """Serialize a run for the history API."""
+    completed = _loads(run.completed_keyword_ids, [])
+    return {
+        'id': run.id,
+        'engine': run.engine,
+        'status': run.status,
+        'full_rescan': bool(run.full_rescan),
+        'started_at': run.started_at.isoformat() if run.started_at else None,
+        'updated_at': run.updated_at.isoformat() if run.updated_at else None,
+        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+        'duration_seconds': round(run.duration_seconds or 0.0, 1),
+        'resume_count': run.resume_count or 0,
+        'keywords_total': run.keywords_total or 0,
+        'keywords_completed': len(completed),
+        'articles_fetched': run.articles_fetched or 0,
+        'articles_stored': run.articles_stored or 0,
+        'error_count': run.error_count or 0,
+        'errors_by_stage': _loads(run.errors_by_stage, {}),
+        'last_error': run.last_error
+    }
+
+def recent_runs(limit=20, status=None):
+    """
+    Get the most recent collection runs
+
+    Args:
+        limit (int): Maximum number of runs to return
+        status (str, optional): Only return runs with this status
+
+    Returns:
+        list: Run summaries, newest first
+    """
+    query = CollectionRun.query
+    if status:
+        query = query.filter_by(status=status)
+    return [run_to_dict(run) for run in query.order_by(CollectionRun.id.desc()).limit(limit).all()]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Show recent collection runs")
+    parser.add_argument("--limit", type=int, default=10, help="Number of runs to show (default: 10)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        print("\n===== Collection Runs =====")
+        for r in recent_runs(args.limit):
+            errors = ', '.join(f"{stage} {count}" for stage, count in r['errors_by_stage'].items() if count) or 'none'
+            print(f"#{r['id']:<5} {r['status']:<10} {r['engine']:<7} {r['started_at'][:19]}  "
+                  f"{r['duration_seconds']:>8.1f}s  {r['keywords_completed']}/{r['keywords_total']} keywords  "
+                  f"{r['articles_fetched']} fetched  {r['articles_stored']} stored  errors: {errors}")
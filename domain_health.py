@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Domain health registry and circuit breaker for slow publishers
+
+http_client records the latency and outcome of every request here. After
+several consecutive failures (timeouts, connection errors, 5xx or 429
+responses) the domain's circuit opens and further requests fail
+immediately with CircuitOpenError instead of waiting out the full timeout.
+Fetchers already treat request errors as "use the placeholder path", so an
+open circuit downgrades a failing publisher to cheap placeholders until the
+cool-off expires. After that one trial request is let through: success
+closes the circuit, failure opens it again.
+
+Stats are kept in memory and persisted to the domain_health table by
+load_domain_health() / save_domain_health(), which collection runs call at
+their start and end. Counters are saved as increments, so several processes
+can share the table.
+
+Usage:
+  python domain_health.py [--limit=10]
+
+Prints the slowest and most-failing domains.
+"""
+
+import os
+import logging
+import argparse
+import datetime
+import threading
+from urllib.parse import urlparse
+import requests
+
+from models import db, DomainHealth
+
+# Consecutive failures before a domain's circuit opens, and how long it stays open
+FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "3"))
+COOL_OFF = datetime.timedelta(minutes=int(os.environ.get("CIRCUIT_COOL_OFF_MINUTES", "30")))
+
+# Response statuses that count as a publisher failure
+FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a domain whose circuit is open."""
+
+_registry = {}
+_lock = threading.Lock()
+
+def domain_for_url(url):
+    """Get the registry key for a URL: its lowercase host without www."""
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def _entry(domain):
+    """Get or create the in-memory entry for a domain. Caller holds _lock."""
+    entry = _registry.get(domain)
+    if entry is None:
+        entry = {
+            'request_count': 0,
+            'error_count': 0,
+            'total_latency_ms': 0.0,
+            'last_latency_ms': None,
+            'consecutive_failures': 0,
+            'last_error': None,
+            'last_failure_at': None,
+            'circuit_open_until': None,
+            'trial_in_flight': False,
+            # Increments not yet written to the database
+            'unsaved_requests': 0,
+            'unsaved_errors': 0,
+            'unsaved_latency_ms': 0.0,
+            'dirty': False
+        }
+        _registry[domain] = entry
+    return entry
+
+def check_circuit(url):
+    """
+    Raise CircuitOpenError if requests to the URL's domain should be skipped
+
+    Once the cool-off has passed a single trial request is allowed through.
+
+    Args:
+        url (str): The URL about to be requested
+    """
+    domain = domain_for_url(url)
+    if not domain:
+        return
+
+    now = datetime.datetime.utcnow()
+    with _lock:
+        entry = _registry.get(domain)
+        if entry is None or entry['circuit_open_until'] is None:
+            return
+        if entry['circuit_open_until'] > now or entry['trial_in_flight']:
+            raise CircuitOpenError(f"Circuit open for {domain} until {entry['circuit_open_until']:%H:%M:%S}")
+        entry['trial_in_flight'] = True
+
+def record_result(url, latency_ms, error=None):
+    """
+    Record the outcome of a request
+
+    Args:
+        url (str): The requested URL
+        latency_ms (float): Time the request took in milliseconds
+        error (str, optional): Description of the failure, None on success
+    """
+    domain = domain_for_url(url)
+    if not domain:
+        return
+
+    now = datetime.datetime.utcnow()
+    with _lock:
+        entry = _entry(domain)
+        entry['request_count'] += 1
+        entry['total_latency_ms'] += latency_ms
+        entry['last_latency_ms'] = latency_ms
+        entry['unsaved_requests'] += 1
+        entry['unsaved_latency_ms'] += latency_ms
+        entry['trial_in_flight'] = False
+        entry['dirty'] = True
+
+        if error is None:
+            entry['consecutive_failures'] = 0
+            entry['circuit_open_until'] = None
+            return
+
+        entry['error_count'] += 1
+        entry['unsaved_errors'] += 1
+        entry['consecutive_failures'] += 1
+        entry['last_error'] = error[:255]
+        entry['last_failure_at'] = now
+        if entry['consecutive_failures'] >= FAILURE_THRESHOLD:
+            if entry['circuit_open_until'] is None or entry['circuit_open_until'] <= now:
+                logging.warning(f"Opening circuit for {domain} after {entry['consecutive_failures']} consecutive failures")
+            entry['circuit_open_until'] = now + COOL_OFF
+
+def load_domain_health():
+    """
+    Load persisted domain stats into the in-memory registry
+
+    Must be called inside an app context. Domains with unsaved changes keep
+    their in-memory state.
+    """
+    try:
+        rows = DomainHealth.query.all()
+    except Exception as e:
+        logging.warning(f"Error loading domain health: {str(e)}")
+        db.session.rollback()
+        return
+
+    with _lock:
+        for row in rows:
+            entry = _entry(row.domain)
+            if entry['dirty']:
+                continue
+            entry.update({
+                'request_count': row.request_count or 0,
+                'error_count': row.error_count or 0,
+                'total_latency_ms': row.total_latency_ms or 0.0,
+                'last_latency_ms': row.last_latency_ms,
+                'consecutive_failures': row.consecutive_failures or 0,
+                'last_error': row.last_error,
+                'last_failure_at': row.last_failure_at,
+                'circuit_open_until': row.circuit_open_until
+            })
+
+def save_domain_health():
+    """
+    Persist in-memory domain stats to the domain_health table
+
+    Must be called inside an app context.
+
+    Returns:
+        int: Number of domains written
+    """
+    from article_writer import dialect_insert
+
+    with _lock:
+        dirty = {domain: dict(entry) for domain, entry in _registry.items() if entry['dirty']}
+        for domain in dirty:
+            entry = _registry[domain]
+            entry['unsaved_requests'] = 0
+            entry['unsaved_errors'] = 0
+            entry['unsaved_latency_ms'] = 0.0
+            entry['dirty'] = False
+    if not dirty:
+        return 0
+
+    now = datetime.datetime.utcnow()
+    rows = [{
+        'domain': domain,
+        'request_count': entry['unsaved_requests'],
+        'error_count': entry['unsaved_errors'],
+        'total_latency_ms': entry['unsaved_latency_ms'],
+        'last_latency_ms': entry['last_latency_ms'],
+        'consecutive_failures': entry['consecutive_failures'],
+        'last_error': entry['last_error'],
+        'last_failure_at': entry['last_failure_at'],
+        'circuit_open_until': entry['circuit_open_until'],
+        'updated_at': now
+    } for domain, entry in dirty.items()]
+
+    table = DomainHealth.__table__
+    try:
+        stmt = dialect_insert(table).values(rows)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.domain],
+            set_={
+                # Counters are added so concurrent processes don't overwrite each other
+                'request_count': table.c.request_count + new.request_count,
+                'error_count': table.c.error_count + new.error_count,
+                'total_latency_ms': table.c.total_latency_ms + new.total_latency_ms,
+                'last_latency_ms': new.last_latency_ms,
+                'consecutive_failures': new.consecutive_failures,
+                'last_error': new.last_error,
+                'last_failure_at': new.last_failure_at,
+                'circuit_open_until': new.circuit_open_until,
+                'updated_at': new.updated_at
+            }
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+        return len(rows)
+    except Exception as e:
+        logging.error(f"Error saving domain health: {str(e)}")
+        db.session.rollback()
+        # Restore the unsaved increments so a later save can retry them
+        with _lock:
+            for domain, saved in dirty.items():
+                entry = _registry[domain]
+                entry['unsaved_requests'] += saved['unsaved_requests']
+                entry['unsaved_errors'] += saved['unsaved_errors']
+                entry['unsaved_latency_ms'] += saved['unsaved_latency_ms']
+                entry['dirty'] = True
+        return 0
+
+def _domain_summary(row):
+    request_count = row.request_count or 0
+    return {
+        'domain': row.domain,
+        'requests': request_count,
+        'errors': row.error_count or 0,
+        'error_rate': round((row.error_count or 0) / request_count, 3) if request_count else 0.0,
+        'avg_latency_ms': round((row.total_latency_ms or 0.0) / request_count, 1) if request_count else None,
+        'last_latency_ms': row.last_latency_ms,
+        'last_error': row.last_error,
+        'last_failure_at': row.last_failure_at.isoformat() if row.last_failure_at else None,
+        'circuit_open_until': row.circuit_open_until.isoformat() if row.circuit_open_until else None
+    }
+
+def slowest_domains(limit=10, min_requests=3):
+    """
+    Get the domains with the highest average latency
+
+    Args:
+        limit (int): Maximum number of domains to return
+        min_requests (int): Ignore domains with fewer requests than this
+
+    Returns:
+        list: Domain summaries, slowest first
+    """
+    avg_latency = DomainHealth.total_latency_ms / DomainHealth.request_count
+    rows = DomainHealth.query.filter(
+        DomainHealth.request_count >= max(min_requests, 1)
+    ).order_by(avg_latency.desc()).limit(limit).all()
+    return [_domain_summary(row) for row in rows]
+
+def most_failing_domains(limit=10, min_requests=3):
+    """
+    Get the domains with the highest error rate
+
+    Args:
+        limit (int): Maximum number of domains to return
+        min_requests (int): Ignore domains with fewer requests than this
+
+    Returns:
+        list: Domain summaries, highest error rate first
+    """
+    error_rate = DomainHealth.error_count * 1.0 / DomainHealth.request_count
+    rows = DomainHealth.query.filter(
+        DomainHealth.request_count >= max(min_requests, 1),
+        DomainHealth.error_count > 0
+    ).order_by(error_rate.desc(), DomainHealth.error_count.desc()).limit(limit).all()
+    return [_domain_summary(row) for row in rows]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Show the slowest and most-failing publisher domains")
+    parser.add_argument("--limit", type=int, default=10, help="Number of domains per list (default: 10)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        print("\n===== Slowest Domains =====")
+        for d in slowest_domains(args.limit):
+            print(f"{d['domain']:<40} {d['avg_latency_ms']:>8} ms avg  {d['requests']:>6} requests")
+
+        print("\n===== Most Failing Domains =====")
+        for d in most_failing_domains(args.limit):
+            circuit = f"  open until {d['circuit_open_until']}" if d['circuit_open_until'] else ""
+            print(f"{d['domain']:<40} {d['error_rate'] * 100:>6.1f}% of {d['requests']:>6} requests  {d['last_error'] or ''}{circuit}")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Per-domain memory of which extraction strategies work for a publisher
+
+Content and thumbnail extraction try several strategies for every page,
+each falling back to the next. This registry records, per domain, how often
+each strategy was tried, how often it worked and how long it took. Later
+pages from the same domain try the strategies in order of what has worked
+there, and skip a strategy once it has failed MIN_ATTEMPTS times without
+ever working. A skipped strategy is still tried every PROBE_INTERVAL-th
+time, so a publisher that changes its markup is picked up again.
+
+Like domain_health, profiles are kept in memory and persisted to the
+domain_profile table by load_domain_profiles() / save_domain_profiles(),
+which collection runs and the image updater call at their start and end.
+Counters are saved as increments, so several processes can share the table.
+
+Usage:
+  python domain_profiles.py [--domain=example.com] [--limit=20]
+
+Prints the strategies that work, and those being skipped, per domain.
+"""
+
+import os
+import logging
+import argparse
+import datetime
+import threading
+
+from models import db, DomainProfile
+from domain_health import domain_for_url
+
+# Failed attempts without a success before a strategy is skipped for a domain
+MIN_ATTEMPTS = int(os.environ.get("DOMAIN_PROFILE_MIN_ATTEMPTS", "5"))
+
+# Skipped strategies are still tried once every this many pages
+PROBE_INTERVAL = int(os.environ.get("DOMAIN_PROFILE_PROBE_INTERVAL", "20"))
+
+_registry = {}
+_lock = threading.Lock()
+
+def _entry(domain, chain, strategy):
+    """Get or create the in-memory entry for a strategy. Caller holds _lock."""
+    key = (domain, chain, strategy)
+    entry = _registry.get(key)
+    if entry is None:
+        entry = {
+            'attempts': 0,
+            'successes': 0,
+            'total_ms': 0.0,
+            'skipped': 0,
+            'last_success_at': None,
+            # Increments not yet written to the database
+            'unsaved_attempts': 0,
+            'unsaved_successes': 0,
+            'unsaved_ms': 0.0,
+            'unsaved_skipped': 0,
+            'dirty': False
+        }
+        _registry[key] = entry
+    return entry
+
+def _never_works(entry):
+    """Check whether a strategy has failed often enough, and never worked, to be skipped."""
+    return entry['successes'] == 0 and entry['attempts'] >= MIN_ATTEMPTS
+
+def order_strategies(url, chain, strategies):
+    """
+    Order a chain's strategies for a URL's domain
+
+    Strategies that have worked on the domain come first, highest success
+    rate and then lowest average time first; untried ones keep their given
+    order after them. Strategies that never work on the domain are left
+    out, except for an occasional probe.
+
+    Args:
+        url (str): The page URL
+        chain (str): 'content' or 'thumbnail'
+        strategies (list): The chain's strategies in their default order
+
+    Returns:
+        list: The strategies to try, in order
+    """
+    domain = domain_for_url(url)
+    if not domain:
+        return list(strategies)
+
+    ranked = []
+    with _lock:
+        for position, strategy in enumerate(strategies):
+            entry = _registry.get((domain, chain, strategy))
+            if entry is None or not entry['attempts']:
+                ranked.append(((1, 0.0, 0.0, position), strategy))
+                continue
+            if _never_works(entry):
+                entry['skipped'] += 1
+                entry['unsaved_skipped'] += 1
+                entry['dirty'] = True
+                if entry['skipped'] % PROBE_INTERVAL:
+                    continue
+            success_rate = entry['successes'] / entry['attempts']
+            avg_ms = entry['total_ms'] / entry['attempts']
+            group = 0 if entry['successes'] else 2
+            ranked.append(((group, -success_rate, avg_ms, position), strategy))
+    return [strategy for _, strategy in sorted(ranked)]
+
+def should_try(url, chain, strategy):
+    """
+    Check whether an optional strategy is worth running for a URL's domain
+
+    Returns:
+        bool: False if the strategy never works on the domain and no probe is due
+    """
+    return bool(order_strategies(url, chain, [strategy]))
+
+def record_strategy(url, chain, strategy, success, elapsed_ms):
+    """
+    Record the outcome of one strategy on a page
+
+    Args:
+        url (str): The page URL
+        chain (str): 'content' or 'thumbnail'
+        strategy (str): The strategy that was tried
+        success (bool): Whether it produced a usable result
+        elapsed_ms (float): Time it took in milliseconds
+    """
+    domain = domain_for_url(url)
+    if not domain:
+        return
+
+    with _lock:
+        entry = _entry(domain, chain, strategy)
+        entry['attempts'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['unsaved_attempts'] += 1
+        entry['unsaved_ms'] += elapsed_ms
+        entry['dirty'] = True
+        if success:
+            entry['successes'] += 1
+            entry['unsaved_successes'] += 1
+            entry['last_success_at'] = datetime.datetime.utcnow()
+
+def load_domain_profiles():
+    """
+    Load persisted profiles into the in-memory registry
+
+    Must be called inside an app context. Strategies with unsaved changes
+    keep their in-memory state.
+    """
+    try:
+        rows = DomainProfile.query.all()
+    except Exception as e:
+        logging.warning(f"Error loading domain profiles: {str(e)}")
+        db.session.rollback()
+        return
+
+    with _lock:
+        for row in rows:
+            entry = _entry(row.domain, row.chain, row.strategy)
+            if entry['dirty']:
+                continue
+            entry.update({
+                'attempts': row.attempts or 0,
+                'successes': row.successes or 0,
+                'total_ms': row.total_ms or 0.0,
+                'skipped': row.skipped or 0,
+                'last_success_at': row.last_success_at
+            })
+
+def save_domain_profiles():
+    """
+    Persist in-memory profiles to the domain_profile table
+
+    Must be called inside an app context.
+
+    Returns:
+        int: Number of strategies written
+    """
+    from article_writer import dialect_insert
+
+    with _lock:
+        dirty = {key: dict(entry) for key, entry in _registry.items() if entry['dirty']}
+        for key in dirty:
+            entry = _registry[key]
+            entry['unsaved_attempts'] = 0
+            entry['unsaved_successes'] = 0
+            entry['unsaved_ms'] = 0.0
+            entry['unsaved_skipped'] = 0
+            entry['dirty'] = False
+    if not dirty:
+        return 0
+
+    now = datetime.datetime.utcnow()
+    rows = [{
+        'domain': domain,
+        'chain': chain,
+        'strategy': strategy,
+        'attempts': entry['unsaved_attempts'],
+        'successes': entry['unsaved_successes'],
+        'total_ms': entry['unsaved_ms'],
+        'skipped': entry['unsaved_skipped'],
+        'last_success_at': entry['last_success_at'],
+        'updated_at': now
+    } for (domain, chain, strategy), entry in dirty.items()]
+
+    table = DomainProfile.__table__
+    try:
+        stmt = dialect_insert(table).values(rows)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.domain, table.c.chain, table.c.strategy],
+            set_={
+                # Counters are added so concurrent processes don't overwrite each other
+                'attempts': table.c.attempts + new.attempts,
+                'successes': table.c.successes + new.successes,
+                'total_ms': table.c.total_ms + new.total_ms,
+                'skipped': table.c.skipped + new.skipped,
+                'last_success_at': db.func.coalesce(new.last_success_at, table.c.last_success_at),
+                'updated_at': new.updated_at
+            }
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+        return len(rows)
+    except Exception as e:
+        logging.error(f"Error saving domain profiles: {str(e)}")
+        db.session.rollback()
+        # Restore the unsaved increments so a later save can retry them
+        with _lock:
+            for key, saved in dirty.items():
+                entry = _registry[key]
+                entry['unsaved_attempts'] += saved['unsaved_attempts']
+                entry['unsaved_successes'] += saved['unsaved_successes']
+                entry['unsaved_ms'] += saved['unsaved_ms']
+                entry['unsaved_skipped'] += saved['unsaved_skipped']
+                entry['dirty'] = True
+        return 0
+
+def _strategy_summary(row):
+    attempts = row.attempts or 0
+    return {
+        'strategy': row.strategy,
+        'attempts': attempts,
+        'successes': row.successes or 0,
+        'success_rate': round((row.successes or 0) / attempts, 3) if attempts else None,
+        'avg_ms': round((row.total_ms or 0.0) / attempts, 1) if attempts else None,
+        'skipped': row.skipped or 0,
+        'never_works': not row.successes and attempts >= MIN_ATTEMPTS,
+        'last_success_at': row.last_success_at.isoformat() if row.last_success_at else None
+    }
+
+def domain_profiles(domain=None, limit=20):
+    """
+    Get the strategy profiles of the most-profiled domains
+
+    Args:
+        domain (str, optional): Only return this domain
+        limit (int): Maximum number of domains to return
+
+    Returns:
+        list: {'domain': ..., 'chains': {chain: [strategy summary, ...]}}, most attempts first
+    """
+    query = db.session.query(DomainProfile.domain)
+    if domain:
+        query = query.filter(DomainProfile.domain == domain)
+    domains = [d for (d,) in query.group_by(DomainProfile.domain).order_by(
+        db.func.sum(DomainProfile.attempts).desc()).limit(limit)]
+    if not domains:
+        return []
+
+    profiles = {d: {'domain': d, 'chains': {}} for d in domains}
+    rows = DomainProfile.query.filter(DomainProfile.domain.in_(domains)).order_by(
+        DomainProfile.chain, DomainProfile.successes.desc()).all()
+    for row in rows:
+        profiles[row.domain]['chains'].setdefault(row.chain, []).append(_strategy_summary(row))
+    return [profiles[d] for d in domains]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Show which extraction strategies work per publisher domain")
+    parser.add_argument("--domain", help="Only show this domain")
+    parser.add_argument("--limit", type=int, default=20, help="Number of domains to show (default: 20)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        for profile in domain_profiles(args.domain, args.limit):
+            print(f"\n===== {profile['domain']} =====")
+            for chain, strategies in profile['chains'].items():
+                for s in strategies:
+                    state = "  skipped" if s['never_works'] else ""
+                    print(f"{chain:<10} {s['strategy']:<15} {s['successes']:>5}/{s['attempts']:<5} worked  "
+                          f"{s['avg_ms']:>8} ms avg{state}")
@@ -0,0 +1,548 @@
+"""
+HTML parsing and extraction for article pages
+
+The CPU-heavy part of collection: parsing a downloaded page and pulling
+out its text and best image. The functions here only depend on
+BeautifulSoup, so they can run in a separate process without importing
+the Flask app. Every extraction function accepts either raw HTML or an
+already parsed document; when work is sent to the process pool the HTML is
+passed and parsed in the worker.
+
+Configuration (environment variables):
+  HTML_PARSER         BeautifulSoup parser to use (default: lxml if
+                      installed, otherwise html.parser). Pages the chosen
+                      parser can't handle are re-parsed with html.parser.
+  EXTRACTION_WORKERS  Number of worker processes for parsing and extraction
+                      (default: 0, run in the calling thread). The pool is
+                      started by configure_extraction when a collection
+                      run or job worker starts; until then extraction
+                      runs inline.
+  CONTENT_EXTRACTOR   Article text backend: scan (all visible text, the
+                      default) or trafilatura (main body text only)
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup, Tag, NavigableString, CData, FeatureNotFound
+
+# Pure-Python parser that is always available
+FALLBACK_PARSER = 'html.parser'
+
+def _default_parser():
+    """Prefer lxml, which parses several times faster than html.parser."""
+    if importlib.util.find_spec('lxml') is not None:
+        return 'lxml'
+    return FALLBACK_PARSER
+
+HTML_PARSER = os.environ.get("HTML_PARSER") or _default_parser()
+
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", "0"))
+
+# Limit stored content to 10K characters
+MAX_CONTENT_LENGTH = 10000
+
+# Article text backend: 'scan' keeps all visible page text, 'trafilatura'
+# keeps only the main body and falls back to the scan text
+CONTENT_EXTRACTOR = os.environ.get("CONTENT_EXTRACTOR", "scan")
+CONTENT_EXTRACTORS = ('scan', 'trafilatura')
+
+# Main-body text shorter than this is treated as a failed extraction
+MIN_MAIN_TEXT_LENGTH = 200
+
+MAIN_CONTENT_FIELDS = ('text', 'title', 'author', 'date', 'description', 'sitename', 'image')
+
+# Where an image candidate was found, and how much that source is trusted
+IMAGE_SOURCE_SCORES = {
+    'og:image': 100,
+    'twitter:image': 95,
+    'image': 90,
+    'article:image': 85,
+    'json-ld': 80,
+    'itemprop': 75,
+    'featured': 70,
+    'picture': 60,
+    'sized': 40,
+    'inline': 10
+}
+META_IMAGE_KEYS = ('og:image', 'twitter:image', 'image', 'article:image')
+
+# Minimum area (e.g., 200x200) for a sized image to qualify as the article image
+MIN_IMAGE_AREA = 40000
+
+# Image URL fragments that mark likely non-content images
+SKIP_IMAGE_MARKERS = ('logo', 'icon', 'avatar', 'spinner', 'pixel', 'tracking', 'banner', 'advertisement', 'ad-')
+
+# Containers that hold the main content or a featured image
+CONTENT_TAGS = ('article', 'main')
+CONTENT_CLASSES = frozenset(['article', 'post', 'content', 'main'])
+FEATURED_CONTAINER_CLASSES = frozenset(['article-featured-image', 'post-thumbnail', 'featured-image', 'article__featured-image'])
+FEATURED_IMAGE_CLASSES = frozenset(['main-image', 'featured-image', 'article-image'])
+
+_STYLE_WIDTH = re.compile(r'width:\s*(\d+)px')
+_STYLE_HEIGHT = re.compile(r'height:\s*(\d+)px')
+_TEXT_TYPES = (NavigableString, CData)
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def parse_html(html):
+    """
+    Parse an HTML document with the configured parser
+
+    Falls back to html.parser when the configured parser is not installed
+    or fails on the document.
+
+    Args:
+        html (str): The page HTML
+
+    Returns:
+        BeautifulSoup: The parsed document
+    """
+    global HTML_PARSER
+    if HTML_PARSER != FALLBACK_PARSER:
+        try:
+            return BeautifulSoup(html, HTML_PARSER)
+        except FeatureNotFound:
+            logging.warning(f"HTML parser {HTML_PARSER} is not installed, using {FALLBACK_PARSER}")
+            HTML_PARSER = FALLBACK_PARSER
+        except Exception as e:
+            logging.warning(f"HTML parser {HTML_PARSER} failed ({str(e)}), retrying with {FALLBACK_PARSER}")
+    return BeautifulSoup(html, FALLBACK_PARSER)
+
+def _as_soup(document):
+    """Accept either raw HTML or a parsed document."""
+    if isinstance(document, BeautifulSoup):
+        return document
+    return parse_html(document)
+
+def get_visible_text(soup):
+    """
+    Get the text of a parsed document without modifying it
+
+    Equivalent to soup.get_text(separator='\\n') after removing script and
+    style elements, but safe to call on a shared cached document.
+
+    Args:
+        soup (BeautifulSoup): The parsed document
+
+    Returns:
+        str: The document text, one string per line
+    """
+    strings = []
+    for string in soup.descendants:
+        if type(string) not in _TEXT_TYPES:
+            continue
+        if string.parent is not None and string.parent.name in ('script', 'style'):
+            continue
+        strings.append(str(string))
+    return '\n'.join(strings)
+
+def _absolute_image_url(src, base_url):
+    """Make an image URL absolute, or None if it isn't a usable http(s) URL."""
+    src = (src or '').strip()
+    if not src or src.startswith('data:'):
+        return None
+    if src.startswith('//'):
+        src = 'https:' + src
+    elif not src.startswith(('http://', 'https://')):
+        src = urljoin(base_url, src)
+    return src if src.startswith(('http://', 'https://')) else None
+
+def _first_srcset_url(srcset):
+    """Get the first image URL from a srcset attribute."""
+    first = srcset.split(',')[0].strip()
+    return first.split(' ')[0] if first else None
+
+def _image_size(tag):
+    """Get an img tag's (width, height) from attributes or inline style, or None."""
+    width = tag.get('width')
+    height = tag.get('height')
+    if not (width and height):
+        style = tag.get('style', '')
+        width_match = _STYLE_WIDTH.search(style)
+        height_match = _STYLE_HEIGHT.search(style)
+        if not (width_match and height_match):
+            return None
+        width, height = width_match.group(1), height_match.group(1)
+    width, height = str(width).strip(), str(height).strip()
+    if not (width.isdigit() and height.isdigit()):
+        return None
+    return int(width), int(height)
+
+def _json_ld_images(data):
+    """Yield image URLs from a JSON-LD document, its item list or @graph."""
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        image = item.get('image')
+        if isinstance(image, list):
+            image = image[0] if image else None
+        if isinstance(image, dict):
+            image = image.get('url')
+        if isinstance(image, str):
+            yield image
+        graph = item.get('@graph')
+        if isinstance(graph, list):
+            yield from _json_ld_images(graph)
+
+class _DocumentScanner:
+    """
+    Collects image candidates and visible text in one walk over a document
+
+    Every candidate is scored by where it was found (IMAGE_SOURCE_SCORES),
+    with sized images also scored by area and whether they sit in the main
+    content. A URL found in several places keeps its best score.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.candidates = {}
+        self.strings = []
+        self.order = 0
+
+    def add_candidate(self, src, source, bonus=0):
+        image_url = _absolute_image_url(src, self.base_url)
+        if not image_url:
+            return
+        score = IMAGE_SOURCE_SCORES[source] + bonus
+        current = self.candidates.get(image_url)
+        if current is None or score > current['score']:
+            self.order += 1
+            self.candidates[image_url] = {'url': image_url, 'score': score, 'source': source, 'order': self.order}
+
+    def scan(self, soup):
+        # Context per element: (hide text, in main content, in featured image block, in picture)
+        stack = [(iter(soup.contents), (False, False, False, False))]
+        while stack:
+            children, context = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            child_type = type(child)
+            if child_type is Tag:
+                child_context = self.visit(child, context)
+                if child.contents:
+                    stack.append((iter(child.contents), child_context))
+            elif child_type in _TEXT_TYPES and not context[0]:
+                self.strings.append(child)
+
+    def visit(self, tag, context):
+        """Record any image candidate on a tag and return the context for its children."""
+        hidden, in_content, in_featured, in_picture = context
+        name = tag.name
+
+        if name == 'meta':
+            key = (tag.get('property') or tag.get('name') or '').lower()
+            if key in META_IMAGE_KEYS:
+                self.add_candidate(tag.get('content'), key)
+            elif tag.get('itemprop') == 'image':
+                self.add_candidate(tag.get('content'), 'itemprop')
+            return context
+
+        if name in ('script', 'style', 'noscript', 'template'):
+            if name == 'script' and tag.get('type') == 'application/ld+json' and tag.string:
+                try:
+                    for image in _json_ld_images(json.loads(tag.string)):
+                        self.add_candidate(image, 'json-ld')
+                except ValueError:
+                    pass  # Skip invalid JSON
+            return (True, in_content, in_featured, in_picture)
+
+        if name == 'img':
+            self.visit_img(tag, in_content, in_featured, in_picture)
+            return context
+
+        if name == 'source':
+            if in_picture and tag.get('srcset'):
+                self.add_candidate(_first_srcset_url(tag['srcset']), 'picture')
+            return context
+
+        if tag.get('itemprop') == 'image':
+            self.add_candidate(tag.get('src') or tag.get('content') or tag.get('href'), 'itemprop')
+
+        classes = tag.get('class') or ()
+        if not in_content and (name in CONTENT_TAGS or any(c in CONTENT_CLASSES for c in classes)):
+            in_content = True
+        if not in_featured and any(c in FEATURED_CONTAINER_CLASSES for c in classes):
+            in_featured = True
+        if name == 'picture':
+            in_picture = True
+        return (hidden, in_content, in_featured, in_picture)
+
+    def visit_img(self, tag, in_content, in_featured, in_picture):
+        src = tag.get('src') or tag.get('data-src') or tag.get('data-lazy-src')
+        if not src:
+            return
+        if tag.get('itemprop') == 'image':
+            self.add_candidate(src, 'itemprop')
+            return
+        classes = tag.get('class') or ()
+        if in_featured or any(c in FEATURED_IMAGE_CLASSES for c in classes):
+            self.add_candidate(src, 'featured')
+            return
+        if in_picture:
+            self.add_candidate(src, 'picture')
+            return
+
+        # Skip likely non-content images
+        lower_src = src.lower()
+        if any(marker in lower_src for marker in SKIP_IMAGE_MARKERS):
+            return
+
+        size = _image_size(tag)
+        if size is None:
+            self.add_candidate(src, 'inline')
+            return
+        area = size[0] * size[1]
+        if area >= MIN_IMAGE_AREA:
+            # Bigger images and images in the main content rank higher
+            bonus = min(area // MIN_IMAGE_AREA, 10) + (5 if in_content else 0)
+            self.add_candidate(src, 'sized', bonus)
+
+    def text(self):
+        """Get the visible text with blank lines removed and multi-headlines split."""
+        lines = (line.strip() for line in '\n'.join(self.strings).splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        return '\n'.join(chunk for chunk in chunks if chunk)
+
+    def images(self):
+        """Get the image candidates, best first."""
+        return sorted(self.candidates.values(), key=lambda c: (-c['score'], c['order']))
+
+def scan_document(document, url):
+    """
+    Walk a page once, collecting its visible text and scored image candidates
+
+    Args:
+        document (str or BeautifulSoup): The page HTML or parsed document
+        url (str): The page URL, used to absolutize relative image URLs
+
+    Returns:
+        dict: text (visible text, one phrase per line) and images (list of
+            dicts with url, score and source, best first)
+    """
+    scanner = _DocumentScanner(url)
+    scanner.scan(_as_soup(document))
+    return {
+        'text': scanner.text(),
+        'images': [{'url': c['url'], 'score': c['score'], 'source': c['source']} for c in scanner.images()]
+    }
+
+def extract_main_content(html, url):
+    """
+    Extract the main body text and metadata of an article with trafilatura
+
+    Drops navigation, footers, comments and other boilerplate that the
+    document scan keeps. Needs the raw HTML, since trafilatura parses it
+    with its own lxml tree.
+
+    Args:
+        html (str): The page HTML
+        url (str): The page URL
+
+    Returns:
+        dict or None: text, title, author, date, description, sitename and
+            image, or None if trafilatura is unavailable or found no main text
+    """
+    try:
+        import trafilatura
+    except ImportError:
+        return None
+
+    result = trafilatura.extract(
+        html,
+        url=url,
+        output_format='json',
+        with_metadata=True,
+        include_comments=False,
+        include_tables=False
+    )
+    if not result:
+        return None
+
+    data = json.loads(result)
+    return {key: data.get(key) for key in MAIN_CONTENT_FIELDS}
+
+def article_content_from_scan(scan, main_content=None):
+    """
+    Build the content, summary and image of an article from a document scan
+
+    Args:
+        scan (dict): Result from scan_document
+        main_content (dict, optional): Result from extract_main_content; its
+            text replaces the full-page scan text when it is long enough
+
+    Returns:
+        dict: content, summary and image_url (None if no image was found)
+    """
+    text = scan['text']
+    summary = None
+    if main_content and len(main_content.get('text') or '') >= MIN_MAIN_TEXT_LENGTH:
+        text = main_content['text']
+        summary = main_content.get('description')
+    
+    # Limit content length to avoid storing too much data
+    if len(text) > MAX_CONTENT_LENGTH:
+        text = text[:MAX_CONTENT_LENGTH] + "... [content truncated]"
+    
+    # Create a simple summary (first 500 characters) unless the page has a description
+    if not summary:
+        summary = text[:500] + "..." if len(text) > 500 else text
+    
+    image_url = scan['images'][0]['url'] if scan['images'] else None
+    if image_url:
+        logging.info(f"Found image using {scan['images'][0]['source']}: {image_url}")
+    elif main_content and main_content.get('image'):
+        image_url = _absolute_image_url(main_content['image'], '')
+    
+    return {
+        'content': text,
+        'summary': summary,
+        'image_url': image_url
+    }
+
+def preview_image_from_scan(scan):
+    """
+    Pick a preview image from a document scan, ignoring unsized inline images
+
+    Args:
+        scan (dict): Result from scan_document
+
+    Returns:
+        str: The image URL, or empty string if none found
+    """
+    for image in scan['images']:
+        if image['source'] != 'inline':
+            return image['url']
+    return ""
+
+def extract_article_content(document, url):
+    """
+    Extract the text, summary and main image of an article page
+
+    Args:
+        document (str or BeautifulSoup): The page HTML or parsed document
+        url (str): The page URL, used to absolutize relative image URLs
+
+    Returns:
+        dict: content, summary and image_url (None if no image was found)
+    """
+    return article_content_from_scan(scan_document(document, url))
+
+def extract_preview_image(document, url):
+    """
+    Find the best preview image of a page, Microlink style
+
+    Args:
+        document (str or BeautifulSoup): The page HTML or parsed document
+        url (str): The page URL, used to absolutize relative image URLs
+
+    Returns:
+        str: The image URL, or empty string if none found
+    """
+    return preview_image_from_scan(scan_document(document, url))
+
+def get_extraction_pool():
+    """
+    Get the shared extraction process pool started by configure_extraction
+
+    The pool is never created here: callers may be threads, and forking a
+    multi-threaded process can deadlock on locks held by other threads.
+
+    Returns:
+        ProcessPoolExecutor or None: The pool, or None when extraction runs inline
+    """
+    return _pool
+
+def configure_extraction(workers):
+    """
+    Set the number of extraction worker processes and start them
+
+    Call this before starting fetch, worker or request threads, so the
+    workers are forked from a single-threaded process. Once other threads
+    are running, a pool that would have to be forked is not started (or
+    resized) and extraction keeps its current setup.
+
+    Args:
+        workers (int): Number of worker processes, 0 to run extraction inline
+
+    Returns:
+        ProcessPoolExecutor or None: The pool, or None when extraction runs inline
+    """
+    global EXTRACTION_WORKERS, _pool, _pool_workers
+    with _pool_lock:
+        if workers <= 0:
+            EXTRACTION_WORKERS = 0
+            _shutdown_pool()
+            return None
+        if _pool is not None and _pool_workers == workers:
+            return _pool
+
+        # Fork so workers don't re-import the app's main module
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        if method == 'fork' and threading.active_count() > 1:
+            logging.warning(f"Not starting {workers} extraction processes: other threads are running; "
+                            f"configure extraction before starting threads")
+            return _pool
+
+        EXTRACTION_WORKERS = workers
+        _shutdown_pool()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        # With fork, all workers are started by the first task
+        pool.submit(int).result()
+        _pool, _pool_workers = pool, workers
+        logging.info(f"Started extraction pool with {workers} processes using {HTML_PARSER}")
+        return _pool
+
+def _shutdown_pool():
+    """Stop the pool's processes. Caller holds _pool_lock."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+        _pool_workers = 0
+
+def shutdown_extraction_pool():
+    """Stop the extraction worker processes, if any."""
+    with _pool_lock:
+        _shutdown_pool()
+
+def use_main_content_extractor():
+    """Check whether article text should come from extract_main_content."""
+    global CONTENT_EXTRACTOR
+    if CONTENT_EXTRACTOR == 'trafilatura' and importlib.util.find_spec('trafilatura') is None:
+        logging.warning("trafilatura is not installed, using the document scan text")
+        CONTENT_EXTRACTOR = 'scan'
+    elif CONTENT_EXTRACTOR not in CONTENT_EXTRACTORS:
+        logging.warning(f"Unknown CONTENT_EXTRACTOR {CONTENT_EXTRACTOR}, using scan")
+        CONTENT_EXTRACTOR = 'scan'
+    return CONTENT_EXTRACTOR == 'trafilatura'
+
+def run_extraction(func, html, url, soup=None):
+    """
+    Run an extraction function in the process pool, or inline when there is none
+
+    Args:
+        func (callable): A module-level extraction function from this module
+        html (str): The page HTML, sent to the worker process
+        url (str): The page URL
+        soup (BeautifulSoup, optional): An already parsed document, used
+            instead of re-parsing when extraction runs inline
+
+    Returns:
+        The extraction function's result
+    """
+    pool = get_extraction_pool()
+    if pool is None:
+        return func(soup if soup is not None else html, url)
+    return pool.submit(func, html, url).result()
@@ -1,25 +1,48 @@
-import requests
-from bs4 import BeautifulSoup
+import os
 import logging
 import time
 import re
 import json
 from urllib.parse import urlparse, parse_qs, unquote
 from functools import lru_cache
-from cachetools import TTLCache
+from sqlalchemy import or_
 import base64
+import hashlib
+import http_client
+from page_fetch import fetch_page, extract_page
+from extraction import parse_html, scan_document, preview_image_from_scan
+from thumbnail_cache import lookup_thumbnail, remember_thumbnail, flush_thumbnail_cache
+from domain_profiles import order_strategies, record_strategy
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Use a TTL cache for thumbnail URLs - will expire after 7 days (604800 seconds)
-# maxsize is the maximum number of items to cache
-thumbnail_cache = TTLCache(maxsize=1000, ttl=604800)
-domains_cache = TTLCache(maxsize=1000, ttl=604800)
-
 # Marker for Google placeholder images
 GOOGLE_PLACEHOLDER_SUBSTR = 'news.google.com/img/icons/'
 
+# Batch image updates: lookup threads, lookups per host, articles per commit and per ID query
+DEFAULT_IMAGE_WORKERS = int(os.environ.get("IMAGE_UPDATE_WORKERS", "8"))
+DEFAULT_IMAGE_DELAY = float(os.environ.get("IMAGE_UPDATE_DELAY", "0.5"))
+DEFAULT_IMAGE_PER_HOST = int(os.environ.get("IMAGE_UPDATE_PER_HOST", "2"))
+DEFAULT_IMAGE_BATCH_SIZE = 50
+DEFAULT_IMAGE_CHUNK_SIZE = 500
+
+# Page-based thumbnail strategies in their default order; domain_profiles reorders them per publisher
+THUMBNAIL_PAGE_STRATEGIES = ('head_preview', 'page_preview', 'meta_images')
+
+# Branded placeholders are served by the /placeholder route; bump the style when the SVG changes
+PLACEHOLDER_STYLE = 'v1'
+PLACEHOLDER_PATH_PREFIX = '/placeholder/'
+
+# Publisher logos used when a page has no image of its own
+LOGO_HOST = 'logo.clearbit.com'
+
+# Markers for stored images that are placeholders and may be upgraded later
+PLACEHOLDER_IMAGE_MARKERS = ('placehold.co', 'data:image/svg+xml;base64', PLACEHOLDER_PATH_PREFIX, LOGO_HOST)
+
+# Articles converted per commit by migrate_placeholder_images
+DEFAULT_PLACEHOLDER_BATCH_SIZE = 500
+
 def unwrap_google_link(url):
     """
     Extracts the actual article URL from a Google News URL
@@ -59,11 +82,9 @@ def unwrap_google_link(url):
         if 'news.google.com/articles' in url:
             # Try to extract the actual article URL from the Google News URL
             try:
-                response = requests.get(url, timeout=5, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                })
+                response = http_client.get(url, timeout=5)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     # Look for the canonical link
                     canonical = soup.find('link', rel='canonical')
                     if canonical and canonical.get('href'):
@@ -99,6 +120,32 @@ def looks_like_google_placeholder(image_url):
     # Additional checks for Google placeholders could be added here
     return False
 
+def is_placeholder_image(image_url):
+    """
+    Check if a stored article image is missing or only a placeholder
+    
+    Args:
+        image_url (str): The stored image URL
+        
+    Returns:
+        bool: True if the image should be replaced by a real one when found
+    """
+    if not image_url:
+        return True
+    return any(marker in image_url for marker in PLACEHOLDER_IMAGE_MARKERS)
+
+def placeholder_image_condition(column):
+    """
+    SQL equivalent of is_placeholder_image for an image URL column
+    
+    Args:
+        column: The SQLAlchemy column or expression holding the image URL
+        
+    Returns:
+        A SQLAlchemy boolean expression
+    """
+    return or_(column.is_(None), column == '', *(column.contains(marker) for marker in PLACEHOLDER_IMAGE_MARKERS))
+
 def get_domain_from_url(url):
     """
     Extract the domain name from a URL
@@ -132,9 +179,25 @@ def get_favicon_url(domain):
     Returns:
         str: The favicon URL
     """
-    return f"https://logo.clearbit.com/{domain}"
+    return f"https://{LOGO_HOST}/{domain}"
 
-def fetch_microlink_preview(url):
+def get_logo_fallback(article_url):
+    """
+    Get the image used for an article whose page has no image of its own
+    
+    Args:
+        article_url (str): The article URL
+        
+    Returns:
+        str: The publisher's logo, or the branded placeholder without a domain
+    """
+    domain = get_domain_from_url(article_url)
+    if not domain or domain == 'unknown':
+        return get_branded_placeholder(article_url)['image_url']
+    # Use Clearbit's logo API with size parameter for better quality
+    return f"{get_favicon_url(domain)}?size=200"
+
+def fetch_microlink_preview(url, page=None):
     """
     Simulate Microlink API by using a more advanced extraction approach
     
@@ -144,261 +207,151 @@ def fetch_microlink_preview(url):
     
     Args:
         url (str): The URL to extract an image from
+        page (dict, optional): An existing page fetch result for the URL
         
     Returns:
         str: The image URL, or empty string if none found
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Fetch with a more generous timeout for complex pages
-        response = requests.get(url, timeout=10, headers=headers)
-        if response.status_code != 200:
+        # Fetch with a more generous timeout for complex pages, reusing the run's copy if any
+        if page is None:
+            page = fetch_page(url, timeout=10)
+        if page['status_code'] != 200:
             return ""
             
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Try to extract from JSON-LD structured data first (often has high quality images)
-        for script in soup.find_all('script', type='application/ld+json'):
-            if script.string:
-                try:
-                    data = json.loads(script.string)
-                    # Handle different JSON-LD formats
-                    if isinstance(data, dict):
-                        # Single item
-                        img = data.get('image')
-                        if img:
-                            if isinstance(img, str):
-                                return img
-                            elif isinstance(img, dict) and 'url' in img:
-                                return img['url']
-                            elif isinstance(img, list) and len(img) > 0:
-                                first_img = img[0]
-                                if isinstance(first_img, str):
-                                    return first_img
-                                elif isinstance(first_img, dict) and 'url' in first_img:
-                                    return first_img['url']
-                    elif isinstance(data, list) and len(data) > 0:
-                        # Array of items
-                        for item in data:
-                            if isinstance(item, dict) and 'image' in item:
-                                img = item['image']
-                                if isinstance(img, str):
-                                    return img
-                                elif isinstance(img, dict) and 'url' in img:
-                                    return img['url']
-                except:
-                    # Skip invalid JSON
-                    pass
-        
-        # Look for schema.org image property
-        schema_img = soup.find('[itemprop="image"]')
-        if schema_img:
-            src = schema_img.get('src') or schema_img.get('content')
-            if src:
-                if src.startswith('//'):
-                    src = 'https:' + src
-                return src
-        
-        # Try picture elements with source tags (responsive images)
-        pictures = soup.find_all('picture')
-        for picture in pictures:
-            # Look for the highest quality source
-            sources = picture.find_all('source')
-            for source in sources:
-                src = source.get('srcset')
-                if src:
-                    # Extract the first image from srcset
-                    srcset_parts = src.split(',')
-                    if srcset_parts:
-                        first_img = srcset_parts[0].strip().split(' ')[0]
-                        if first_img.startswith('//'):
-                            first_img = 'https:' + first_img
-                        if first_img.startswith('http'):
-                            return first_img
-            
-            # Fallback to img tag inside picture
-            img = picture.find('img')
-            if img:
-                src = img.get('src')
-                if src:
-                    if src.startswith('//'):
-                        src = 'https:' + src
-                    if src.startswith('http'):
-                        return src
-        
-        # Look for any large images with priority to ones in articles
-        min_area = 40000  # Minimum area (e.g., 200x200) to qualify as article image
-        largest_area = 0
-        largest_img = None
-        
-        priority_containers = soup.select('article, .article, .post, main, .content, .main')
-        containers = [soup] + priority_containers  # Search entire document, but prioritize content areas
-        
-        for container in containers:
-            for img in container.find_all('img'):
-                src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if not src or src.startswith('data:'):
-                    continue
-                
-                # Filter out likely non-content images
-                lower_src = src.lower()
-                if any(skip in lower_src for skip in ['logo', 'icon', 'avatar', 'spinner', 'pixel', 'tracking', 'banner', 'advertisement', 'ad-']):
-                    continue
-                
-                # Get dimensions
-                width = img.get('width')
-                height = img.get('height')
-                
-                # Check for dimensions in style attribute
-                if not (width and height):
-                    style = img.get('style', '')
-                    width_match = re.search(r'width:\s*(\d+)px', style)
-                    height_match = re.search(r'height:\s*(\d+)px', style)
-                    if width_match and height_match:
-                        width = width_match.group(1)
-                        height = height_match.group(1)
-                
-                # If we have dimensions, calculate area
-                if width and height and str(width).isdigit() and str(height).isdigit():
-                    area = int(width) * int(height)
-                    if area > largest_area:
-                        largest_area = area
-                        
-                        # Make it an absolute URL if needed
-                        if src.startswith('//'):
-                            src = 'https:' + src
-                        elif src.startswith('/'):
-                            parsed_url = urlparse(url)
-                            base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                            src = base + src
-                            
-                        if src.startswith(('http://', 'https://')):
-                            largest_img = src
-                
-                # If we found an image with sufficient size in a priority container, use it
-                if largest_area >= min_area and container != soup:
-                    return largest_img
-        
-        # Return the largest image found in any container if it meets the size requirement
-        if largest_area >= min_area and largest_img:
-            return largest_img
-            
-        return ""
+        # Shares the single document scan with content extraction
+        scan = extract_page(page, scan_document)
+        return preview_image_from_scan(scan) if scan else ""
     except Exception as e:
         logging.warning(f"Error in advanced image extraction: {str(e)}")
         return ""
 
-def get_thumbnail_from_url(raw_url):
+def _thumbnail_from_head(url, page):
+    """Preview image from the metadata in <head>, reading only that far."""
+    page = page or fetch_page(url, timeout=10, head_only=True)
+    return page, fetch_microlink_preview(url, page)
+
+def _thumbnail_from_body(url, page):
+    """Preview image from the whole size-capped page, including in-page images."""
+    if page is None or page['head_only']:
+        page = fetch_page(url, timeout=10)
+    return page, fetch_microlink_preview(url, page)
+
+def _thumbnail_from_meta_images(url, page):
+    """First image candidate that isn't inline: Open Graph, Twitter, article:image, then large images."""
+    page = page or fetch_page(url, timeout=5, head_only=True)
+    scan = extract_page(page, scan_document) if page['status_code'] == 200 else None
+    for image in (scan['images'] if scan else []):
+        if image['source'] in ('inline', 'picture'):
+            continue
+        if not looks_like_google_placeholder(image['url']):
+            return page, image['url']
+    return page, None
+
+_THUMBNAIL_STRATEGIES = {
+    'head_preview': _thumbnail_from_head,
+    'page_preview': _thumbnail_from_body,
+    'meta_images': _thumbnail_from_meta_images
+}
+
+def get_thumbnail_from_url(raw_url, page=None):
     """
     Get a thumbnail image URL for an article URL
     
     Args:
         raw_url (str): The article URL to get a thumbnail for
+        page (dict, optional): An existing page fetch result for the article
         
     Returns:
         str: The thumbnail URL, or None if none found
     """
     try:
-        # Check cache first
-        if raw_url in thumbnail_cache:
-            return thumbnail_cache[raw_url]
-            
-        # Unwrap Google News URLs
-        url = unwrap_google_link(raw_url)
+        # Unwrap Google News URLs, using the persistent resolution cache
+        from url_resolver import resolve_google_news_url
         
-        # Get domain for fallback
-        domain = get_domain_from_url(url)
+        # Check the shared cache first; pages without a real image get the logo fallback
+        cached = lookup_thumbnail(raw_url)
+        if cached:
+            status, image_url = cached
+            return image_url if status == 'found' else get_logo_fallback(resolve_google_news_url(raw_url))
         
-        # Try to get image from various sources
+        url = resolve_google_news_url(raw_url)
         image_url = None
         
-        # 1. Try to get the publication logo first
-        logo_url = get_favicon_url(domain)
-        if logo_url:
-            # Use Clearbit's logo API with size parameter for better quality
-            image_url = f"{logo_url}?size=200"
+        # The page-based steps below share one download and parse of the page
+        if page is None or page['url'] != url:
+            page = None
         
-        # 2. If no logo, try Microlink-style extraction
-        if not image_url:
-            image_url = fetch_microlink_preview(url)
-        
-        # 3. If still no image, try Open Graph tags
-        if not image_url or looks_like_google_placeholder(image_url):
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+        # 1-3. Try the page-based strategies, the ones that work on this publisher first
+        tried = set()
+        for strategy in order_strategies(url, 'thumbnail', THUMBNAIL_PAGE_STRATEGIES):
+            # With the whole page already read, the body preview would repeat the head preview
+            if strategy == 'page_preview' and 'head_preview' in tried and page and not page['head_only']:
+                continue
+            started = time.monotonic()
             try:
-                response = requests.get(url, timeout=5, headers=headers)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Try Open Graph image
-                    og_image = soup.find('meta', property='og:image') or soup.find('meta', attrs={'name': 'og:image'})
-                    if og_image and og_image.get('content'):
-                        image_url = og_image.get('content')
-                    
-                    # Try Twitter image
-                    if not image_url or looks_like_google_placeholder(image_url):
-                        twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-                        if twitter_image and twitter_image.get('content'):
-                            image_url = twitter_image.get('content')
-                    
-                    # Try article:image
-                    if not image_url or looks_like_google_placeholder(image_url):
-                        article_image = soup.find('meta', attrs={'name': 'article:image'})
-                        if article_image and article_image.get('content'):
-                            image_url = article_image.get('content')
-                    
-                    # Try first large image in article
-                    if not image_url or looks_like_google_placeholder(image_url):
-                        for img in soup.find_all('img'):
-                            src = img.get('src') or img.get('data-src')
-                            if src and not looks_like_google_placeholder(src):
-                                # Check if image is reasonably sized
-                                width = img.get('width')
-                                height = img.get('height')
-                                if width and height and int(width) > 200 and int(height) > 200:
-                                    image_url = src
-                                    break
-            except:
-                pass
+                page, image_url = _THUMBNAIL_STRATEGIES[strategy](url, page)
+            except Exception:
+                image_url = None
+            tried.add(strategy)
+            found = bool(image_url) and not looks_like_google_placeholder(image_url)
+            record_strategy(url, 'thumbnail', strategy, found, (time.monotonic() - started) * 1000)
+            if found:
+                break
         
-        # 4. If still no image, generate a branded placeholder
+        # 4. If the page has no image, fall back to the publication logo
         if not image_url or looks_like_google_placeholder(image_url):
-            placeholder_data = get_branded_placeholder(url)
-            image_url = placeholder_data['image_url']
+            # Cached as a negative entry so the page is retried sooner
+            remember_thumbnail(raw_url, None)
+            return get_logo_fallback(url)
         
         # Cache the result
-        if image_url:
-            thumbnail_cache[raw_url] = image_url
-            
+        remember_thumbnail(raw_url, image_url)
         return image_url
         
     except Exception as e:
         logging.error(f"Error getting thumbnail for {raw_url}: {str(e)}")
         return None
 
-def get_branded_placeholder(article_url, title=None):
+def placeholder_key(domain):
     """
-    Generate a branded placeholder for articles without images
-    Uses either a gradient or a solid color background with site favicon
+    Normalize a domain into the key a placeholder is stored and served under
     
     Args:
-        article_url (str): The article URL to use for domain extraction
-        title (str, optional): The article title for additional context
+        domain (str): The domain, possibly empty or with a port
+        
+    Returns:
+        str: Lowercase letters, digits, dots and hyphens only, 'unknown' if nothing is left
+    """
+    key = re.sub(r'[^a-z0-9.-]', '', (domain or '').lower().split(':')[0]).strip('.')
+    return key or 'unknown'
+
+def placeholder_path(domain):
+    """
+    Get the path of the branded placeholder for a domain
     
+    Args:
+        domain (str): The domain the placeholder shows the logo of
+        
     Returns:
-        dict: Dictionary with image_url, favicon_url, and domain
+        str: e.g. /placeholder/v1/techcrunch.com.svg
     """
-    domain = get_domain_from_url(article_url)
+    return f"{PLACEHOLDER_PATH_PREFIX}{PLACEHOLDER_STYLE}/{placeholder_key(domain)}.svg"
+
+@lru_cache(maxsize=1024)
+def render_placeholder(key):
+    """
+    Render the branded placeholder SVG for a placeholder key
     
-    # Get the favicon URL for the domain
-    favicon_url = get_favicon_url(domain)
+    Args:
+        key (str): A key from placeholder_key
+        
+    Returns:
+        tuple: (svg bytes, ETag) where the ETag is a hash of the SVG
+    """
+    favicon_url = get_favicon_url(key)
     
-    # Create SVG with logo in the center
+    # Gradient background with the site logo in the center
     svg_content = f'''
     <svg xmlns="http://www.w3.org/2000/svg" width="800" height="400">
         <defs>
@@ -413,116 +366,361 @@ def get_branded_placeholder(article_url, title=None):
     '''
     
     svg_bytes = svg_content.strip().encode('utf-8')
-    b64_svg = base64.b64encode(svg_bytes).decode('utf-8')
-    image_url = f"data:image/svg+xml;base64,{b64_svg}"
+    return svg_bytes, hashlib.sha1(svg_bytes).hexdigest()
+
+def get_branded_placeholder(article_url, title=None):
+    """
+    Generate a branded placeholder for articles without images
+    Uses a gradient background with the site favicon
+    
+    The image itself is served by the /placeholder route, so only its short
+    path is stored with the article.
+    
+    Args:
+        article_url (str): The article URL to use for domain extraction
+        title (str, optional): The article title for additional context
+    
+    Returns:
+        dict: Dictionary with image_url, favicon_url, and domain
+    """
+    domain = get_domain_from_url(article_url)
     
     return {
-        'image_url': image_url,
-        'favicon_url': favicon_url,
+        'image_url': placeholder_path(domain),
+        'favicon_url': get_favicon_url(domain),
         'domain': domain
     }
 
-def update_article_images_from_urls(db, Article):
+def placeholder_from_data_uri(image_url):
     """
-    Updates all articles in the database with images extracted from their URLs
-    Uses improved image extraction with fallbacks and branded placeholders
+    Convert a base64 SVG placeholder from before the /placeholder route into its path
+    
+    The domain is read from the logo URL inside the SVG, so the placeholder
+    looks the same as before.
+    
+    Args:
+        image_url (str): A stored image URL
+        
+    Returns:
+        str: The placeholder path, or None if image_url isn't an SVG data URI
+    """
+    if not image_url or not image_url.startswith('data:image/svg+xml;base64,'):
+        return None
+    try:
+        svg = base64.b64decode(image_url.split(',', 1)[1]).decode('utf-8', 'replace')
+    except ValueError:
+        svg = ''
+    match = re.search(r'logo\.clearbit\.com/([^"?\s]*)', svg)
+    return placeholder_path(match.group(1) if match else '')
+
+def migrate_placeholder_images(db, Article, batch_size=DEFAULT_PLACEHOLDER_BATCH_SIZE,
+                               should_stop=None, report_progress=None):
+    """
+    Replace stored base64 SVG placeholders with /placeholder paths
+    
+    Articles are read in ID order with only their ID and image, and updated
+    batch_size at a time. No network requests are made.
     
     Args:
         db: SQLAlchemy database connection
         Article: Article model class
+        batch_size (int): Number of articles updated per commit
+        should_stop (callable, optional): Checked between batches
+        report_progress (callable, optional): Called with a progress dict after each batch
         
     Returns:
-        dict: Statistics about the update process
+        dict: Articles converted and bytes of image data removed
     """
-    # Get all articles that might need image updates
-    articles_needing_images = Article.query.filter(
-        (Article.image_url.is_(None)) | 
-        (Article.image_url == "") | 
-        (Article.image_url.like('%placeholder%')) |
-        (Article.image_url.like('%data:image/svg%'))
-    ).all()
+    condition = Article.image_url.like('data:image/svg+xml;base64,%')
+    total = Article.query.filter(condition).count()
+    stats = {'total': total, 'converted': 0, 'bytes_saved': 0}
+    
+    last_id = 0
+    while not (should_stop and should_stop()):
+        rows = db.session.query(Article.id, Article.image_url).filter(
+            condition, Article.id > last_id
+        ).order_by(Article.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        
+        updates = []
+        for article_id, image_url in rows:
+            path = placeholder_from_data_uri(image_url)
+            updates.append({'id': article_id, 'image_url': path})
+            stats['bytes_saved'] += len(image_url) - len(path)
+        stats['converted'] += len(updates) - _save_image_updates(db, Article, updates)
+        
+        if report_progress:
+            report_progress({'converted': stats['converted'], 'total': total})
     
-    # Also update Google News URLs that might have placeholder images
-    google_articles = Article.query.filter(
+    logging.info(f"Converted {stats['converted']} of {total} placeholder images, "
+                 f"{stats['bytes_saved'] // 1024} KB smaller")
+    return stats
+
+def _resolve_article_url(app, url):
+    """Resolve a Google News URL to the publisher's URL; runs in a worker thread."""
+    from url_resolver import resolve_google_news_url
+
+    # An app context lets the URL and thumbnail caches use their tables
+    with app.app_context():
+        return resolve_google_news_url(url) or url
+
+def _find_article_image(app, url):
+    """Find the thumbnail of a resolved article URL; runs in a worker thread."""
+    with app.app_context():
+        return get_thumbnail_from_url(url)
+
+def _iter_image_candidates(db, Article, limit=None, chunk_size=DEFAULT_IMAGE_CHUNK_SIZE):
+    """
+    Stream articles whose image may need updating, in ID order
+
+    Only the columns the updater needs are loaded, chunk_size rows at a time.
+
+    Yields:
+        tuple: (id, url, title, image_url)
+    """
+    condition = or_(
+        placeholder_image_condition(Article.image_url),
+        Article.image_url.like('%placeholder%'),
+        Article.image_url.like('%data:image/svg%'),
+        # Google News URLs may still need unwrapping
         Article.url.like('%news.google.com%')
-    ).all()
+    )
+    last_id = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = db.session.query(Article.id, Article.url, Article.title, Article.image_url).filter(
+            condition, Article.id > last_id
+        ).order_by(Article.id).limit(size).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        yield from rows
+
+def _save_image_updates(db, Article, updates):
+    """
+    Write a batch of image and URL updates in one transaction
+
+    If the batch fails (for example an unwrapped URL that another article
+    already has), it is retried row by row so one bad row doesn't lose the batch.
+
+    Returns:
+        int: Number of rows that could not be written
+    """
+    from sqlalchemy import update
+    from response_cache import bump_data_version
+
+    if not updates:
+        return 0
+    try:
+        db.session.execute(update(Article), updates)
+        db.session.commit()
+        bump_data_version()
+        return 0
+    except Exception as e:
+        logging.error(f"Error saving image batch, saving articles one by one: {str(e)}")
+        db.session.rollback()
+
+    failed = 0
+    for row in updates:
+        try:
+            db.session.execute(update(Article), [row])
+            db.session.commit()
+        except Exception as e:
+            logging.error(f"Error updating image for article {row['id']}: {str(e)}")
+            db.session.rollback()
+            failed += 1
+    bump_data_version()
+    return failed
+
+def update_article_images_from_urls(db, Article, limit=None, delay=DEFAULT_IMAGE_DELAY,
+                                    workers=DEFAULT_IMAGE_WORKERS,
+                                    per_host=DEFAULT_IMAGE_PER_HOST,
+                                    batch_size=DEFAULT_IMAGE_BATCH_SIZE,
+                                    should_stop=None, report_progress=None):
+    """
+    Updates articles in the database with images extracted from their URLs
+    Uses improved image extraction with fallbacks and branded placeholders
     
-    # Combine the lists, removing duplicates
-    article_ids = set()
-    articles = []
+    Candidate articles are streamed in ID order and looked up by a pool of
+    worker threads. At most per_host lookups run against one host at a time,
+    and requests to the same host start at least delay seconds apart. Hosts
+    are those of the publisher: Google News URLs are resolved first (from the
+    cache, or as a lookup on news.google.com) and the thumbnail lookup is then
+    queued under the resolved host. The results are written from the calling
+    thread in batches of batch_size.
     
-    for article in articles_needing_images + google_articles:
-        if article.id not in article_ids:
-            articles.append(article)
-            article_ids.add(article.id)
+    Args:
+        db: SQLAlchemy database connection
+        Article: Article model class
+        limit (int, optional): Process at most this many articles
+        delay (float): Minimum seconds between lookups on the same host
+        workers (int): Number of lookup threads
+        per_host (int): Maximum lookups in flight per host
+        batch_size (int): Number of articles updated per commit
+        should_stop (callable, optional): Checked before each lookup is
+            started; when it returns True the update finishes the lookups in
+            flight and stops
+        report_progress (callable, optional): Called with a progress dict after each batch
+        
+    Returns:
+        dict: Statistics about the update process
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from collections import Counter, defaultdict, deque
+    from flask import current_app
+    from url_resolver import flush_resolved_urls, cached_resolution
+    from domain_health import load_domain_health, save_domain_health
+    from domain_profiles import load_domain_profiles, save_domain_profiles
+    
+    app = current_app._get_current_object()
+    workers = max(int(workers), 1)
+    per_host = max(int(per_host), 1)
     
-    total_count = len(articles)
+    # Skip publishers whose circuit breaker is still open from earlier runs
+    load_domain_health()
+    load_domain_profiles()
+    
+    candidates = _iter_image_candidates(db, Article, limit)
+    total_count = 0
     updated_with_thumbnail = 0
     updated_with_placeholder = 0
     skipped = 0
+    updates = []
     
-    logging.info(f"Starting batch image update for {total_count} articles")
+    # Lookups waiting for their host, lookups in flight and when each host may be used again
+    waiting = defaultdict(deque)
+    backlog = 0
+    exhausted = False
+    in_flight = Counter()
+    next_start = {}
+    futures = {}
+    started = time.monotonic()
     
-    for i, article in enumerate(articles):
-        # Log progress periodically
-        if i % 10 == 0 and i > 0:
-            logging.info(f"Progress: {i}/{total_count} articles processed")
-            logging.info(f"Stats: {updated_with_thumbnail} w/thumbnails, {updated_with_placeholder} w/placeholders, {skipped} skipped")
-            # Commit changes in batches to avoid large transactions
-            db.session.commit()
-        
-        try:
-            # Check if this is a Google News URL that needs unwrapping
-            original_url = article.url
-            if "news.google.com" in original_url:
-                unwrapped_url = unwrap_google_link(original_url)
-                if unwrapped_url and unwrapped_url != original_url:
-                    logging.info(f"Unwrapped Google URL: {original_url[:50]}... -> {unwrapped_url[:50]}...")
-                    # Update the article URL to the unwrapped version
-                    article.url = unwrapped_url
+    def queue_lookup(candidate, url):
+        """Queue the next step of a candidate under the host it will request."""
+        step = 'thumbnail'
+        if "news.google.com" in url:
+            resolved_url = cached_resolution(url)
+            if resolved_url:
+                url = resolved_url
+            else:
+                step = 'resolve'
+        waiting[urlparse(url).netloc.lower()].append((candidate, url, step))
+    
+    logging.info(f"Starting batch image update with {workers} workers, {per_host} per host")
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images") as pool:
+        while True:
+            # Keep a bounded backlog of candidates from the ID stream
+            while not exhausted and backlog < workers * 4:
+                candidate = next(candidates, None)
+                if candidate is None:
+                    exhausted = True
+                    break
+                queue_lookup(candidate, candidate[1])
+                backlog += 1
+                total_count += 1
             
-            # Try to get a real thumbnail
-            thumbnail_url = get_thumbnail_from_url(article.url)
+            # Start lookups on hosts with a free slot whose delay has passed
+            stopping = bool(should_stop and should_stop())
+            now = time.monotonic()
+            if not stopping:
+                for host in list(waiting):
+                    queue = waiting[host]
+                    while (queue and len(futures) < workers and in_flight[host] < per_host
+                           and next_start.get(host, 0) <= now):
+                        candidate, url, step = queue.popleft()
+                        backlog -= 1
+                        in_flight[host] += 1
+                        next_start[host] = now + delay
+                        lookup = _resolve_article_url if step == 'resolve' else _find_article_image
+                        futures[pool.submit(lookup, app, url)] = (host, candidate, url, step)
+                    if not queue:
+                        del waiting[host]
             
-            if thumbnail_url:
-                # We successfully found a thumbnail!
-                old_image = article.image_url or "No image"
-                article.image_url = thumbnail_url
-                updated_with_thumbnail += 1
-                logging.info(f"Updated image for article [{article.id}]: {article.title[:50]}...")
-            else:
-                # No thumbnail found, use a branded placeholder
-                # Only update if current image is empty or a basic placeholder
-                if not article.image_url or 'placeholder' in article.image_url or 'data:image/svg' in article.image_url:
-                    placeholder_data = get_branded_placeholder(article.url, article.title)
-                    article.image_url = placeholder_data['image_url']
-                    # If we want to store domain and favicon data, we'd need to add those fields to the Article model
+            if not futures:
+                if stopping or (exhausted and not backlog):
+                    break
+                # Every waiting host is still inside its delay
+                time.sleep(max(min(next_start.get(host, 0) for host in waiting) - now, 0.01))
+                continue
+            
+            # Wake up for the first finished lookup, or when a waiting host's delay ends
+            ready = [next_start.get(host, 0) for host in waiting if in_flight[host] < per_host]
+            timeout = max(min(ready) - now, 0.01) if ready and len(futures) < workers else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                host, candidate, url, step = futures.pop(future)
+                article_id, original_url, title, image_url = candidate
+                in_flight[host] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Error updating image for article {article_id}: {str(e)}")
+                    skipped += 1
+                    continue
+                
+                if step == 'resolve':
+                    # Look up the thumbnail under the publisher's host, or the
+                    # Google URL itself if it couldn't be resolved
+                    waiting[urlparse(result).netloc.lower()].append((candidate, result, 'thumbnail'))
+                    backlog += 1
+                    continue
+                thumbnail_url = result
+                
+                if url != original_url:
+                    logging.info(f"Unwrapped Google URL: {original_url[:50]}... -> {url[:50]}...")
+                
+                if thumbnail_url and not is_placeholder_image(thumbnail_url):
+                    # We successfully found a thumbnail!
+                    new_image = thumbnail_url
+                    updated_with_thumbnail += 1
+                elif is_placeholder_image(image_url):
+                    # No thumbnail found; only replace an empty or placeholder image
+                    new_image = thumbnail_url or get_branded_placeholder(url, title)['image_url']
                     updated_with_placeholder += 1
-                    logging.info(f"Created branded placeholder for article [{article.id}]: {article.title[:50]}...")
                 else:
                     # Article already has a non-placeholder image
+                    new_image = image_url
                     skipped += 1
+                
+                if new_image != image_url or url != original_url:
+                    updates.append({'id': article_id, 'url': url, 'image_url': new_image})
             
-            # Be nice to servers - don't hammer them
-            time.sleep(0.5)
-            
-        except Exception as e:
-            logging.error(f"Error updating image for article {article.id}: {str(e)}")
-            skipped += 1
-            # Continue with the next article
-            continue
+            if len(updates) >= batch_size:
+                skipped += _save_image_updates(db, Article, updates)
+                updates = []
+                processed = updated_with_thumbnail + updated_with_placeholder + skipped
+                logging.info(f"Progress: {processed} articles processed, {updated_with_thumbnail} w/thumbnails, "
+                             f"{updated_with_placeholder} w/placeholders, {skipped} skipped")
+                if report_progress:
+                    report_progress({'processed': processed, 'updated_with_thumbnail': updated_with_thumbnail,
+                                     'updated_with_placeholder': updated_with_placeholder, 'skipped': skipped})
     
     # Final commit for any remaining changes
-    db.session.commit()
+    skipped += _save_image_updates(db, Article, updates)
+    flush_resolved_urls()
+    flush_thumbnail_cache()
+    save_domain_health()
+    save_domain_profiles()
+    
+    # Candidates still waiting when the update was stopped are not counted
+    processed = updated_with_thumbnail + updated_with_placeholder + skipped
     
     # Final summary
-    logging.info(f"Image update complete: {total_count} articles processed")
+    logging.info(f"Image update complete: {processed} articles processed in {time.monotonic() - started:.1f}s")
     logging.info(f"Successfully updated with thumbnails: {updated_with_thumbnail}")
     logging.info(f"Updated with branded placeholders: {updated_with_placeholder}")
     logging.info(f"Skipped: {skipped}")
     
     return {
-        'total': total_count,
+        'total': processed,
         'updated_with_thumbnail': updated_with_thumbnail,
         'updated_with_placeholder': updated_with_placeholder,
         'skipped': skipped
@@ -534,4 +732,4 @@ if __name__ == "__main__":
     from models import Article
     
     with app.app_context():
-        update_article_images_from_urls(db, Article)
\ No newline at end of file
+        update_article_images_from_urls(db, Article)
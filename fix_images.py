@@ -24,6 +24,7 @@ def fix_article_images():
     """Update all article images to use improved SVG placeholders"""
     # Import the placeholder generator
     from main import generate_placeholder_image
+    from response_cache import bump_data_version
     
     with app.app_context():
         # Use session.no_autoflush to avoid errors with loading relationships
@@ -48,6 +49,7 @@ def fix_article_images():
             
             # Commit any remaining changes
             db.session.commit()
+            bump_data_version()
             logging.info(f"Updated {count} articles with new SVG placeholder images")
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+"""
+Shared HTTP client for every outbound request in the project
+
+Owns a single pooled keep-alive requests.Session so repeated requests to
+the same host reuse TCP/TLS connections instead of paying a fresh handshake
+each time. The session sets the browser User-Agent, negotiates compression,
+applies default timeouts and retries transient failures with backoff.
+
+The session's transport adapter checks the domain's circuit breaker and
+waits on the per-host rate limiter before every attempt, and records its
+latency and outcome in the domain health registry afterwards. requests calls the adapter once per redirect hop, and
+retries are made by the adapter rather than inside urllib3, so redirects
+to other hosts and every retry attempt are checked, throttled and
+recorded, and each failed attempt counts towards opening the circuit.
+"""
+
+import os
+import time
+import email.utils
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+import rate_limiter
+import domain_health
+
+# Browser User-Agent shared by all fetchers
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Default (connect, read) timeout in seconds when a caller doesn't pass one
+DEFAULT_TIMEOUT = (5, 10)
+
+# Number of per-host pools kept alive, and connections kept per host
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "100"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+
+# Retry transient failures with exponential backoff (0.5s, 1s, ...)
+RETRY_TOTAL = int(os.environ.get("HTTP_RETRY_TOTAL", "2"))
+RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset(['GET', 'HEAD'])
+
+# Longest Retry-After honored before a retry, in seconds
+RETRY_AFTER_MAX = float(os.environ.get("HTTP_RETRY_AFTER_MAX", "30"))
+
+_session = None
+_session_lock = threading.Lock()
+
+def _retry_after(response):
+    """Get the delay a 429/503 response asks for, in seconds, or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value) if email.utils.parsedate_tz(value) else None
+        if parsed is None:
+            return None
+        delay = parsed.timestamp() - time.time()
+    return min(max(delay, 0.0), RETRY_AFTER_MAX)
+
+def _should_retry(error, attempt):
+    """Connection failures are retried up to RETRY_TOTAL times, read timeouts once."""
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return attempt == 0
+    return isinstance(error, requests.exceptions.ConnectionError)
+
+class HealthCheckedAdapter(HTTPAdapter):
+    """
+    Transport adapter that applies the circuit breaker, rate limit and retries per attempt
+
+    send() is called for every redirect hop. Each attempt, including
+    retries, first checks its host's circuit breaker and takes a token from
+    its host's bucket, and its latency and outcome are recorded in domain
+    health.
+    """
+
+    def _send_once(self, request, **kwargs):
+        """Send one attempt, recording it; returns (response, error)."""
+        url = request.url
+        domain_health.check_circuit(url)
+        
+        # Per-host politeness: wait for this host's token bucket, other hosts are unaffected
+        rate_limiter.limiter.acquire(url)
+        
+        started = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.RequestException as e:
+            domain_health.record_result(url, (time.monotonic() - started) * 1000, error=f"{type(e).__name__}: {str(e)}")
+            return None, e
+        error = f"HTTP {response.status_code}" if response.status_code in domain_health.FAILURE_STATUSES else None
+        domain_health.record_result(url, (time.monotonic() - started) * 1000, error=error)
+        return response, None
+
+    def send(self, request, **kwargs):
+        retryable = request.method in RETRY_METHODS
+        attempt = 0
+        while True:
+            response, error = self._send_once(request, **kwargs)
+            last_attempt = not retryable or attempt >= RETRY_TOTAL
+            if error is not None:
+                if last_attempt or not _should_retry(error, attempt):
+                    raise error
+                delay = RETRY_BACKOFF * 2 ** attempt
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = RETRY_BACKOFF * 2 ** attempt
+                response.close()
+            attempt += 1
+            logging.debug(f"Retrying {request.url} in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+
+def _build_session():
+    """Create the pooled session with retry policy and default headers."""
+    # Retries are made by the adapter, so each attempt passes the circuit breaker
+    adapter = HealthCheckedAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                   max_retries=Retry(total=0, read=False, redirect=False, raise_on_status=False))
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        # gzip/deflate always, plus brotli/zstd when the decoders are installed
+        'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+        'Connection': 'keep-alive'
+    })
+    return session
+
+def get_session():
+    """
+    Get the shared pooled session, creating it on first use
+
+    Returns:
+        requests.Session: The process-wide session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the shared session
+
+    Args:
+        method (str): HTTP method
+        url (str): The URL to request
+        **kwargs: Passed through to requests.Session.request
+
+    Returns:
+        requests.Response: The response
+    """
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    
+    # The adapter checks the circuit breaker, waits for the rate limiter and
+    # records the outcome of every hop and retry
+    return get_session().request(method, url, **kwargs)
+
+def get(url, **kwargs):
+    """Send a GET request through the shared session."""
+    kwargs.setdefault('allow_redirects', True)
+    return request('GET', url, **kwargs)
+
+def head(url, **kwargs):
+    """Send a HEAD request through the shared session."""
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, **kwargs)
+
+def get_connection_stats():
+    """
+    Get per-host connection reuse statistics for the shared session
+
+    Returns:
+        dict: Maps "scheme://host:port" to a dict with the number of
+            requests sent, new connections opened and requests that
+            reused an existing keep-alive connection
+    """
+    stats = {}
+    if _session is None:
+        return stats
+
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            stats[host] = {
+                'requests': pool.num_requests,
+                'connections': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0)
+            }
+    return stats
+
+def log_connection_stats():
+    """Log a one-line reuse summary per host, busiest hosts first."""
+    stats = get_connection_stats()
+    for host, host_stats in sorted(stats.items(), key=lambda item: item[1]['requests'], reverse=True):
+        logging.info(f"HTTP {host}: {host_stats['requests']} requests, "
+                     f"{host_stats['connections']} connections, {host_stats['reused']} reused")
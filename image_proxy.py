@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Local image proxy with an on-disk, content-addressed image store
+
+Article cards used to hot-link the publisher's image URL, so every page
+view downloaded multi-megabyte originals from third-party CDNs. Pages now
+link article images to the /images route, which downloads each image once,
+stores it on disk under the SHA-256 of its bytes (so the same image found
+under several URLs is stored once) and serves it with a one-year
+Cache-Control and an ETag for conditional GETs.
+
+Proxied links carry an HMAC of the image URL made with IMAGE_PROXY_SECRET,
+so the route only fetches URLs the app itself linked to; until that secret
+is set, pages link the original URLs. Only http(s) URLs whose host resolves
+to public addresses are downloaded, and every redirect hop is checked the
+same way, so the proxy can't be pointed at the internal network. Images
+that can't be downloaded are remembered for IMAGE_PROXY_RETRY_HOURS and
+answered with a 404 meanwhile.
+
+When Pillow is installed, cards request downscaled variants (one of
+VARIANT_WIDTHS pixels wide), stored next to the original. The store is
+capped at IMAGE_PROXY_MAX_MB; the least recently served files are evicted
+first. Set IMAGE_PROXY=0 to link the original URLs again.
+
+Usage:
+  python image_proxy.py [--evict] [--warm=N]
+
+Prints the size of the image store. --evict trims it to the size limit and
+--warm downloads the images of the N newest articles.
+"""
+
+import os
+import hmac
+import time
+import socket
+import ipaddress
+import hashlib
+import logging
+import argparse
+import datetime
+import threading
+from collections import Counter
+from urllib.parse import urlencode, urljoin, urlsplit
+from flask import has_app_context
+from cachetools import LRUCache
+from sqlalchemy import func
+
+import http_client
+from models import db, ImageProxyEntry
+
+# Link article images through the proxy
+IMAGE_PROXY_ENABLED = os.environ.get("IMAGE_PROXY", "1") == "1"
+
+# Key /images links are signed with; the proxy stays off until it is set
+IMAGE_PROXY_SECRET = os.environ.get("IMAGE_PROXY_SECRET", "")
+
+# Where images are stored, and the size the store is trimmed to
+STORE_DIR = os.environ.get("IMAGE_PROXY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "image_cache"))
+STORE_MAX_BYTES = int(os.environ.get("IMAGE_PROXY_MAX_MB", "500")) * 1024 * 1024
+
+# Largest image downloaded, and how long a failed download is remembered
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_PROXY_IMAGE_MAX_MB", "10")) * 1024 * 1024
+FAILED_TTL = datetime.timedelta(hours=int(os.environ.get("IMAGE_PROXY_RETRY_HOURS", "6")))
+
+# Redirects followed when downloading an image
+MAX_REDIRECTS = 5
+
+# Widths of the downscaled variants; card images use CARD_WIDTH
+VARIANT_WIDTHS = (200, 400, 800)
+CARD_WIDTH = 400
+
+# File extensions of downscaled variants
+VARIANT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png'}
+
+# Raster formats that are proxied; SVGs can carry scripts and are never served from our origin
+ALLOWED_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif')
+
+# Served files are touched at most this often, which orders them for eviction
+TOUCH_INTERVAL = 3600
+
+# Entries kept in process memory
+MEMORY_SIZE = 5000
+
+_memory = LRUCache(maxsize=MEMORY_SIZE)
+_url_locks = {}
+_store_bytes = None
+_stats = Counter()
+_lock = threading.Lock()
+
+def proxy_enabled():
+    """Check whether images are linked through the proxy; it needs its own signing secret."""
+    return IMAGE_PROXY_ENABLED and bool(IMAGE_PROXY_SECRET)
+
+def image_signature(image_url):
+    """Sign an image URL with IMAGE_PROXY_SECRET so the route only fetches URLs we linked."""
+    key = IMAGE_PROXY_SECRET.encode('utf-8')
+    return hmac.new(key, image_url.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+def _is_public_address(address):
+    """Check that an IP address is globally routable (not loopback, private, link-local, ...)."""
+    return ipaddress.ip_address(address).is_global
+
+def check_image_url(url):
+    """
+    Check that an image URL may be downloaded by the proxy
+
+    Raises:
+        ValueError: If the URL isn't http(s) or its host doesn't resolve
+            only to public addresses
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"Not an http(s) URL: {url}")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not resolve {parts.hostname}: {str(e)}")
+    for address in addresses:
+        if not _is_public_address(address.split('%')[0]):
+            raise ValueError(f"{parts.hostname} resolves to non-public address {address}")
+
+def proxied_image_url(image_url, width=None):
+    """
+    Get the /images link for an image URL
+
+    Placeholders, data URIs and other non-HTTP images are returned
+    unchanged, as are all images when the proxy is turned off or
+    IMAGE_PROXY_SECRET isn't set.
+
+    Args:
+        image_url (str): The stored image URL
+        width (int, optional): One of VARIANT_WIDTHS for a downscaled variant
+
+    Returns:
+        str: The link to use in an <img> tag
+    """
+    if not proxy_enabled() or not image_url or not image_url.startswith(('http://', 'https://')):
+        return image_url
+    params = {'url': image_url}
+    if width in VARIANT_WIDTHS and resizing_available():
+        params['w'] = width
+    return f"/images/{image_signature(image_url)}?{urlencode(params)}"
+
+def resizing_available():
+    """Check whether Pillow is installed for downscaled variants."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _blob_path(content_hash, width=None, extension=None):
+    """Path of a stored image, fanned out over directories by the first two hex digits."""
+    name = content_hash if width is None else f"{content_hash}_w{width}.{extension}"
+    return os.path.join(STORE_DIR, content_hash[:2], name)
+
+def _find_variant(content_hash, width):
+    """Get (path, content type) of a stored variant, or None."""
+    for extension, content_type in VARIANT_TYPES.items():
+        path = _blob_path(content_hash, width, extension)
+        if os.path.exists(path):
+            return path, content_type
+    return None
+
+def _add_store_bytes(size):
+    """Count bytes written to the store, trimming it when it grows past the limit."""
+    global _store_bytes
+    with _lock:
+        if _store_bytes is not None:
+            _store_bytes += size
+        over_limit = _store_bytes is None or _store_bytes > STORE_MAX_BYTES
+    if over_limit:
+        evict_images()
+
+def _write_blob(path, body):
+    """Write a file atomically unless it already exists."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    _add_store_bytes(len(body))
+
+def _touch(path):
+    """Mark a file as recently served so eviction keeps it longer."""
+    try:
+        if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+def _download_image(url):
+    """
+    Download an image, capped at IMAGE_MAX_BYTES
+
+    Redirects are followed by hand so check_image_url vets every hop.
+
+    Returns:
+        tuple: (body bytes, content type)
+
+    Raises:
+        ValueError: If a hop isn't allowed, or the response isn't an allowed
+            image or is too large
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        check_image_url(url)
+        with http_client.get(url, timeout=10, stream=True, allow_redirects=False) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers['Location'])
+                continue
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type not in ALLOWED_CONTENT_TYPES:
+                raise ValueError(f"Not a supported image ({content_type or 'no content type'})")
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) > IMAGE_MAX_BYTES:
+                    raise ValueError(f"Image larger than {IMAGE_MAX_BYTES} bytes")
+        return bytes(body), content_type
+    raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+
+def _save_entry(url, values):
+    """Upsert the index row of an image URL."""
+    from article_writer import dialect_insert
+
+    row = dict(values, url=url, fetched_at=datetime.datetime.utcnow())
+    try:
+        stmt = dialect_insert(ImageProxyEntry.__table__).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ImageProxyEntry.__table__.c.url],
+            set_={column: stmt.excluded[column] for column in row if column != 'url'}
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error saving image proxy entry for {url}: {str(e)}")
+        db.session.rollback()
+
+def _lookup_entry(url):
+    """Get (status, content_hash, content_type, expires_at) for a URL, memory first."""
+    with _lock:
+        entry = _memory.get(url)
+    if entry is None and has_app_context():
+        row = ImageProxyEntry.query.filter_by(url=url).first()
+        if row:
+            entry = (row.status, row.content_hash, row.content_type, row.expires_at)
+            with _lock:
+                _memory[url] = entry
+    return entry
+
+def _fetch_original(url):
+    """Download and store an image, recording the outcome; returns (content_hash, content_type) or None."""
+    try:
+        body, content_type = _download_image(url)
+    except Exception as e:
+        logging.info(f"Could not proxy image {url}: {str(e)}")
+        expires_at = datetime.datetime.utcnow() + FAILED_TTL
+        with _lock:
+            _memory[url] = ('failed', None, None, expires_at)
+            _stats['failures'] += 1
+        _save_entry(url, {'status': 'failed', 'content_hash': None, 'content_type': None,
+                          'size_bytes': None, 'expires_at': expires_at})
+        return None
+
+    content_hash = hashlib.sha256(body).hexdigest()
+    _write_blob(_blob_path(content_hash), body)
+    with _lock:
+        _memory[url] = ('stored', content_hash, content_type, None)
+        _stats['downloads'] += 1
+        _stats['downloaded_bytes'] += len(body)
+    _save_entry(url, {'status': 'stored', 'content_hash': content_hash, 'content_type': content_type,
+                      'size_bytes': len(body), 'expires_at': None})
+    return content_hash, content_type
+
+def _make_variant(content_hash, width):
+    """
+    Store a downscaled copy of an image, PNG if it has transparency and JPEG otherwise
+
+    Returns:
+        tuple or None: (path, content type) of the variant, None if the original should be served
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    with Image.open(_blob_path(content_hash)) as image:
+        # Animations would lose their frames, and small images need no variant
+        if getattr(image, 'is_animated', False) or image.width <= width:
+            return None
+        height = max(1, round(image.height * width / image.width))
+        variant = image.resize((width, height), Image.LANCZOS)
+        output = BytesIO()
+        if variant.mode in ('RGBA', 'LA', 'P'):
+            variant.save(output, format='PNG', optimize=True)
+            extension = 'png'
+        else:
+            variant.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+            extension = 'jpg'
+    path = _blob_path(content_hash, width, extension)
+    _write_blob(path, output.getvalue())
+    with _lock:
+        _stats['variants'] += 1
+    return path, VARIANT_TYPES[extension]
+
+def get_proxied_image(url, width=None):
+    """
+    Get the stored file for an image URL, downloading it on first use
+
+    Must be called inside an app context. Concurrent requests for the same
+    URL in this process share one download.
+
+    Args:
+        url (str): The original image URL
+        width (int, optional): One of VARIANT_WIDTHS for a downscaled variant;
+            ignored without Pillow or when the image is already that small
+
+    Returns:
+        dict or None: path, content_type and etag of the file to serve, None
+            if the image couldn't be downloaded
+    """
+    with _lock:
+        url_lock = _url_locks.setdefault(url, threading.Lock())
+    try:
+        with url_lock:
+            return _get_image_file(url, width)
+    finally:
+        with _lock:
+            _url_locks.pop(url, None)
+
+def _get_image_file(url, width):
+    """Look up or download an image and its variant; called holding the URL's lock."""
+    entry = _lookup_entry(url)
+    stored = None
+    if entry is not None:
+        status, content_hash, content_type, expires_at = entry
+        if status == 'failed' and expires_at > datetime.datetime.utcnow():
+            with _lock:
+                _stats['negative_hits'] += 1
+            return None
+        if status == 'stored' and os.path.exists(_blob_path(content_hash)):
+            stored = (content_hash, content_type)
+            with _lock:
+                _stats['hits'] += 1
+
+    if stored is None:
+        stored = _fetch_original(url)
+        if stored is None:
+            return None
+    content_hash, content_type = stored
+
+    if width in VARIANT_WIDTHS and resizing_available():
+        variant = _find_variant(content_hash, width)
+        if variant is None:
+            try:
+                variant = _make_variant(content_hash, width)
+            except Exception as e:
+                logging.warning(f"Could not resize image {url}: {str(e)}")
+        if variant:
+            path, variant_type = variant
+            _touch(path)
+            return {'path': path, 'content_type': variant_type, 'etag': f"{content_hash}-w{width}"}
+
+    path = _blob_path(content_hash)
+    _touch(path)
+    return {'path': path, 'content_type': content_type, 'etag': content_hash}
+
+def _scan_store():
+    """List (mtime, size, path) of every stored file."""
+    files = []
+    if not os.path.isdir(STORE_DIR):
+        return files
+    for directory, _, names in os.walk(STORE_DIR):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+def evict_images(max_bytes=None):
+    """
+    Trim the image store to max_bytes, least recently served files first
+
+    Trims to 90% of the limit so every write doesn't trigger another scan.
+    Index rows of evicted images stay; the image is downloaded again the
+    next time it is requested.
+
+    Args:
+        max_bytes (int, optional): Size limit (default: STORE_MAX_BYTES)
+
+    Returns:
+        dict: Files and bytes evicted, and the store size afterwards
+    """
+    global _store_bytes
+    max_bytes = STORE_MAX_BYTES if max_bytes is None else max_bytes
+
+    files = _scan_store()
+    total = sum(size for _, size, _ in files)
+    evicted = {'files': 0, 'bytes': 0}
+    if total > max_bytes:
+        target = int(max_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted['files'] += 1
+            evicted['bytes'] += size
+        logging.info(f"Evicted {evicted['files']} images ({evicted['bytes'] // 1024} KB) from the image store")
+
+    with _lock:
+        _store_bytes = total
+        _stats['evicted'] += evicted['files']
+    evicted['store_bytes'] = total
+    return evicted
+
+def get_image_proxy_stats():
+    """
+    Get this process's image proxy counters
+
+    Returns:
+        dict: hits, negative_hits, downloads, downloaded_bytes, failures,
+            variants, evicted and hit_ratio
+    """
+    with _lock:
+        stats = {key: _stats[key] for key in ('hits', 'negative_hits', 'downloads', 'downloaded_bytes',
+                                              'failures', 'variants', 'evicted')}
+    lookups = stats['hits'] + stats['downloads'] + stats['failures']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+    return stats
+
+def warm_images(limit):
+    """
+    Download the images of the newest articles so their first page view is fast
+
+    Must be called inside an app context.
+
+    Args:
+        limit (int): Number of articles
+
+    Returns:
+        int: Images now in the store
+    """
+    from models import Article
+
+    image_urls = [image_url for (image_url,) in db.session.query(Article.image_url).order_by(
+        Article.published_date.desc()).limit(limit) if image_url and image_url.startswith(('http://', 'https://'))]
+    stored = 0
+    for image_url in dict.fromkeys(image_urls):
+        if get_proxied_image(image_url, CARD_WIDTH):
+            stored += 1
+    return stored
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Show, trim or warm the local image store")
+    parser.add_argument("--evict", action="store_true", help="Trim the store to IMAGE_PROXY_MAX_MB")
+    parser.add_argument("--warm", type=int, metavar="N", help="Download the images of the N newest articles")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        if args.warm:
+            print(f"Stored images for {warm_images(args.warm)} articles")
+        if args.evict:
+            print(evict_images())
+        files = _scan_store()
+        counts = dict(db.session.query(ImageProxyEntry.status, func.count()).group_by(ImageProxyEntry.status).all())
+        print(f"Image store: {len(files)} files, {sum(size for _, size, _ in files) // (1024 * 1024)} MB of "
+              f"{STORE_MAX_BYTES // (1024 * 1024)} MB, {counts.get('stored', 0)} stored and "
+              f"{counts.get('failed', 0)} failed URLs, resizing {'on' if resizing_available() else 'off (no Pillow)'}")
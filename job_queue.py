@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Durable database-backed job queue for collection and maintenance work
+
+Jobs are rows in the job table. Workers claim a job by taking a lease on
+it and extend the lease with a heartbeat while the job runs. If a worker
+crashes, its lease expires and another worker claims the job again, up to
+the job's max_attempts. Failed attempts are retried with exponential
+backoff. Running jobs are cancelled cooperatively: the heartbeat sees the
+cancel request and the handler stops at its next check.
+
+Each job type has a concurrency limit shared by all workers. The defaults
+below can be overridden with JOB_CONCURRENCY, a JSON object such as
+{"collect": 1, "reprocess": 4}.
+
+Usage:
+  python job_queue.py worker [--types=collect,refresh_images] [--processes=1] [--once]
+  python job_queue.py enqueue TYPE [--payload='{"full_rescan": true}']
+  python job_queue.py list [--status=running]
+
+Job types:
+  collect         Collect news for all active keywords. Payload: engine
+                  ("serial" or "async"), full_rescan, collect_content
+  refresh_images  Refresh thumbnails of stored articles. Payload: limit, delay,
+                  workers, per_host
+  reprocess       Re-fetch content for articles stored with placeholder or
+                  thin content. Payload: article_ids or limit
+  retag           Link stored articles to the active keywords they mention,
+                  without network requests. Payload: keyword_ids (default: all)
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import argparse
+import datetime
+import zlib
+import threading
+import multiprocessing
+from sqlalchemy import and_, or_, func, select, text, update
+
+from models import db, Job
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Running jobs allowed per type across all workers
+DEFAULT_CONCURRENCY = {
+    'collect': 1,
+    'refresh_images': 1,
+    'reprocess': 2,
+    'retag': 1
+}
+
+# A job whose lease isn't renewed within this time is considered abandoned
+LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "120"))
+HEARTBEAT_SECONDS = max(LEASE_SECONDS // 4, 1)
+
+# Delay before the first retry of a failed attempt, doubled for each further attempt
+RETRY_BACKOFF_SECONDS = int(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", "60"))
+
+POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+
+def _load_concurrency():
+    concurrency = dict(DEFAULT_CONCURRENCY)
+    raw = os.environ.get("JOB_CONCURRENCY")
+    if raw:
+        try:
+            concurrency.update({job_type: int(limit) for job_type, limit in json.loads(raw).items()})
+        except (ValueError, AttributeError) as e:
+            logging.error(f"Ignoring invalid JOB_CONCURRENCY: {str(e)}")
+    return concurrency
+
+JOB_CONCURRENCY = _load_concurrency()
+
+def _loads(value):
+    return json.loads(value) if value else None
+
+def job_to_dict(job):
+    """
+    Serialize a job for the API
+
+    Args:
+        job (Job): The job
+
+    Returns:
+        dict: The job's fields with JSON columns decoded
+    """
+    return {
+        'id': job.id,
+        'type': job.job_type,
+        'status': job.status,
+        'payload': _loads(job.payload) or {},
+        'result': _loads(job.result),
+        'progress': _loads(job.progress),
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'cancel_requested': bool(job.cancel_requested),
+        'locked_by': job.locked_by,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None
+    }
+
+def enqueue_job(job_type, payload=None, max_attempts=3, unique=False):
+    """
+    Add a job to the queue
+
+    Must be called inside an app context.
+
+    Args:
+        job_type (str): One of JOB_HANDLERS
+        payload (dict, optional): Arguments for the job handler
+        max_attempts (int): Attempts before the job is marked failed
+        unique (bool): Return the existing queued or running job of this
+            type instead of adding another one
+
+    Returns:
+        Job: The new or existing job
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    if unique:
+        existing = Job.query.filter(
+            Job.job_type == job_type,
+            Job.status.in_(ACTIVE_STATUSES),
+            Job.cancel_requested.isnot(True)
+        ).order_by(Job.id).first()
+        if existing:
+            return existing
+
+    now = datetime.datetime.utcnow()
+    job = Job(
+        job_type=job_type,
+        status='queued',
+        payload=json.dumps(payload or {}),
+        max_attempts=max(max_attempts, 1),
+        run_after=now,
+        created_at=now
+    )
+    db.session.add(job)
+    db.session.commit()
+    logging.info(f"Enqueued job {job.id} ({job_type})")
+    return job
+
+def cancel_job(job_id):
+    """
+    Cancel a job
+
+    Queued jobs are cancelled at once; running jobs are asked to stop and
+    are marked cancelled by their worker. Must be called inside an app context.
+
+    Args:
+        job_id (int): The job ID
+
+    Returns:
+        Job or None: The job, or None if it doesn't exist
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return None
+
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_at = datetime.datetime.utcnow()
+    elif job.status == 'running':
+        job.cancel_requested = True
+    db.session.commit()
+    return job
+
+def _running_counts(now):
+    """Count running jobs with a live lease, per type."""
+    rows = db.session.query(Job.job_type, func.count(Job.id)).filter(
+        Job.status == 'running',
+        Job.lease_expires_at > now
+    ).group_by(Job.job_type).all()
+    return dict(rows)
+
+def _below_concurrency_limit(job, now):
+    """
+    Condition for claiming a job: fewer live running jobs of its type than its limit
+
+    Evaluated inside the claiming UPDATE, so the count and the claim are one
+    statement. On PostgreSQL the claim also takes a transaction-level advisory
+    lock per job type first, so concurrent claims of the same type are
+    serialized and each one counts the jobs claimed before it.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        lock_key = zlib.crc32(f"job_queue:{job.job_type}".encode('utf-8'))
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': lock_key})
+
+    other = Job.__table__.alias('running_job')
+    running = select(func.count()).select_from(other).where(
+        other.c.job_type == job.job_type,
+        other.c.status == 'running',
+        other.c.lease_expires_at > now,
+        other.c.id != job.id
+    ).scalar_subquery()
+    return running < JOB_CONCURRENCY.get(job.job_type, 1)
+
+def claim_job(worker_id, job_types=None):
+    """
+    Take a lease on the next runnable job
+
+    A job is runnable when it is queued and due, or running with an expired
+    lease (its worker died). Job types at their concurrency limit are
+    skipped. Claims are conditional updates that also check the limit, so
+    two workers never get the same job or together exceed a type's limit.
+    Must be called inside an app context.
+
+    Args:
+        worker_id (str): Identifies the claiming worker
+        job_types (list, optional): Only claim these job types
+
+    Returns:
+        Job or None: The claimed job, or None if nothing is runnable
+    """
+    now = datetime.datetime.utcnow()
+    running = _running_counts(now)
+    types = [job_type for job_type in (job_types or JOB_HANDLERS)
+             if job_type in JOB_HANDLERS and running.get(job_type, 0) < JOB_CONCURRENCY.get(job_type, 1)]
+    if not types:
+        return None
+
+    candidates = Job.query.filter(
+        Job.job_type.in_(types),
+        or_(
+            and_(Job.status == 'queued', Job.run_after <= now),
+            and_(Job.status == 'running', Job.lease_expires_at <= now)
+        )
+    ).order_by(Job.run_after, Job.id).limit(10).all()
+
+    for job in candidates:
+        # Only claim if nobody changed the job since it was read
+        unchanged = and_(
+            Job.id == job.id,
+            Job.status == job.status,
+            Job.attempts == job.attempts
+        )
+
+        if job.status == 'running':
+            logging.warning(f"Lease of job {job.id} held by {job.locked_by} expired")
+            if job.attempts >= job.max_attempts:
+                db.session.execute(update(Job).where(unchanged).values(
+                    status='failed',
+                    error=f"Lease expired after {job.attempts} attempts (last worker: {job.locked_by})",
+                    locked_by=None,
+                    lease_expires_at=None,
+                    finished_at=now
+                ))
+                db.session.commit()
+                continue
+
+        claimed = db.session.execute(update(Job).where(unchanged, _below_concurrency_limit(job, now)).values(
+            status='running',
+            locked_by=worker_id,
+            lease_expires_at=now + datetime.timedelta(seconds=LEASE_SECONDS),
+            heartbeat_at=now,
+            started_at=now,
+            attempts=Job.attempts + 1
+        ))
+        db.session.commit()
+        if claimed.rowcount == 1:
+            db.session.expire_all()
+            return db.session.get(Job, job.id)
+    return None
+
+class JobContext:
+    """
+    Handed to job handlers while their job runs
+
+    Handlers call should_stop() between units of work and return early when
+    it is True, and may call report_progress() with a JSON-serializable dict.
+    """
+
+    def __init__(self, job_id, payload, attempt=1):
+        self.job_id = job_id
+        self.payload = payload
+        self.attempt = attempt
+        self.cancelled = threading.Event()
+        self.lease_lost = False
+        self._progress = None
+        self._progress_lock = threading.Lock()
+
+    def should_stop(self):
+        return self.cancelled.is_set()
+
+    def report_progress(self, progress):
+        with self._progress_lock:
+            self._progress = progress
+
+    def take_progress(self):
+        with self._progress_lock:
+            progress, self._progress = self._progress, None
+            return progress
+
+def _heartbeat(app, worker_id, context, stop):
+    """Renew the job's lease until stop is set; flag cancellation and lost leases."""
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            with app.app_context():
+                now = datetime.datetime.utcnow()
+                values = {
+                    'heartbeat_at': now,
+                    'lease_expires_at': now + datetime.timedelta(seconds=LEASE_SECONDS)
+                }
+                progress = context.take_progress()
+                if progress is not None:
+                    values['progress'] = json.dumps(progress)
+                renewed = db.session.execute(update(Job).where(
+                    Job.id == context.job_id,
+                    Job.locked_by == worker_id,
+                    Job.status == 'running'
+                ).values(**values))
+                db.session.commit()
+
+                if renewed.rowcount != 1:
+                    logging.warning(f"Lost the lease on job {context.job_id}, stopping it")
+                    context.lease_lost = True
+                    context.cancelled.set()
+                elif db.session.query(Job.cancel_requested).filter(Job.id == context.job_id).scalar():
+                    context.cancelled.set()
+        except Exception as e:
+            logging.error(f"Error renewing lease on job {context.job_id}: {str(e)}")
+
+def _finish_job(worker_id, job_id, **values):
+    """Record a job's outcome if this worker still holds its lease."""
+    values.update(locked_by=None, lease_expires_at=None)
+    finished = db.session.execute(update(Job).where(
+        Job.id == job_id,
+        Job.locked_by == worker_id,
+        Job.status == 'running'
+    ).values(**values))
+    db.session.commit()
+    return finished.rowcount == 1
+
+def run_job(app, worker_id, job):
+    """
+    Run a claimed job to completion, recording its result or error
+
+    Args:
+        app (Flask): The application, for app contexts in the heartbeat thread
+        worker_id (str): The worker holding the job's lease
+        job (Job): The claimed job
+    """
+    job_id, job_type, attempts, max_attempts = job.id, job.job_type, job.attempts, job.max_attempts
+    context = JobContext(job_id, _loads(job.payload) or {}, attempts)
+    if job.cancel_requested:
+        context.cancelled.set()
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(app, worker_id, context, stop), daemon=True)
+    heartbeat.start()
+
+    logging.info(f"Running job {job_id} ({job_type}), attempt {attempts} of {max_attempts}")
+    started = time.monotonic()
+    try:
+        result = JOB_HANDLERS[job_type](context.payload, context)
+        error = None
+    except Exception as e:
+        logging.exception(f"Job {job_id} ({job_type}) failed")
+        result, error = None, f"{type(e).__name__}: {str(e)}"
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if context.lease_lost:
+        return
+
+    now = datetime.datetime.utcnow()
+    progress = context.take_progress()
+    values = {'progress': json.dumps(progress)} if progress is not None else {}
+    if context.should_stop():
+        values.update(status='cancelled', finished_at=now, result=json.dumps(result) if result is not None else None)
+    elif error is None:
+        values.update(status='succeeded', finished_at=now, result=json.dumps(result), error=None)
+    elif attempts < max_attempts:
+        retry_at = now + datetime.timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        values.update(status='queued', run_after=retry_at, error=error)
+        logging.info(f"Job {job_id} will be retried after {retry_at:%H:%M:%S}")
+    else:
+        values.update(status='failed', finished_at=now, error=error)
+
+    if _finish_job(worker_id, job_id, **values):
+        logging.info(f"Job {job_id} ({job_type}) finished as {values['status']} after {time.monotonic() - started:.1f}s")
+
+def default_worker_id():
+    """Identify this worker process by host and PID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def run_worker(job_types=None, worker_id=None, once=False, poll_seconds=POLL_SECONDS):
+    """
+    Claim and run jobs until interrupted
+
+    Args:
+        job_types (list, optional): Only run these job types
+        worker_id (str, optional): Worker name, defaults to host:pid
+        once (bool): Exit when no job is runnable instead of polling
+        poll_seconds (float): Wait between polls when the queue is empty
+    """
+    from main import app
+    from extraction import EXTRACTION_WORKERS, configure_extraction
+
+    # Start the extraction processes before any heartbeat thread exists
+    configure_extraction(EXTRACTION_WORKERS)
+
+    worker_id = worker_id or default_worker_id()
+    logging.info(f"Worker {worker_id} started for {', '.join(job_types or JOB_HANDLERS)}")
+    while True:
+        with app.app_context():
+            try:
+                job = claim_job(worker_id, job_types)
+            except Exception as e:
+                logging.error(f"Error claiming a job: {str(e)}")
+                db.session.rollback()
+                job = None
+
+            if job is not None:
+                run_job(app, worker_id, job)
+                continue
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+# Job handlers. Each takes (payload, context) and returns a JSON-serializable result.
+
+def collect_job(payload, context):
+    """Collect news for all active keywords; aborted or failed runs raise, so retries resume them."""
+    from main import collect_news_for_keywords
+
+    collect_content = payload.get('collect_content', True)
+    full_rescan = payload.get('full_rescan', False)
+    resume = payload.get('resume', context.attempt > 1)
+    if payload.get('engine', os.environ.get('COLLECTOR_ENGINE', 'serial')) == 'async':
+        from async_collector import run_async_collection
+        articles = run_async_collection(collect_content=collect_content, full_rescan=full_rescan,
+                                        should_stop=context.should_stop, resume=resume, raise_on_failure=True)
+    else:
+        articles = collect_news_for_keywords(collect_content=collect_content, full_rescan=full_rescan,
+                                             should_stop=context.should_stop, resume=resume, raise_on_failure=True)
+    return {'articles_collected': len(articles)}
+
+def refresh_images_job(payload, context):
+    """Refresh thumbnails of stored articles."""
+    from models import Article
+    from fetch_thumbnails import (update_article_images_from_urls, DEFAULT_IMAGE_DELAY, DEFAULT_IMAGE_WORKERS,
+                                  DEFAULT_IMAGE_PER_HOST)
+
+    return update_article_images_from_urls(
+        db, Article,
+        limit=payload.get('limit'),
+        delay=payload.get('delay', DEFAULT_IMAGE_DELAY),
+        workers=payload.get('workers', DEFAULT_IMAGE_WORKERS),
+        per_host=payload.get('per_host', DEFAULT_IMAGE_PER_HOST),
+        should_stop=context.should_stop,
+        report_progress=context.report_progress
+    )
+
+def reprocess_job(payload, context):
+    """Re-fetch content for articles stored with placeholder or thin content."""
+    from models import Article
+    from main import fetch_article_content
+    from article_writer import is_thin_content, is_substantial_content, thin_content_condition
+    from fetch_thumbnails import is_placeholder_image
+    from response_cache import bump_data_version
+
+    query = Article.query
+    if payload.get('article_ids'):
+        query = query.filter(Article.id.in_(payload['article_ids']))
+    else:
+        query = query.filter(thin_content_condition(Article.content))
+    articles = query.order_by(Article.id.desc()).limit(payload.get('limit', 100)).all()
+
+    updated = 0
+    for index, article in enumerate(articles, 1):
+        if context.should_stop():
+            break
+        content_data = fetch_article_content(article.url)
+        # A failed fetch returns placeholder text and images; keep what is stored
+        if not content_data.get('error'):
+            # Same upgrade rule as the batched writer
+            if is_thin_content(article.content) and is_substantial_content(content_data.get('content')):
+                article.content = content_data['content']
+                article.summary = content_data.get('summary')
+                updated += 1
+            new_image = content_data.get('image_url')
+            if new_image and not is_placeholder_image(new_image) and is_placeholder_image(article.image_url):
+                article.image_url = new_image
+        if index % 20 == 0:
+            db.session.commit()
+            context.report_progress({'processed': index, 'total': len(articles), 'updated': updated})
+    db.session.commit()
+    bump_data_version()
+    return {'processed': len(articles), 'updated': updated}
+
+def retag_job(payload, context):
+    """Tag stored articles with the active keywords they mention."""
+    from keyword_tagger import retag_articles
+
+    return retag_articles(payload.get('keyword_ids'), should_stop=context.should_stop,
+                          report_progress=context.report_progress)
+
+JOB_HANDLERS = {
+    'collect': collect_job,
+    'refresh_images': refresh_images_job,
+    'reprocess': reprocess_job,
+    'retag': retag_job
+}
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Run and manage background jobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Claim and run jobs")
+    worker.add_argument("--types", help="Comma-separated job types to run (default: all)")
+    worker.add_argument("--processes", type=int, default=1, help="Number of worker processes (default: 1)")
+    worker.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    enqueue = commands.add_parser("enqueue", help="Add a job to the queue")
+    enqueue.add_argument("type", choices=sorted(JOB_HANDLERS), help="Job type")
+    enqueue.add_argument("--payload", default="{}", help="JSON arguments for the job")
+
+    listing = commands.add_parser("list", help="Show recent jobs")
+    listing.add_argument("--status", choices=JOB_STATUSES, help="Only show jobs with this status")
+    listing.add_argument("--limit", type=int, default=20, help="Number of jobs to show (default: 20)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "worker":
+        job_types = [t.strip() for t in args.types.split(',')] if args.types else None
+        if args.processes > 1:
+            processes = [multiprocessing.Process(target=run_worker, args=(job_types,), kwargs={'once': args.once})
+                         for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        else:
+            run_worker(job_types, once=args.once)
+    else:
+        from main import app
+
+        with app.app_context():
+            if args.command == "enqueue":
+                job = enqueue_job(args.type, json.loads(args.payload))
+                print(f"Enqueued job {job.id} ({job.job_type})")
+            else:
+                query = Job.query
+                if args.status:
+                    query = query.filter_by(status=args.status)
+                for job in query.order_by(Job.id.desc()).limit(args.limit).all():
+                    print(f"{job.id:>6} {job.job_type:<15} {job.status:<10} attempts {job.attempts}/{job.max_attempts} "
+                          f"{job.created_at:%Y-%m-%d %H:%M}  {job.error or ''}")
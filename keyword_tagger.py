@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local keyword tagging with a multi-pattern (Aho-Corasick) matcher
+
+Articles are otherwise linked to a keyword only through the Google News
+search that found them. The tagger compiles the display names and aliases
+of all active keywords into one Aho-Corasick automaton over words and scans
+an article's title, summary and content in a single linear pass, linking
+the article to every keyword it mentions. Matching is case-insensitive and
+on whole words, so "Live Shopping" matches "live shopping events" but not
+"deliveshopping".
+
+ArticleBatchWriter tags every batch it writes (set KEYWORD_TAGGING=0 to
+turn this off), and the 'retag' background job scans stored articles when
+keywords are added or edited. No network requests are made.
+
+Usage:
+  python keyword_tagger.py [--keyword-ids=1,2] [--batch-size=500]
+
+Tags stored articles with the given active keywords (default: all active keywords).
+"""
+
+import os
+import re
+import logging
+import argparse
+import threading
+from collections import deque
+
+from models import db, Article, Keyword, KeywordAlias, article_keyword
+
+# Tag articles with every active keyword they mention when they are written
+TAG_NEW_ARTICLES = os.environ.get("KEYWORD_TAGGING", "1") == "1"
+
+# Articles scanned per database batch by retag_articles
+DEFAULT_BATCH_SIZE = 500
+
+_WORD = re.compile(r'\w+')
+
+def normalize_words(text):
+    """Split text into lowercase words, the unit the matcher works on."""
+    return _WORD.findall(text.lower()) if text else []
+
+def parse_aliases(text):
+    """
+    Parse a comma- or newline-separated alias list from a form field
+
+    Returns:
+        list: Distinct non-empty aliases, in the order given
+    """
+    aliases = []
+    seen = set()
+    for alias in re.split(r'[,\n]', text or ''):
+        alias = ' '.join(alias.split())[:100]
+        if alias and alias.lower() not in seen:
+            seen.add(alias.lower())
+            aliases.append(alias)
+    return aliases
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton mapping word sequences to keyword IDs
+
+    Built once from {keyword_id: [phrase, ...]}; match() then finds every
+    keyword whose phrases occur in the given texts in one pass over their
+    words, however many phrases there are.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+        self.keyword_count = 0
+
+        outputs = {}
+        for keyword_id, phrases in patterns.items():
+            added = False
+            for phrase in phrases:
+                words = normalize_words(phrase)
+                if not words:
+                    continue
+                node = 0
+                for word in words:
+                    child = self._goto[node].get(word)
+                    if child is None:
+                        child = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append(frozenset())
+                        self._goto[node][word] = child
+                    node = child
+                outputs.setdefault(node, set()).add(keyword_id)
+                added = True
+            self.keyword_count += added
+        for node, keyword_ids in outputs.items():
+            self._out[node] = frozenset(keyword_ids)
+
+        # Breadth-first failure links; each node also reports its failure node's matches
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._out[child] = self._out[child] | self._out[self._fail[child]]
+
+    def match(self, *texts):
+        """
+        Find the keywords mentioned in any of the texts
+
+        Phrases never match across two texts.
+
+        Args:
+            *texts (str): Texts to scan, None is skipped
+
+        Returns:
+            set: IDs of the matched keywords
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        for text in texts:
+            node = 0
+            for word in normalize_words(text):
+                while node and word not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(word, 0)
+                if out[node]:
+                    found.update(out[node])
+            if len(found) == self.keyword_count:
+                break
+        return found
+
+def load_keyword_patterns(keyword_ids=None):
+    """
+    Load the phrases of active keywords
+
+    Args:
+        keyword_ids (iterable, optional): Only load these keywords
+
+    Returns:
+        dict: Maps keyword ID to its display name followed by its aliases
+    """
+    query = Keyword.query.filter_by(active=True)
+    if keyword_ids is not None:
+        query = query.filter(Keyword.id.in_(list(keyword_ids)))
+    patterns = {keyword.id: [keyword.display_name] for keyword in query.all()}
+
+    if patterns:
+        rows = db.session.query(KeywordAlias.keyword_id, KeywordAlias.alias).filter(
+            KeywordAlias.keyword_id.in_(list(patterns))
+        ).order_by(KeywordAlias.id).all()
+        for keyword_id, alias in rows:
+            patterns[keyword_id].append(alias)
+    return patterns
+
+_matcher = None
+_matcher_signature = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    """
+    Get the matcher for all active keywords
+
+    Must be called inside an app context. The compiled automaton is reused
+    until a keyword's name, aliases or active state change.
+
+    Returns:
+        KeywordMatcher: The shared matcher
+    """
+    global _matcher, _matcher_signature
+
+    patterns = load_keyword_patterns()
+    signature = tuple(sorted((keyword_id, tuple(phrases)) for keyword_id, phrases in patterns.items()))
+    with _matcher_lock:
+        if signature != _matcher_signature:
+            _matcher = KeywordMatcher(patterns)
+            _matcher_signature = signature
+        return _matcher
+
+def set_keyword_aliases(keyword, aliases):
+    """
+    Replace a keyword's aliases; the caller commits
+
+    Args:
+        keyword (Keyword): The keyword
+        aliases (list): New aliases, e.g. from parse_aliases
+    """
+    display = keyword.display_name.lower()
+    keyword.aliases = [KeywordAlias(alias=alias) for alias in aliases if alias.lower() != display]
+
+def retag_articles(keyword_ids=None, batch_size=DEFAULT_BATCH_SIZE, should_stop=None, report_progress=None):
+    """
+    Link stored articles to the active keywords they mention
+
+    Must be called inside an app context. Existing links are kept; only
+    missing ones are added. Articles are read in ID order, batch_size at a
+    time, with only the columns the matcher needs.
+
+    Args:
+        keyword_ids (iterable, optional): Only tag with these keywords
+        batch_size (int): Articles scanned per batch; each batch is committed
+        should_stop (callable, optional): Checked between batches
+        report_progress (callable, optional): Called with a progress dict after each batch
+
+    Returns:
+        dict: Keywords used, articles scanned, articles matched and keyword
+            links found (including ones that already existed)
+    """
+    from article_writer import dialect_insert
+    from rollups import refresh_rollups_for_articles
+    from response_cache import bump_data_version
+
+    matcher = KeywordMatcher(load_keyword_patterns(keyword_ids))
+    stats = {'keywords': matcher.keyword_count, 'scanned': 0, 'matched': 0, 'links': 0}
+    if not matcher.keyword_count:
+        return stats
+
+    total = Article.query.count()
+    matched_ids = []
+    last_id = 0
+    while not (should_stop and should_stop()):
+        rows = db.session.query(Article.id, Article.title, Article.summary, Article.content).filter(
+            Article.id > last_id
+        ).order_by(Article.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        links = []
+        for article_id, title, summary, content in rows:
+            matched = matcher.match(title, summary, content)
+            if matched:
+                stats['matched'] += 1
+                matched_ids.append(article_id)
+                links.extend({'article_id': article_id, 'keyword_id': keyword_id} for keyword_id in matched)
+        if links:
+            db.session.execute(dialect_insert(article_keyword).values(links).on_conflict_do_nothing())
+        db.session.commit()
+
+        stats['scanned'] += len(rows)
+        stats['links'] += len(links)
+        if report_progress:
+            report_progress({'scanned': stats['scanned'], 'total': total, 'matched': stats['matched']})
+
+    # Keyword counts per day may have changed for the matched articles
+    refresh_rollups_for_articles(matched_ids)
+    if stats['links']:
+        bump_data_version()
+
+    logging.info(f"Tagged {stats['matched']} of {stats['scanned']} articles with {stats['keywords']} keywords")
+    return stats
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Tag stored articles with the active keywords they mention")
+    parser.add_argument("--keyword-ids", help="Comma-separated keyword IDs (default: all active keywords)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Articles scanned per batch (default: {DEFAULT_BATCH_SIZE})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    keyword_ids = [int(k) for k in args.keyword_ids.split(',')] if args.keyword_ids else None
+    with app.app_context():
+        print(retag_articles(keyword_ids, batch_size=args.batch_size))
@@ -3,22 +3,65 @@ import datetime
 from datetime import timedelta
 import logging
 import json
-import requests
 import feedparser
 import time
 import re
+import hmac
 import base64
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, Response
-from sqlalchemy import desc, and_, func
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, Response, send_file
+from sqlalchemy import desc, and_, func, case
+
+# Shared pooled HTTP client and per-run page fetch stage
+import http_client
+from page_fetch import fetch_page, extract_page, clear_page_cache
+from extraction import scan_document, article_content_from_scan, extract_main_content, use_main_content_extractor, MIN_MAIN_TEXT_LENGTH, EXTRACTION_WORKERS, configure_extraction
 
 # Import database models
-from models import db, Keyword, Article, article_keyword
+from models import db, Keyword, KeywordAlias, Article, article_keyword, Job, CollectionRun
 
 # Import keywords from topics.py
 from topics import KEYWORDS
 
+# Batched writes for collection runs
+from article_writer import ArticleBatchWriter
+
+# Persistent Google News URL resolution cache
+from url_resolver import resolve_google_news_url, flush_resolved_urls
+
+# Shared two-tier thumbnail cache
+from thumbnail_cache import flush_thumbnail_cache
+
+# Branded placeholders served from their own route
+from fetch_thumbnails import PLACEHOLDER_STYLE, placeholder_key, placeholder_path, render_placeholder
+
+# Local proxy and on-disk store for article images
+from image_proxy import CARD_WIDTH, VARIANT_WIDTHS, image_signature, proxied_image_url, get_proxied_image, proxy_enabled
+
+# Per-keyword high-water marks for incremental collection
+from watermarks import load_keyword_watermarks, filter_entries_by_watermark, split_feed_entries, advance_watermark, save_keyword_watermarks
+
+# Publisher latency/error registry and circuit breaker
+from domain_health import load_domain_health, save_domain_health, slowest_domains, most_failing_domains
+
+# Per-domain memory of which extraction strategies work
+from domain_profiles import should_try, record_strategy, load_domain_profiles, save_domain_profiles, domain_profiles
+
+# Checkpointed, resumable collection runs and their history
+from collection_runs import RunTracker, CollectionRunFailed, recent_runs, run_to_dict
+
+# Daily article count rollups for /trends
+from rollups import refresh_rollups_for_articles, delete_keyword_rollups, ensure_daily_rollups, daily_source_counts, daily_keyword_counts
+
+# Dashboard response cache, invalidated by a shared data version
+from response_cache import cached_view, bump_data_version, get_response_cache_stats
+
+# Local multi-pattern keyword tagging
+from keyword_tagger import parse_aliases, set_keyword_aliases
+
+# Durable background jobs for collection and maintenance
+from job_queue import enqueue_job, cancel_job, job_to_dict, JOB_HANDLERS
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -38,99 +81,60 @@ db.init_app(app)
 # Create all tables
 with app.app_context():
     db.create_all()
+    
+    # create_all only creates missing tables, so add new indexes to existing ones
+    for index in Article.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
 
-def extract_actual_url_from_google_news(google_url):
-    """Extract the actual article URL from a Google News URL."""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # For standard Google News URLs
-        if '/articles/' in google_url:
-            # First approach: Try to extract from Google News page
-            try:
-                response = requests.get(google_url, headers=headers, timeout=5, allow_redirects=True)
-                
-                # Sometimes Google News directly redirects to the actual article
-                if response.url != google_url and 'news.google.com' not in response.url:
-                    logging.info(f"Google News redirected to: {response.url}")
-                    return response.url
-                
-                # Otherwise, parse the HTML to find the link
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Look for redirect links
-                for a_tag in soup.find_all('a'):
-                    href = a_tag.get('href', '')
-                    # Skip Google internal links
-                    if href and isinstance(href, str) and href.startswith(('http', 'https')) and 'google.com' not in href:
-                        logging.info(f"Extracted article URL from Google News: {href}")
-                        return href
-                    
-                # If we couldn't find direct links, try looking for canonical URLs
-                canonical = soup.find('link', rel='canonical')
-                if canonical and canonical.get('href') and 'google.com' not in canonical.get('href'):
-                    url = canonical.get('href')
-                    logging.info(f"Found canonical URL: {url}")
-                    return url
-            except Exception as e:
-                logging.error(f"Error extracting URL from Google News page: {str(e)}")
-        
-        # Fallback approach for RSS format URLs
-        # For Google News RSS URLs, manually follow redirects to find the actual URL
-        try:
-            session = requests.Session()
-            response = session.head(google_url, headers=headers, timeout=5, allow_redirects=True)
-            final_url = response.url
-            
-            if final_url != google_url and 'news.google.com' not in final_url:
-                logging.info(f"Followed redirect to: {final_url}")
-                return final_url
-        except Exception as e:
-            logging.error(f"Error following Google News URL: {str(e)}")
-        
-        # If all extraction attempts failed, just return the original URL
-        return google_url
-    except Exception as e:
-        logging.error(f"Error extracting actual URL from Google News: {str(e)}")
-        return google_url
+@app.template_filter('proxied_image')
+def proxied_image_filter(image_url, width=CARD_WIDTH):
+    """Link an article image through the local image proxy."""
+    return proxied_image_url(image_url, width)
+
+def fetch_google_news_entries(keyword, max_results=25):
+    """Fetch the raw Google News RSS feed entries for a keyword."""
+    # Format keyword for URL
+    formatted_keyword = keyword.replace(' ', '+')
+    
+    # Google News RSS feed URL
+    rss_url = f"https://news.google.com/rss/search?q={formatted_keyword}&hl=en-US&gl=US&ceid=US:en"
+    
+    # Download through the pooled client so the feed host's connection is reused
+    response = http_client.get(rss_url, timeout=10)
+    response.raise_for_status()
+    
+    # Parse the RSS feed
+    feed = feedparser.parse(response.content)
+    return feed.entries[:max_results]
 
+def article_from_feed_entry(entry):
+    """Build an article dict from a Google News RSS entry, unwrapping its URL."""
+    # Get the Google News URL
+    google_url = entry.link
+    
+    # Try to unwrap the Google News URL to get the actual article URL
+    actual_url = extract_actual_url_from_google_news(google_url)
+    
+    # If we successfully unwrapped the URL, use that; otherwise use the Google URL
+    final_url = actual_url if actual_url and actual_url != google_url else google_url
+    
+    if actual_url and actual_url != google_url:
+        logging.info(f"Unwrapped Google News URL: {google_url} -> {actual_url}")
+    
+    return {
+        'title': entry.title,
+        'url': final_url,
+        'published_date': datetime.datetime(*entry.published_parsed[:6]) if hasattr(entry, 'published_parsed') else datetime.datetime.now(),
+        'source': entry.source.title if hasattr(entry, 'source') and hasattr(entry.source, 'title') else "Unknown Source"
+    }
 
 def fetch_news_from_google_news(keyword, max_results=25):
     """Fetch news articles for a given keyword using Google News RSS feed."""
     try:
-        # Format keyword for URL
-        formatted_keyword = keyword.replace(' ', '+')
-        
-        # Google News RSS feed URL
-        rss_url = f"https://news.google.com/rss/search?q={formatted_keyword}&hl=en-US&gl=US&ceid=US:en"
-        
-        # Parse the RSS feed
-        feed = feedparser.parse(rss_url)
-        
         # Process results
         articles = []
-        for entry in feed.entries[:max_results]:
-            # Get the Google News URL
-            google_url = entry.link
-            
-            # Try to unwrap the Google News URL to get the actual article URL
-            actual_url = extract_actual_url_from_google_news(google_url)
-            
-            # If we successfully unwrapped the URL, use that; otherwise use the Google URL
-            final_url = actual_url if actual_url and actual_url != google_url else google_url
-            
-            if actual_url and actual_url != google_url:
-                logging.info(f"Unwrapped Google News URL: {google_url} -> {actual_url}")
-            
-            article = {
-                'title': entry.title,
-                'url': final_url,
-                'published_date': datetime.datetime(*entry.published_parsed[:6]) if hasattr(entry, 'published_parsed') else datetime.datetime.now(),
-                'source': entry.source.title if hasattr(entry, 'source') and hasattr(entry.source, 'title') else "Unknown Source"
-            }
-            articles.append(article)
+        for entry in fetch_google_news_entries(keyword, max_results):
+            articles.append(article_from_feed_entry(entry))
         
         logging.info(f"Fetched {len(articles)} articles for keyword '{keyword}'")
         return articles
@@ -141,16 +145,17 @@ def fetch_news_from_google_news(keyword, max_results=25):
 
 def extract_actual_url_from_google_news(google_url):
     """Extract the actual article URL from a Google News URL."""
-    from fetch_thumbnails import unwrap_google_link
-    return unwrap_google_link(google_url)
+    # Checks the persistent resolved-URL cache before going to the network
+    return resolve_google_news_url(google_url)
 
-def get_image_from_og_tags(url):
+def get_image_from_og_tags(url, page=None):
     """
     Try to extract an image URL from Open Graph tags or other image sources.
     Uses the improved extraction function from fetch_thumbnails.py.
     
     Args:
         url (str): The URL of the article
+        page (dict, optional): An existing page fetch result for the URL
         
     Returns:
         str or None: The URL of the image, or None if not found
@@ -158,7 +163,7 @@ def get_image_from_og_tags(url):
     from fetch_thumbnails import get_thumbnail_from_url
     
     # Use the improved thumbnail extraction function
-    image_url = get_thumbnail_from_url(url)
+    image_url = get_thumbnail_from_url(url, page)
     return image_url if image_url else None
 
 def generate_placeholder_image(keyword, source):
@@ -171,12 +176,13 @@ def generate_placeholder_image(keyword, source):
 
 
 def fetch_article_content(url):
-    """Fetch and extract the content from an article URL."""
+    """
+    Fetch and extract the content from an article URL.
+    
+    When the page can't be fetched, the result holds placeholder content and
+    an 'error' describing the failure.
+    """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
         # For Google News URLs, we'll try to unwrap the URL and get the actual article
         if "news.google.com" in url:
             try:
@@ -207,228 +213,182 @@ def fetch_article_content(url):
                     return {
                         'content': content,
                         'summary': summary,
-                        'image_url': image_url
+                        'image_url': image_url,
+                        'error': "Google News URL could not be unwrapped"
                     }
             except Exception as e:
                 logging.error(f"Error processing Google News URL: {str(e)}")
                 return {
                     'content': "Click original source for full article content.",
                     'summary': article_id.replace('-', ' ')[:200],  # Use the article ID as summary
-                    'image_url': generate_placeholder_image("Google News", "news.google.com")
+                    'image_url': generate_placeholder_image("Google News", "news.google.com"),
+                    'error': str(e)
                 }
         else:
             # For regular non-Google URLs, fetch directly
             actual_url = url
-            try:
-                # Try to get content with a timeout
-                article_response = requests.get(actual_url, headers=headers, timeout=10)
-                article_response.raise_for_status()
-                
-                # Parse the HTML content
-                soup = BeautifulSoup(article_response.text, 'html.parser')
-            except (requests.exceptions.Timeout, requests.exceptions.RequestException) as e:
-                logging.warning(f"Request failed for {actual_url}: {str(e)}. Using placeholder.")
-                return {
-                    'content': f"Unable to fetch content from {actual_url}. Please visit the original article.",
-                    'summary': f"Article content not available.",
-                    'image_url': generate_placeholder_image("Error", "connection")
-                }
-        
-        # Now process the content from the actual article
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-        
-        # Try to find an image
-        image_url = None
-        
-        # First check for Twitter/Open Graph meta images (usually high quality)
-        for meta_tag in ['og:image', 'twitter:image', 'image']:
-            if image_url:
-                break
-                
-            # Try both property and name attributes
-            og_image = soup.find('meta', property=meta_tag) or soup.find('meta', attrs={'name': meta_tag})
-            if og_image and og_image.get('content'):
-                content = og_image.get('content')
-                if content and content.startswith(('http://', 'https://')):
-                    image_url = content
-                    logging.info(f"Found image using meta tag {meta_tag}: {image_url}")
-        
-        # Next look for LD+JSON structured data which often contains high-quality images
-        if not image_url:
-            for script in soup.find_all('script', type='application/ld+json'):
-                if script.string:
-                    try:
-                        json_data = json.loads(script.string)
-                        # Check for image in different JSON-LD formats
-                        if isinstance(json_data, dict):
-                            # Handle single LD+JSON object
-                            image = json_data.get('image')
-                            if image:
-                                if isinstance(image, str) and image.startswith(('http://', 'https://')):
-                                    image_url = image
-                                    logging.info(f"Found image in LD+JSON: {image_url}")
-                                    break
-                                elif isinstance(image, dict) and image.get('url'):
-                                    img_url = image.get('url')
-                                    if img_url and img_url.startswith(('http://', 'https://')):
-                                        image_url = img_url
-                                        logging.info(f"Found image in LD+JSON object: {image_url}")
-                                        break
-                                elif isinstance(image, list) and len(image) > 0:
-                                    img_item = image[0]
-                                    if isinstance(img_item, str) and img_item.startswith(('http://', 'https://')):
-                                        image_url = img_item
-                                        logging.info(f"Found image in LD+JSON array: {image_url}")
-                                        break
-                                    elif isinstance(img_item, dict) and img_item.get('url'):
-                                        img_url = img_item.get('url')
-                                        if img_url and img_url.startswith(('http://', 'https://')):
-                                            image_url = img_url
-                                            logging.info(f"Found image in LD+JSON array object: {image_url}")
-                                            break
-                    except:
-                        pass  # Skip invalid JSON
-        
-        # If still no image, look for images with specific attributes that indicate they're the main image
-        if not image_url:
-            main_selectors = [
-                'img[itemprop="image"]', 
-                'img.main-image', 
-                'img.featured-image', 
-                'img.article-image',
-                '.article-featured-image img', 
-                '.post-thumbnail img',
-                '.featured-image img',
-                '.article__featured-image img'
-            ]
-            main_images = soup.select(', '.join(main_selectors))
-            if main_images and len(main_images) > 0:
-                for img in main_images:
-                    src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                    if src:
-                        # Make sure it's an absolute URL
-                        if src.startswith('//'):
-                            src = 'https:' + src
-                        elif src.startswith('/'):
-                            # Relative URL, need to make it absolute
-                            parsed_url = urlparse(actual_url)
-                            base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                            src = base + src
-                            
-                        if src.startswith(('http://', 'https://')):
-                            image_url = src
-                            logging.info(f"Found image using main image selector: {image_url}")
-                            break
-        
-        # If still no image, look for any reasonably sized image
-        if not image_url:
-            min_area = 40000  # Minimum area (e.g., 200x200) to qualify as article image
-            largest_area = 0
-            largest_image = None
-            
-            for img in soup.find_all('img'):
-                # Skip tiny icons, spacers, and tracking pixels
-                src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if not src or src.startswith('data:') or 'icon' in src.lower() or 'logo' in src.lower():
-                    continue
-                    
-                # Get dimensions
-                width = img.get('width')
-                height = img.get('height')
-                
-                # Check for dimensions in style attribute if not in width/height attributes
-                if not (width and height):
-                    style = img.get('style', '')
-                    width_match = re.search(r'width:\s*(\d+)px', style)
-                    height_match = re.search(r'height:\s*(\d+)px', style)
-                    if width_match and height_match:
-                        width = width_match.group(1)
-                        height = height_match.group(1)
-                
-                # If we have dimensions, calculate area
-                if width and height and str(width).isdigit() and str(height).isdigit():
-                    area = int(width) * int(height)
-                    if area > largest_area:
-                        largest_area = area
-                        
-                        # Make sure it's an absolute URL
-                        if src.startswith('//'):
-                            src = 'https:' + src
-                        elif src.startswith('/'):
-                            # Relative URL, need to make it absolute
-                            parsed_url = urlparse(actual_url)
-                            base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                            src = base + src
-                            
-                        if src.startswith(('http://', 'https://')):
-                            largest_image = src
-            
-            # Use the largest image if it meets our minimum size requirements
-            if largest_area >= min_area and largest_image:
-                image_url = largest_image
-                logging.info(f"Found largest image ({largest_area} px²): {image_url}")
-                
-        # If we still don't have an image, try one last approach for common image patterns
-        if not image_url:
-            # Look for the first image that's not a logo, icon, etc.
-            for img in soup.find_all('img'):
-                src = img.get('src') or img.get('data-src')
-                if not src:
-                    continue
-                    
-                # Skip likely non-content images
-                lower_src = src.lower()
-                if any(skip in lower_src for skip in ['logo', 'icon', 'avatar', 'spinner', 'pixel', 'tracking', 'banner']):
-                    continue
-                
-                # Make it an absolute URL if needed
-                if src.startswith('//'):
-                    src = 'https:' + src
-                elif src.startswith('/'):
-                    parsed_url = urlparse(actual_url)
-                    base = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                    src = base + src
-                
-                if src.startswith(('http://', 'https://')):
-                    image_url = src
-                    logging.info(f"Found fallback image: {image_url}")
-                    break
-        
-        # Get text
-        text = soup.get_text(separator='\n')
         
-        # Break into lines and remove leading and trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Remove blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        # Download the page once; thumbnail extraction reuses this result
+        page = fetch_page(actual_url, timeout=10)
+        if page['error'] or not page['html']:
+            logging.warning(f"Request failed for {actual_url}: {page['error']}. Using placeholder.")
+            return {
+                'content': f"Unable to fetch content from {actual_url}. Please visit the original article.",
+                'summary': f"Article content not available.",
+                'image_url': generate_placeholder_image("Error", "connection"),
+                'error': page['error'] or "Empty response"
+            }
         
-        # Limit content length to avoid storing too much data
-        max_content_length = 10000  # Limit content to 10K characters
-        if len(text) > max_content_length:
-            text = text[:max_content_length] + "... [content truncated]"
+        # One walk over the page collects text and image candidates; thumbnail
+        # extraction reuses the same scan. Runs in the extraction pool when configured.
+        started = time.monotonic()
+        scan = extract_page(page, scan_document)
+        record_strategy(actual_url, 'content', 'full_text', bool(scan and scan['text']),
+                        (time.monotonic() - started) * 1000)
         
-        # Create a simple summary (first 500 characters)
-        summary = text[:500] + "..." if len(text) > 500 else text
+        # Optionally keep only the main body text instead of the whole page,
+        # unless the extractor never finds it on this publisher
+        main_content = None
+        if use_main_content_extractor() and should_try(actual_url, 'content', 'main_content'):
+            started = time.monotonic()
+            main_content = extract_page(page, extract_main_content, raw_html=True)
+            found = bool(main_content and len(main_content.get('text') or '') >= MIN_MAIN_TEXT_LENGTH)
+            record_strategy(actual_url, 'content', 'main_content', found, (time.monotonic() - started) * 1000)
         
-        return {
-            'content': text,
-            'summary': summary,
-            'image_url': image_url
-        }
+        return article_content_from_scan(scan, main_content)
     
     except Exception as e:
         logging.error(f"Error fetching article content for URL {url}: {str(e)}")
         return {
             'content': f"Error fetching content. Visit the original article at: {url}",
-            'summary': f"Article summary not available. Check the original source."
+            'summary': f"Article summary not available. Check the original source.",
+            'error': str(e)
+        }
+
+def find_existing_article_ids(urls, chunk_size=500):
+    """
+    Look up which article URLs are already stored, using set-based queries.
+    
+    Args:
+        urls (iterable): Article URLs to check
+        chunk_size (int): Maximum URLs per IN (...) query
+        
+    Returns:
+        dict: Maps each already stored URL to its article ID
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    existing = {}
+    for start in range(0, len(urls), chunk_size):
+        chunk = urls[start:start + chunk_size]
+        rows = db.session.query(Article.url, Article.id).filter(Article.url.in_(chunk)).all()
+        existing.update({url: article_id for url, article_id in rows})
+    return existing
+
+def add_keyword_associations(article_ids, keyword_id):
+    """
+    Associate already stored articles with a keyword in bulk.
+    
+    Args:
+        article_ids (iterable): IDs of stored articles
+        keyword_id (int): The keyword to associate them with
+        
+    Returns:
+        int: Number of new associations written
+    """
+    article_ids = set(article_ids)
+    if not article_ids:
+        return 0
+    
+    try:
+        # Skip pairs that already exist so the insert never hits the primary key
+        linked = {
+            row[0] for row in db.session.query(article_keyword.c.article_id).filter(
+                article_keyword.c.keyword_id == keyword_id,
+                article_keyword.c.article_id.in_(article_ids)
+            ).all()
         }
+        missing = [{'article_id': article_id, 'keyword_id': keyword_id} for article_id in article_ids - linked]
+        if missing:
+            db.session.execute(article_keyword.insert(), missing)
+        db.session.commit()
+        return len(missing)
+    except Exception as e:
+        logging.error(f"Error adding keyword associations: {str(e)}")
+        db.session.rollback()
+        return 0
+
+def coalesce_keyword_articles(keyword_entries, articles_by_link):
+    """
+    Map each unique article URL to every keyword whose feed contained it.
+    
+    The same story often appears in the feeds of several keywords; grouping
+    by URL lets a run fetch each article once and write all its keyword
+    associations together.
+    
+    Args:
+        keyword_entries (list): (keyword ID, feed entries) pairs in processing order
+        articles_by_link (dict): Maps feed entry links to unwrapped article
+            dicts; entries missing from it failed to unwrap and are skipped
+        
+    Returns:
+        tuple: (articles_by_url, url_keywords, keyword_urls) where
+            articles_by_url maps each URL to its article dict, url_keywords
+            maps it to the IDs of the keywords it was found for (in order)
+            and keyword_urls maps each keyword ID to its unique URLs
+    """
+    articles_by_url = {}
+    url_keywords = {}
+    keyword_urls = {}
+    for keyword_id, entries in keyword_entries:
+        urls = keyword_urls.setdefault(keyword_id, [])
+        for entry in entries:
+            article = articles_by_link.get(entry.get('link'))
+            if article is None:
+                continue
+            url = article['url']
+            articles_by_url.setdefault(url, article)
+            keyword_ids = url_keywords.setdefault(url, [])
+            if keyword_id not in keyword_ids:
+                keyword_ids.append(keyword_id)
+                urls.append(url)
+    
+    found = sum(len(urls) for urls in keyword_urls.values())
+    logging.info(f"Found {found} keyword articles, {len(articles_by_url)} unique URLs across {len(keyword_urls)} keywords")
+    return articles_by_url, url_keywords, keyword_urls
+
+def link_known_articles(url_keywords):
+    """
+    Add keyword associations for article URLs that are already stored.
+    
+    Already stored articles only get their keyword associations, so the
+    expensive content fetch is reserved for genuinely new URLs.
+    
+    Args:
+        url_keywords (dict): Maps article URLs to the IDs of the keywords they were found for
+        
+    Returns:
+        dict: Maps each already stored URL to its article ID
+    """
+    existing = find_existing_article_ids(url_keywords)
+    
+    article_ids_by_keyword = {}
+    for url, article_id in existing.items():
+        for keyword_id in url_keywords[url]:
+            article_ids_by_keyword.setdefault(keyword_id, set()).add(article_id)
+    linked = sum(add_keyword_associations(article_ids, keyword_id)
+                 for keyword_id, article_ids in article_ids_by_keyword.items())
+    if linked:
+        refresh_rollups_for_articles(existing.values())
+        bump_data_version()
+    
+    logging.info(f"Skipping {len(existing)} already stored articles ({linked} new keyword links), "
+                 f"{len(url_keywords) - len(existing)} new")
+    return existing
 
 def store_article_in_db(article_data, keyword_ids):
     """Store article in the database and associate with keywords."""
+    from fetch_thumbnails import is_placeholder_image
+    
     with app.app_context():
         try:
             # Check if article already exists (by URL)
@@ -444,9 +404,9 @@ def store_article_in_db(article_data, keyword_ids):
                             existing_article.keywords.append(keyword)
                 
                 # If the existing article has no image or has a placeholder image
-                if not existing_article.image_url or 'placehold.co' in existing_article.image_url or 'data:image/svg+xml;base64' in existing_article.image_url:
+                if is_placeholder_image(existing_article.image_url):
                     # First try using the image from article_data if available and not a placeholder
-                    if article_data.get('image_url') and 'placehold.co' not in article_data.get('image_url', '') and 'data:image/svg+xml;base64' not in article_data.get('image_url', ''):
+                    if not is_placeholder_image(article_data.get('image_url')):
                         existing_article.image_url = article_data['image_url']
                         logging.info(f"Updated image for article: {existing_article.title}")
                     else:
@@ -510,9 +470,28 @@ def store_article_in_db(article_data, keyword_ids):
             db.session.rollback()
             return None
 
-def collect_news_for_keywords(collect_content=True):
-    """Collect news articles for all active keywords."""
+def collect_news_for_keywords(collect_content=True, full_rescan=False, should_stop=None, resume=False,
+                              raise_on_failure=False):
+    """
+    Collect news articles for all active keywords.
+    
+    Feed entries at or below each keyword's watermark are skipped unless
+    full_rescan is set. should_stop is an optional callable checked before
+    each keyword and article; when it returns True the run stops early and
+    keeps what it has collected so far. The run is checkpointed after every
+    keyword; with resume set the latest unfinished run is picked up where it
+    stopped instead of starting a new one.
+    
+    All feeds are fetched before any article, so a story found for several
+    keywords is downloaded once and stored with all of them.
+    
+    Errors are logged and the run recorded as failed. With raise_on_failure
+    set, a run that ends aborted (too many errors) raises
+    CollectionRunFailed and one that fails re-raises its error, so a job
+    runner can retry and resume it.
+    """
     with app.app_context():
+        tracker = None
         try:
             # Get all active keywords
             active_keywords = Keyword.query.filter_by(active=True).all()
@@ -521,53 +500,159 @@ def collect_news_for_keywords(collect_content=True):
                 logging.warning("No active keywords found. Run import_initial_keywords() first.")
                 return []
             
-            all_new_articles = []
+            tracker = RunTracker.start('serial', [k.id for k in active_keywords], full_rescan=full_rescan, resume=resume)
+            full_rescan = tracker.full_rescan
+            
+            collected = []
             error_count = 0
             max_errors = 3  # Stop after encountering too many errors
+            status = 'completed'
+            
+            # Each page is downloaded and parsed at most once per run
+            clear_page_cache()
             
-            # Process each keyword
+            # Skip publishers whose circuit breaker is still open from earlier runs
+            load_domain_health()
+            load_domain_profiles()
+            
+            # Where each keyword's previous runs stopped
+            watermarks = {} if full_rescan else load_keyword_watermarks(k.id for k in active_keywords)
+            
+            # Fetch every keyword's feed first, dropping entries already collected
+            keyword_entries = []
             for keyword in active_keywords:
+                if tracker.keyword_done(keyword.id):
+                    continue
+                if should_stop and should_stop():
+                    logging.info("Collection stopped on request")
+                    status = 'cancelled'
+                    break
                 logging.info(f"Fetching news for keyword: {keyword.display_name}")
-                
-                # Get articles from Google News
-                articles = fetch_news_from_google_news(keyword.display_name)
-                logging.info(f"Found {len(articles)} articles for keyword {keyword.display_name}")
-                
-                # Process each article
-                for article in articles:
+                try:
+                    entries = fetch_google_news_entries(keyword.display_name)
+                except Exception as e:
+                    logging.error(f"Error fetching news for keyword '{keyword.display_name}': {str(e)}")
+                    tracker.record_error('feed', e)
+                    continue
+                entries, skipped = filter_entries_by_watermark(entries, watermarks.get(keyword.id))
+                logging.info(f"Found {len(entries)} feed entries for keyword {keyword.display_name} ({skipped} skipped by watermark)")
+                keyword_entries.append((keyword, entries, skipped))
+            
+            # Unwrap each distinct feed link once, however many keywords it appeared for
+            articles_by_link = {}
+            for keyword, entries, skipped in keyword_entries:
+                for entry in entries:
+                    link = entry.get('link')
+                    if link in articles_by_link or status != 'completed':
+                        continue
+                    if should_stop and should_stop():
+                        status = 'cancelled'
+                        continue
                     try:
-                        # Fetch full content if requested
-                        if collect_content:
-                            content_data = fetch_article_content(article['url'])
-                            article.update(content_data)
-                        
-                        # Store in database
-                        article_id = store_article_in_db(article, [keyword.id])
-                        
-                        if article_id:
-                            all_new_articles.append({
-                                'id': article_id,
-                                'title': article['title'],
-                                'url': article['url'],
-                                'source': article['source'],
-                                'keyword': keyword.display_name
-                            })
-                    except Exception as article_err:
-                        logging.error(f"Error processing article {article.get('title', 'Unknown')}: {str(article_err)}")
-                        error_count += 1
-                        if error_count >= max_errors:
-                            logging.warning(f"Too many errors ({error_count}), stopping article collection")
-                            return all_new_articles
-                
-                # Be nice to the server - don't hammer it
-                time.sleep(2)
+                        articles_by_link[link] = article_from_feed_entry(entry)
+                    except Exception as e:
+                        logging.error(f"Error unwrapping feed entry {link}: {str(e)}")
+                        tracker.record_error('unwrap', e)
+            
+            articles_by_url, url_keywords, keyword_urls = coalesce_keyword_articles(
+                [(keyword.id, entries) for keyword, entries, skipped in keyword_entries], articles_by_link)
+            
+            # Only fetch content for URLs we don't have yet, or this run hasn't finished with
+            known = link_known_articles(url_keywords)
+            pending_urls = {url for url in url_keywords if url not in known and not tracker.url_done(url)}
+            
+            # Articles are buffered and written in batches; the writer flushes on exit
+            with ArticleBatchWriter() as writer:
+                # Each unique URL is fetched once, under the first keyword that found it,
+                # and written with all of its keywords
+                for keyword, entries, skipped in keyword_entries:
+                    if status != 'completed':
+                        break
+                    queued_urls, failed_urls = [], []
+                    for url in keyword_urls[keyword.id]:
+                        if url not in pending_urls:
+                            continue
+                        if should_stop and should_stop():
+                            status = 'cancelled'
+                            break
+                        pending_urls.discard(url)
+                        article = articles_by_url[url]
+                        try:
+                            # Fetch full content if requested
+                            if collect_content:
+                                tracker.record_fetch()
+                                content_data = fetch_article_content(url)
+                                article.update(content_data)
+                            
+                            # Queue for the next batched write
+                            writer.add(article, url_keywords[url])
+                            queued_urls.append(url)
+                            collected.append((article, keyword.display_name))
+                        except Exception as article_err:
+                            logging.error(f"Error processing article {article.get('title', 'Unknown')}: {str(article_err)}")
+                            tracker.record_error('content', article_err)
+                            failed_urls.append(url)
+                            error_count += 1
+                            if error_count >= max_errors:
+                                logging.warning(f"Too many errors ({error_count}), stopping article collection")
+                                status = 'aborted'
+                                break
+                    
+                    if status != 'completed':
+                        # Keep the articles handled so far; the keyword itself is redone on resume
+                        writer.flush()
+                        tracker.record_urls(keyword.id, [url for url in queued_urls if url in writer.stored], failed_urls)
+                        break
+                    
+                    # Checkpoint the keyword once its articles are written; articles it shares
+                    # with earlier keywords were written with them
+                    writer.flush()
+                    stored_urls = [url for url in queued_urls if url in writer.stored]
+                    for url in set(queued_urls) - set(stored_urls):
+                        tracker.record_error('store', f"Article not stored: {url}")
+                    # Entries whose article failed to unwrap or store stay below the watermark
+                    handled, failed_entries = split_feed_entries(
+                        entries, articles_by_link,
+                        lambda url: url in known or url in writer.stored or tracker.url_stored(url))
+                    save_keyword_watermarks({keyword.id: {
+                        'watermark': advance_watermark(watermarks.get(keyword.id), handled, failed_entries),
+                        'new_count': len(entries),
+                        'skipped_count': skipped
+                    }})
+                    tracker.complete_keyword(keyword.id, stored_urls, failed_urls)
+            
+            all_new_articles = [{
+                'id': writer.stored[article['url']],
+                'title': article['title'],
+                'url': article['url'],
+                'source': article['source'],
+                'keyword': keyword_name
+            } for article, keyword_name in collected if article['url'] in writer.stored]
+            
+            flush_resolved_urls()
+            flush_thumbnail_cache()
+            save_domain_health()
+            save_domain_profiles()
+            tracker.finish(status)
             
             # Log summary
             logging.info(f"Collected {len(all_new_articles)} new articles across {len(active_keywords)} keywords")
+            http_client.log_connection_stats()
+            clear_page_cache()
+            if raise_on_failure and status == 'aborted':
+                raise CollectionRunFailed(tracker.run_id, status, len(all_new_articles))
             return all_new_articles
             
+        except CollectionRunFailed:
+            raise
         except Exception as e:
             logging.error(f"Error in collect_news_for_keywords: {str(e)}")
+            db.session.rollback()
+            if tracker is not None:
+                tracker.record_error('store', e)
+                tracker.finish('failed')
+            if raise_on_failure:
+                raise
             return []
 
 # Function to import initial keywords
@@ -587,6 +672,7 @@ def import_initial_keywords():
             
             # Commit the changes
             db.session.commit()
+            bump_data_version()
             logging.info("Imported initial keywords from topics.py")
 
 # Import initial keywords when starting the app
@@ -594,6 +680,7 @@ import_initial_keywords()
 
 # Flask Routes
 @app.route('/')
+@cached_view
 def index():
     """Display the dashboard homepage."""
     with app.app_context():
@@ -632,72 +719,48 @@ def index():
         )
 
 @app.route('/trends')
+@cached_view
 def trends_analysis():
     # Get publication data for the last 30 days
     today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     thirty_days_ago = today - timedelta(days=29)
     date_list = [(thirty_days_ago + timedelta(days=i)).date() for i in range(30)]
 
+    # Counts come from the daily rollups: one range read per table
+    ensure_daily_rollups()
+    pub_date_to_count, source_totals = daily_source_counts(date_list[0], date_list[-1])
+    keyword_days = daily_keyword_counts(date_list[0], date_list[-1])
+
     # Publication trends (all articles)
-    publication_data = db.session.query(
-        func.date(Article.published_date),
-        func.count(Article.id)
-    ).filter(
-        Article.published_date >= thirty_days_ago
-    ).group_by(
-        func.date(Article.published_date)
-    ).order_by(
-        func.date(Article.published_date)
-    ).all()
-    pub_date_to_count = {d: c for d, c in publication_data}
     publication_dates = [d.strftime('%Y-%m-%d') for d in date_list]
     publication_counts = [pub_date_to_count.get(d, 0) for d in date_list]
 
     # Keyword distribution (top 10, last 30 days)
-    keyword_dist = db.session.query(
-        Keyword.display_name,
-        func.count(Article.id).label('count')
-    ).join(Article.keywords).filter(
-        Article.published_date >= thirty_days_ago
-    ).group_by(Keyword.display_name).order_by(func.count(Article.id).desc()).limit(10).all()
+    keyword_totals = {name: sum(days.values()) for name, days in keyword_days.items()}
+    keyword_dist = sorted(keyword_totals.items(), key=lambda item: (-item[1], item[0]))[:10]
     keyword_labels = [item[0] for item in keyword_dist]
     keyword_data = [item[1] for item in keyword_dist]
 
     # Top keywords with real trend data (last 30 days)
     top_keywords = []
     for kw in keyword_labels:
-        # Get daily counts for this keyword
-        daily_counts = db.session.query(
-            func.date(Article.published_date),
-            func.count(Article.id)
-        ).join(Article.keywords).filter(
-            Article.published_date >= thirty_days_ago,
-            Keyword.display_name == kw
-        ).group_by(func.date(Article.published_date)).order_by(func.date(Article.published_date)).all()
-        day_to_count = {d: c for d, c in daily_counts}
+        day_to_count = keyword_days[kw]
         trend_points = ','.join(str(day_to_count.get(d, 0)) for d in date_list)
-        count = sum(day_to_count.values())
         top_keywords.append({
             'name': kw,
-            'count': count,
+            'count': keyword_totals[kw],
             'trend_points': trend_points
         })
 
     # Source distribution (last 30 days)
-    source_counts = db.session.query(
-        Article.source,
-        func.count(Article.id).label('count')
-    ).filter(
-        Article.published_date >= thirty_days_ago
-    ).group_by(Article.source).all()
-    total_articles = sum([item[1] for item in source_counts]) or 1
+    total_articles = sum(source_totals.values()) or 1
     source_distribution = [
         {
-            'name': item[0],
-            'count': item[1],
-            'percentage': round(item[1] / total_articles * 100, 1)
+            'name': name,
+            'count': count,
+            'percentage': round(count / total_articles * 100, 1)
         }
-        for item in source_counts
+        for name, count in sorted(source_totals.items(), key=lambda item: -item[1])
     ]
 
     now_utc = datetime.datetime.now()
@@ -715,23 +778,56 @@ def trends_analysis():
         now_et=now_et
     )
 
+def get_keyword_article_stats(recent_days=7):
+    """
+    Count each keyword's articles in one grouped query, without loading them
+    
+    Args:
+        recent_days (int): Length of the recent window in days
+        
+    Returns:
+        dict: Maps keyword ID to article_count, last_article_at (newest
+            published date) and recent_count (published in the window)
+    """
+    since = datetime.datetime.utcnow() - timedelta(days=recent_days)
+    rows = db.session.query(
+        article_keyword.c.keyword_id,
+        func.count(),
+        func.max(Article.published_date),
+        func.sum(case((Article.published_date >= since, 1), else_=0))
+    ).join(Article, Article.id == article_keyword.c.article_id).group_by(article_keyword.c.keyword_id)
+    return {
+        keyword_id: {'article_count': count, 'last_article_at': last_article_at, 'recent_count': recent or 0}
+        for keyword_id, count, last_article_at, recent in rows
+    }
+
 @app.route('/keywords')
+@cached_view
 def manage_keywords():
     """Display the keyword management page."""
     keywords = Keyword.query.order_by(Keyword.name).all()
+    
+    # Aliases of all keywords in one query
+    aliases = {}
+    for keyword_id, alias in db.session.query(KeywordAlias.keyword_id, KeywordAlias.alias).order_by(KeywordAlias.id):
+        aliases.setdefault(keyword_id, []).append(alias)
+
+    # Article counts of all keywords in one query, without loading any articles
+    article_stats = get_keyword_article_stats()
+    no_articles = {'article_count': 0, 'last_article_at': None, 'recent_count': 0}
 
-    # Split into active and inactive keywords, and add article_count and last_updated
+    # Split into active and inactive keywords, and add article stats and last_updated
     active_keywords = []
     inactive_keywords = []
     for k in keywords:
-        article_count = len(k.articles)
         last_updated = k.updated_at if hasattr(k, 'updated_at') else None
         keyword_info = {
             'id': k.id,
             'name': k.name,
             'display_name': k.display_name,
-            'article_count': article_count,
-            'last_updated': last_updated
+            'aliases': aliases.get(k.id, []),
+            'last_updated': last_updated,
+            **article_stats.get(k.id, no_articles)
         }
         if k.active:
             active_keywords.append(keyword_info)
@@ -774,8 +870,13 @@ def add_keyword():
             display_name=display_name,
             active=True
         )
+        set_keyword_aliases(new_keyword, parse_aliases(request.form.get('aliases')))
         db.session.add(new_keyword)
         db.session.commit()
+        bump_data_version()
+        
+        # Tag already stored articles that mention the new keyword
+        enqueue_job('retag', {'keyword_ids': [new_keyword.id]})
         
         flash(f'Keyword "{display_name}" added successfully', 'success')
     except Exception as e:
@@ -793,9 +894,14 @@ def edit_keyword(keyword_id):
         # Update fields
         keyword.name = request.form.get('name')
         keyword.display_name = request.form.get('display_name')
+        set_keyword_aliases(keyword, parse_aliases(request.form.get('aliases')))
         keyword.updated_at = datetime.datetime.utcnow()
         
         db.session.commit()
+        bump_data_version()
+        
+        # Tag stored articles that mention the keyword's new name or aliases
+        enqueue_job('retag', {'keyword_ids': [keyword.id]})
         
         flash(f'Keyword "{keyword.display_name}" updated successfully', 'success')
     except Exception as e:
@@ -811,6 +917,7 @@ def toggle_keyword(keyword_id):
         keyword = Keyword.query.get_or_404(keyword_id)
         keyword.active = not keyword.active
         db.session.commit()
+        bump_data_version()
         
         status = 'activated' if keyword.active else 'deactivated'
         flash(f'Keyword "{keyword.display_name}" {status} successfully', 'success')
@@ -827,8 +934,10 @@ def delete_keyword(keyword_id):
         keyword = Keyword.query.get_or_404(keyword_id)
         display_name = keyword.display_name
         
+        delete_keyword_rollups(keyword_id)
         db.session.delete(keyword)
         db.session.commit()
+        bump_data_version()
         
         flash(f'Keyword "{display_name}" deleted successfully', 'success')
     except Exception as e:
@@ -838,6 +947,7 @@ def delete_keyword(keyword_id):
     return redirect(url_for('manage_keywords'))
 
 @app.route('/articles')
+@cached_view
 def articles_list():
     """Display a list of all articles."""
     # Get filter parameters
@@ -908,6 +1018,45 @@ def article_detail(article_id):
     
     return render_template('article_detail.html', article=article, now=now_utc, now_et=now_et)
 
+@app.route('/placeholder/<style>/<key>.svg')
+def placeholder_image(style, key):
+    """Serve a branded placeholder SVG, cached by browsers for a year."""
+    if key != placeholder_key(key):
+        return Response(status=404)
+    if style != PLACEHOLDER_STYLE:
+        # Stored paths of an older style get the current image
+        return redirect(placeholder_path(key), code=301)
+    
+    svg, etag = render_placeholder(key)
+    response = Response(svg, mimetype='image/svg+xml')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route('/images/<signature>')
+def proxied_image(signature):
+    """Serve an article image from the local image store, downloading it on first use."""
+    image_url = request.args.get('url', '')
+    width = request.args.get('w', type=int)
+    if not proxy_enabled() or not image_url or not hmac.compare_digest(signature, image_signature(image_url)):
+        return Response(status=404)
+    if width is not None and width not in VARIANT_WIDTHS:
+        return Response(status=400)
+    
+    image = get_proxied_image(image_url, width)
+    if image is None:
+        # Couldn't (or mustn't) download it; never bounce the browser to the URL
+        return Response(status=404)
+    
+    response = send_file(image['path'], mimetype=image['content_type'], etag=image['etag'],
+                         max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
 @app.route('/articles/export')
 def export_articles():
     """Export articles as CSV."""
@@ -1023,9 +1172,23 @@ def export_for_chatgpt():
         headers={"Content-disposition": f"attachment; filename=newsletter_data_{keyword_name.lower().replace(' ', '_')}.json"}
     )
 
-@app.route('/update', methods=['GET'])
+@app.route('/update', methods=['GET', 'POST'])
 def update_data():
-    """Display when articles were last updated."""
+    """Queue a collection run (POST, JSON) or display when articles were last updated (GET)."""
+    if request.method == 'POST':
+        try:
+            # Reuse a collection job that is already queued or running
+            job = enqueue_job('collect', unique=True)
+            return jsonify({
+                'status': 'success',
+                'message': f'Collection job {job.id} is {job.status}',
+                'job': job_to_dict(job)
+            }), 202
+        except Exception as e:
+            logging.error(f"Error queueing collection: {str(e)}")
+            db.session.rollback()
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+    
     # Instead of triggering collection, just show when the last article was collected
     try:
         last_article = Article.query.order_by(desc(Article.collected_at)).first()
@@ -1040,6 +1203,92 @@ def update_data():
         flash(f'Error checking update status: {str(e)}', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List recent background jobs as JSON, optionally filtered by status and type."""
+    query = Job.query
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    if request.args.get('type'):
+        query = query.filter_by(job_type=request.args['type'])
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    return jsonify({'jobs': [job_to_dict(job) for job in jobs]})
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Enqueue a background job from a JSON body with type and optional payload."""
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('type')
+    if job_type not in JOB_HANDLERS:
+        return jsonify({'status': 'error', 'message': f'Unknown job type: {job_type}'}), 400
+    
+    payload = data.get('payload') or {}
+    if not isinstance(payload, dict):
+        return jsonify({'status': 'error', 'message': 'payload must be an object'}), 400
+    
+    try:
+        max_attempts = int(data.get('max_attempts', 3))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'max_attempts must be an integer'}), 400
+    if max_attempts < 1:
+        return jsonify({'status': 'error', 'message': 'max_attempts must be at least 1'}), 400
+    
+    job = enqueue_job(job_type, payload,
+                      max_attempts=max_attempts,
+                      unique=bool(data.get('unique', False)))
+    return jsonify({'status': 'success', 'job': job_to_dict(job)}), 202
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """Get the status, progress and result of a background job."""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job_to_dict(job)})
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    """Cancel a queued job, or ask a running job to stop."""
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job_to_dict(job)})
+
+@app.route('/runs')
+def list_runs():
+    """List recent collection runs as JSON, optionally filtered by status."""
+    limit = min(request.args.get('limit', 20, type=int), 500)
+    return jsonify({'runs': recent_runs(limit, status=request.args.get('status'))})
+
+@app.route('/runs/<int:run_id>')
+def run_status(run_id):
+    """Get the progress, duration and errors by stage of a collection run."""
+    run = db.session.get(CollectionRun, run_id)
+    if run is None:
+        return jsonify({'status': 'error', 'message': 'Run not found'}), 404
+    return jsonify({'status': 'success', 'run': run_to_dict(run)})
+
+@app.route('/cache/stats')
+def response_cache_stats():
+    """Report the response cache's hit ratio and size as JSON."""
+    return jsonify(get_response_cache_stats())
+
+@app.route('/domains/health')
+def domain_health_report():
+    """Report the slowest and most-failing publisher domains as JSON."""
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify({
+        'slowest': slowest_domains(limit),
+        'most_failing': most_failing_domains(limit)
+    })
+
+@app.route('/domains/profiles')
+def domain_profile_report():
+    """Report which extraction strategies work per publisher domain as JSON."""
+    limit = min(request.args.get('limit', 20, type=int), 500)
+    return jsonify({'domains': domain_profiles(request.args.get('domain'), limit)})
+
 @app.route('/export_trends')
 def export_trends():
     format = request.args.get('format', 'csv')
@@ -1051,13 +1300,26 @@ def export_trends():
 def main():
     """Main function to run the social commerce news collection."""
     try:
+        # Start the extraction processes while this process is still single-threaded
+        configure_extraction(EXTRACTION_WORKERS)
+        
         # Check if we need to import keywords
         with app.app_context():
             if Keyword.query.count() == 0:
                 import_initial_keywords()
                 
-        # Collect news articles
-        collect_news_for_keywords()
+        # Ignore keyword watermarks when a full rescan is requested
+        full_rescan = os.environ.get('COLLECT_FULL_RESCAN') == '1'
+        
+        # Pick up the latest unfinished run instead of starting a new one
+        resume = os.environ.get('COLLECT_RESUME') == '1'
+        
+        # Collect news articles, optionally with the concurrent engine
+        if os.environ.get('COLLECTOR_ENGINE', 'serial') == 'async':
+            from async_collector import run_async_collection
+            run_async_collection(full_rescan=full_rescan, resume=resume)
+        else:
+            collect_news_for_keywords(full_rescan=full_rescan, resume=resume)
     except Exception as e:
         logging.error(f"An error occurred in main: {str(e)}")
         print(f"Error: {str(e)}")
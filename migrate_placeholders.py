@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Script to convert stored base64 SVG placeholders to /placeholder paths
+Articles without an image used to store the whole placeholder SVG as a data URI
+
+Usage:
+  python migrate_placeholders.py [--batch-size=500]
+
+Options:
+  --batch-size=N  Number of articles updated per commit (default: 500)
+"""
+
+import argparse
+from main import app, db
+from models import Article
+from fetch_thumbnails import migrate_placeholder_images, DEFAULT_PLACEHOLDER_BATCH_SIZE
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Convert base64 SVG placeholders to /placeholder paths")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_PLACEHOLDER_BATCH_SIZE,
+                        help=f"Number of articles updated per commit (default: {DEFAULT_PLACEHOLDER_BATCH_SIZE})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with app.app_context():
+        results = migrate_placeholder_images(db, Article, batch_size=args.batch_size)
+
+        print("\n===== Placeholder Migration Summary =====")
+        print(f"Articles with base64 placeholders: {results['total']}")
+        print(f"Converted: {results['converted']}")
+        print(f"Image data removed: {results['bytes_saved'] // 1024} KB")
@@ -16,6 +16,12 @@ class Keyword(db.Model):
     # Relationship with articles
     articles = db.relationship('Article', secondary='article_keyword', backref='keywords', lazy=True)
     
+    # Incremental collection state, removed together with the keyword
+    watermark = db.relationship('KeywordWatermark', uselist=False, backref='keyword', cascade='all, delete-orphan')
+    
+    # Other phrasings the local tagger matches in article text
+    aliases = db.relationship('KeywordAlias', backref='keyword', cascade='all, delete-orphan', lazy=True)
+    
     def __repr__(self):
         return f'<Keyword {self.name}>'
 
@@ -25,7 +31,7 @@ class Article(db.Model):
     title = db.Column(db.String(255), nullable=False)
     url = db.Column(db.String(1024), nullable=False, unique=True)  # Increased from 512 to 1024 to handle longer URLs
     source = db.Column(db.String(100))
-    published_date = db.Column(db.DateTime)
+    published_date = db.Column(db.DateTime, index=True)
     content = db.Column(db.Text)
     summary = db.Column(db.Text)
     image_url = db.Column(db.String(1024), nullable=True)  # URL to the article's main image
@@ -38,4 +44,184 @@ class Article(db.Model):
 article_keyword = db.Table('article_keyword',
     db.Column('article_id', db.Integer, db.ForeignKey('article.id'), primary_key=True),
     db.Column('keyword_id', db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
-)
\ No newline at end of file
+)
+
+class KeywordDailyCount(db.Model):
+    """Model for the number of articles per keyword and publication day, maintained by rollups.py."""
+    day = db.Column(db.Date, primary_key=True)
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
+    article_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<KeywordDailyCount {self.day} {self.keyword_id}>'
+
+class SourceDailyCount(db.Model):
+    """Model for the number of articles per source and publication day, maintained by rollups.py."""
+    day = db.Column(db.Date, primary_key=True)
+    source = db.Column(db.String(100), primary_key=True)  # '' for articles without a source
+    article_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SourceDailyCount {self.day} {self.source}>'
+
+class DataVersion(db.Model):
+    """Model for counters bumped whenever the data shown by the dashboard changes."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
+
+class ResolvedUrl(db.Model):
+    """Model for caching Google News URL resolution across runs."""
+    id = db.Column(db.Integer, primary_key=True)
+    google_url = db.Column(db.String(2048), nullable=False, unique=True)
+    resolved_url = db.Column(db.String(1024), nullable=True)  # None when resolution failed
+    status = db.Column(db.String(20), nullable=False)  # 'resolved' or 'failed'
+    resolved_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)  # Failed lookups are retried after this
+    
+    def __repr__(self):
+        return f'<ResolvedUrl {self.status} {self.google_url}>'
+
+class ThumbnailCacheEntry(db.Model):
+    """Model for the shared thumbnail cache, keyed by article URL."""
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(2048), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False)  # 'found' or 'missing' (no real image, use a placeholder)
+    image_url = db.Column(db.Text, nullable=True)  # None for missing entries
+    cached_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<ThumbnailCacheEntry {self.status} {self.url}>'
+
+class ImageProxyEntry(db.Model):
+    """Model mapping a proxied image URL to its file in the on-disk image store."""
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(2048), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False)  # 'stored' or 'failed' (retried after expires_at)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of the image, names its file
+    content_type = db.Column(db.String(50), nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=True)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)  # Only set for failed entries
+
+    def __repr__(self):
+        return f'<ImageProxyEntry {self.status} {self.url}>'
+
+class DomainHealth(db.Model):
+    """Model for tracking publisher latency, errors and circuit breaker state."""
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), nullable=False, unique=True)
+    request_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    total_latency_ms = db.Column(db.Float, default=0.0)
+    last_latency_ms = db.Column(db.Float, nullable=True)
+    consecutive_failures = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(255), nullable=True)
+    last_failure_at = db.Column(db.DateTime, nullable=True)
+    circuit_open_until = db.Column(db.DateTime, nullable=True)  # Requests are skipped until this time
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DomainHealth {self.domain}>'
+
+class DomainProfile(db.Model):
+    """Model for tracking which extraction strategies work for a publisher domain."""
+    __table_args__ = (db.UniqueConstraint('domain', 'chain', 'strategy', name='uq_domain_profile_strategy'),)
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(255), nullable=False, index=True)
+    chain = db.Column(db.String(20), nullable=False)  # 'content' or 'thumbnail'
+    strategy = db.Column(db.String(50), nullable=False)
+    attempts = db.Column(db.Integer, default=0)
+    successes = db.Column(db.Integer, default=0)
+    total_ms = db.Column(db.Float, default=0.0)
+    skipped = db.Column(db.Integer, default=0)  # Times the strategy was skipped as never working
+    last_success_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DomainProfile {self.domain} {self.chain}/{self.strategy}>'
+
+class KeywordWatermark(db.Model):
+    """Model for tracking how far collection has progressed for a keyword."""
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
+    last_published_at = db.Column(db.DateTime, nullable=True)  # Newest published date collected
+    seen_entry_ids = db.Column(db.Text, nullable=True)  # JSON list of recent feed entry IDs
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_new_count = db.Column(db.Integer, default=0)
+    last_skipped_count = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<KeywordWatermark {self.keyword_id}>'
+
+class KeywordAlias(db.Model):
+    """Model for alternative phrasings of a keyword used by the local tagger."""
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), nullable=False, index=True)
+    alias = db.Column(db.String(100), nullable=False)
+    
+    def __repr__(self):
+        return f'<KeywordAlias {self.alias}>'
+
+class Job(db.Model):
+    """Model for background jobs run by job_queue workers."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed or cancelled
+    payload = db.Column(db.Text, nullable=True)  # JSON arguments for the job handler
+    result = db.Column(db.Text, nullable=True)  # JSON result of the last successful attempt
+    progress = db.Column(db.Text, nullable=True)  # JSON progress reported by the running handler
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # Not claimed before this time
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker holding the lease
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Another worker may claim the job after this
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+class CollectionRun(db.Model):
+    """Model for the history and resume state of collection runs."""
+    id = db.Column(db.Integer, primary_key=True)
+    engine = db.Column(db.String(20), nullable=False)  # 'serial' or 'async'
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, aborted, cancelled or failed
+    full_rescan = db.Column(db.Boolean, default=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Last checkpoint
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_seconds = db.Column(db.Float, default=0.0)  # Time spent running, summed over resumes
+    resume_count = db.Column(db.Integer, default=0)
+    keywords_total = db.Column(db.Integer, default=0)
+    completed_keyword_ids = db.Column(db.Text, nullable=True)  # JSON list of keywords fully processed
+    articles_fetched = db.Column(db.Integer, default=0)  # Article pages fetched for content
+    articles_stored = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    errors_by_stage = db.Column(db.Text, nullable=True)  # JSON object of error counts per stage
+    last_error = db.Column(db.Text, nullable=True)
+    
+    def __repr__(self):
+        return f'<CollectionRun {self.id} {self.status}>'
+
+class CollectionRunUrl(db.Model):
+    """Model for the article URLs a collection run has finished with, so a resumed run skips them."""
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('collection_run.id'), nullable=False)
+    url = db.Column(db.String(1024), nullable=False)
+    keyword_id = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(20), nullable=False)  # 'stored' or 'failed'
+    
+    __table_args__ = (db.UniqueConstraint('run_id', 'url', name='uq_collection_run_url'),)
+    
+    def __repr__(self):
+        return f'<CollectionRunUrl {self.run_id} {self.url}>'
@@ -0,0 +1,191 @@
+"""
+Page fetch stage shared by content and thumbnail extraction
+
+Each article URL is downloaded and parsed once per collection run. The
+result (final URL, status, HTML and the lazily parsed BeautifulSoup
+document) is kept in a short-lived cache so fetch_article_content,
+fetch_microlink_preview and the Open Graph lookup in get_thumbnail_from_url
+all work from the same document instead of issuing their own GETs.
+
+Bodies are streamed and capped at PAGE_MAX_BYTES. Metadata lookups can ask
+for the head only, which stops reading at the end of <head>.
+
+Parsing and extraction live in extraction.py and can run in a process
+pool; extract_page() runs them on a cached page. Extraction code must treat
+the cached soup as read-only.
+"""
+
+import os
+import re
+import logging
+import threading
+from cachetools import TTLCache
+import http_client
+from extraction import parse_html, get_extraction_pool, run_extraction
+
+# Parsed documents are large, so only keep the pages of the current run around
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "64"))
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", "600"))
+
+# Hard cap on a page body, and on a head-only read that never finds </head>
+PAGE_MAX_BYTES = int(os.environ.get("PAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+PAGE_HEAD_MAX_BYTES = int(os.environ.get("PAGE_HEAD_MAX_BYTES", str(256 * 1024)))
+
+CHUNK_SIZE = 16 * 1024
+HEAD_END_MARKERS = (b'</head>', b'<body')
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+_page_cache = TTLCache(maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL)
+_page_cache_lock = threading.Lock()
+_fetch_stats = {'pages': 0, 'bytes': 0, 'head_only': 0}
+
+def _read_body(response, max_bytes, head_only):
+    """
+    Read a streamed response body up to a byte cap
+
+    Returns:
+        tuple: (body bytes, whether reading stopped before the end of the body)
+    """
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        # Markers can straddle chunks, so search a little before the new data
+        search_from = max(len(body) - 8, 0)
+        body.extend(chunk)
+        if head_only:
+            window = bytes(body[search_from:]).lower()
+            if any(marker in window for marker in HEAD_END_MARKERS):
+                return bytes(body), True
+        if len(body) >= max_bytes:
+            logging.info(f"Stopped reading {response.url} at {max_bytes} bytes")
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+def _decode_html(body, response):
+    """Decode HTML using the declared charset, the page's meta charset or UTF-8."""
+    encoding = None
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        encoding = response.encoding
+    if not encoding:
+        match = _META_CHARSET.search(body[:4096])
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return body.decode(encoding, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def fetch_page(url, timeout=10, head_only=False):
+    """
+    Download a page once and cache the result for the rest of the run
+
+    The body is streamed and capped at PAGE_MAX_BYTES. With head_only the
+    download stops at the end of <head>, which is all metadata lookups
+    need; a later full fetch of the same URL replaces such a partial page.
+
+    Args:
+        url (str): The URL to fetch
+        timeout (int): Request timeout in seconds
+        head_only (bool): Stop reading once the document head has arrived
+
+    Returns:
+        dict: Page fetch result with url, final_url, status_code, html,
+            error (None on success), head_only (True if only the head was
+            read), bytes_read, soup (parsed on first use) and extracted
+            (results of extract_page by function name)
+    """
+    with _page_cache_lock:
+        page = _page_cache.get(url)
+    if page is not None and (head_only or not page['head_only']):
+        return page
+
+    page = {
+        'url': url,
+        'final_url': url,
+        'status_code': None,
+        'html': '',
+        'error': None,
+        'head_only': False,
+        'bytes_read': 0,
+        'soup': None,
+        'extracted': {}
+    }
+    try:
+        with http_client.get(url, timeout=timeout, stream=True) as response:
+            page['final_url'] = response.url
+            page['status_code'] = response.status_code
+            response.raise_for_status()
+
+            # Don't download images, PDFs and other non-HTML bodies
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and 'html' not in content_type and 'xml' not in content_type:
+                raise ValueError(f"Not an HTML page ({content_type})")
+
+            max_bytes = PAGE_HEAD_MAX_BYTES if head_only else PAGE_MAX_BYTES
+            body, stopped_early = _read_body(response, max_bytes, head_only)
+            page['head_only'] = head_only and stopped_early
+            page['bytes_read'] = len(body)
+            page['html'] = _decode_html(body, response)
+    except Exception as e:
+        page['error'] = str(e)
+
+    with _page_cache_lock:
+        _page_cache[url] = page
+        _fetch_stats['pages'] += 1
+        _fetch_stats['bytes'] += page['bytes_read']
+        _fetch_stats['head_only'] += 1 if page['head_only'] else 0
+    return page
+
+def get_page_soup(page):
+    """
+    Get the parsed document for a page fetch result, parsing it on first use
+
+    Args:
+        page (dict): Result from fetch_page
+
+    Returns:
+        BeautifulSoup or None: The parsed document, or None if the fetch failed
+    """
+    if page['error'] or not page['html']:
+        return None
+    if page['soup'] is None:
+        page['soup'] = parse_html(page['html'])
+    return page['soup']
+
+def extract_page(page, func, raw_html=False):
+    """
+    Run an extraction function from extraction.py on a fetched page
+
+    Results are remembered on the page, so each extraction runs at most once
+    per page. With an extraction pool the HTML is parsed in a worker process;
+    otherwise the shared cached document is used.
+
+    Args:
+        page (dict): Result from fetch_page
+        func (callable): Extraction function taking (document, url)
+        raw_html (bool): Always pass the HTML, for functions that can't use
+            a parsed document
+
+    Returns:
+        The extraction result, or None if the fetch failed
+    """
+    if page['error'] or not page['html']:
+        return None
+    results = page['extracted']
+    if func.__name__ not in results:
+        soup = None
+        if not raw_html:
+            soup = get_page_soup(page) if get_extraction_pool() is None else page['soup']
+        results[func.__name__] = run_extraction(func, page['html'], page['url'], soup)
+    return results[func.__name__]
+
+def clear_page_cache():
+    """Drop all cached pages, e.g. at the start and end of a collection run."""
+    with _page_cache_lock:
+        count = len(_page_cache)
+        _page_cache.clear()
+        stats = dict(_fetch_stats)
+        _fetch_stats.update(pages=0, bytes=0, head_only=0)
+    if count:
+        logging.info(f"Cleared {count} cached pages")
+    if stats['pages']:
+        logging.info(f"Fetched {stats['pages']} pages, {stats['bytes'] / 1024:.0f} KB of HTML, "
+                     f"{stats['head_only']} stopped after <head>")
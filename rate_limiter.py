@@ -0,0 +1,195 @@
+"""
+Per-domain token-bucket rate limiting for outbound requests
+
+Replaces the fixed time.sleep() calls that used to throttle every fetcher
+globally. Each host gets its own token bucket, so consecutive requests to
+different publishers proceed immediately while each host is still held to
+its own rate. http_client calls acquire() before every attempt it sends,
+including redirect hops and retries, so all fetchers share the same
+buckets and a publisher answering 429 or 5xx is not retried faster than
+its rate.
+
+Configuration (environment variables):
+  RATE_LIMIT_DEFAULT_RATE   Requests per second per host (default: 2)
+  RATE_LIMIT_DEFAULT_BURST  Requests a host can receive back to back (default: 2)
+  RATE_LIMIT_OVERRIDES      JSON object of per-domain overrides, e.g.
+                            {"news.google.com": {"rate": 0.5, "burst": 2}}
+
+An override for a domain also applies to its subdomains.
+
+A caller holding concurrency slots can register a wait hook for the
+current context with set_wait_hook(). When acquire() has to sleep for a
+token it calls hook.pause() first and hook.resume() afterwards, so the
+slots are free for other hosts while this one is throttled.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from urllib.parse import urlparse
+
+DEFAULT_RATE = float(os.environ.get("RATE_LIMIT_DEFAULT_RATE", "2"))
+DEFAULT_BURST = float(os.environ.get("RATE_LIMIT_DEFAULT_BURST", "2"))
+
+# Built-in overrides; Google News feeds keep the old one-request-per-2s pace after a short burst
+DEFAULT_OVERRIDES = {
+    'news.google.com': {'rate': 0.5, 'burst': 2}
+}
+
+# Hook with pause() and resume() called around rate limit sleeps; asyncio.to_thread
+# copies the context, so fetch threads see the hook of the task that started them
+_wait_hook = contextvars.ContextVar('rate_limiter_wait_hook', default=None)
+
+def set_wait_hook(hook):
+    """
+    Register a hook called around rate limit sleeps in the current context
+
+    Args:
+        hook: Object with pause() and resume(), or None to remove it
+
+    Returns:
+        contextvars.Token: Pass to reset_wait_hook to restore the previous hook
+    """
+    return _wait_hook.set(hook)
+
+def reset_wait_hook(token):
+    """Restore the wait hook that was registered before set_wait_hook."""
+    _wait_hook.reset(token)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Tokens refill continuously at rate per second up to burst. A caller that
+    finds the bucket empty reserves the next token and sleeps until it is
+    due, so waiting callers are served in order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available and return the time waited."""
+        wait = self.reserve()
+        if wait > 0:
+            hook = _wait_hook.get()
+            if hook is None:
+                time.sleep(wait)
+            else:
+                hook.pause()
+                try:
+                    time.sleep(wait)
+                finally:
+                    hook.resume()
+        return wait
+
+class DomainRateLimiter:
+    """Token buckets per host with a default rate and per-domain overrides."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, overrides=None):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = dict(overrides or {})
+        self.buckets = {}
+        self.waits = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_environ(cls):
+        """Build a limiter from the RATE_LIMIT_* environment variables."""
+        overrides = dict(DEFAULT_OVERRIDES)
+        raw = os.environ.get("RATE_LIMIT_OVERRIDES")
+        if raw:
+            try:
+                overrides.update(json.loads(raw))
+            except ValueError as e:
+                logging.error(f"Ignoring invalid RATE_LIMIT_OVERRIDES: {str(e)}")
+        return cls(DEFAULT_RATE, DEFAULT_BURST, overrides)
+
+    def configure(self, rate=None, burst=None, overrides=None):
+        """
+        Change the limits; existing buckets are rebuilt on next use
+
+        Args:
+            rate (float, optional): New default requests per second per host
+            burst (float, optional): New default burst size
+            overrides (dict, optional): Per-domain overrides to add or replace
+        """
+        with self.lock:
+            if rate is not None:
+                self.rate = rate
+            if burst is not None:
+                self.burst = burst
+            if overrides:
+                self.overrides.update(overrides)
+            self.buckets.clear()
+
+    def _limits_for(self, host):
+        """Get the (rate, burst) for a host, honoring domain overrides."""
+        parts = host.split('.')
+        for i in range(len(parts) - 1):
+            override = self.overrides.get('.'.join(parts[i:]))
+            if override:
+                return override.get('rate', self.rate), override.get('burst', self.burst)
+        return self.rate, self.burst
+
+    def _bucket_for(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(*self._limits_for(host))
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """
+        Block until the URL's host may receive another request
+
+        Args:
+            url (str): The URL about to be requested
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        host = (urlparse(url).hostname or '').lower()
+        if not host:
+            return 0.0
+        if host.startswith('www.'):
+            host = host[4:]
+
+        wait = self._bucket_for(host).acquire()
+        if wait > 0:
+            with self.lock:
+                self.waits[host] = self.waits.get(host, 0.0) + wait
+        return wait
+
+    def get_stats(self):
+        """
+        Get the total time spent waiting per host
+
+        Returns:
+            dict: Maps host to seconds spent waiting for its rate limit
+        """
+        with self.lock:
+            return dict(self.waits)
+
+# Shared limiter used by http_client for every outbound request
+limiter = DomainRateLimiter.from_environ()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Versioned response cache for the dashboard pages
+
+/, /trends, /keywords and /articles used to query and render everything on
+every request, although their data only changes when articles, keywords or
+images are written. Their rendered responses are now cached, keyed by path
+and query parameters, together with the data version they were rendered
+at. Every write to articles, keyword links, images or keywords bumps the
+shared data version (bump_data_version), so the next request renders a
+fresh page; cached pages also expire after RESPONSE_CACHE_TTL seconds
+because they show the current time and date ranges.
+
+RESPONSE_CACHE picks the backend:
+  memory  An LRU in each process (default)
+  sqlite  A SQLite file (RESPONSE_CACHE_PATH) shared by all workers on a host
+  off     No caching
+
+Requests with pending flash messages are neither served from nor stored
+in the cache. Hit and miss counters are kept per process and served at
+GET /cache/stats.
+
+Usage:
+  python response_cache.py [--clear]
+
+Prints the data version and the size of the cache.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import argparse
+import functools
+import threading
+from collections import Counter
+from urllib.parse import urlencode
+from flask import request, session, make_response, has_app_context
+from cachetools import LRUCache
+from sqlalchemy import update
+
+from models import db, DataVersion
+
+# Backend: 'memory', 'sqlite' or 'off'
+CACHE_BACKEND = os.environ.get("RESPONSE_CACHE", "memory")
+
+# Seconds a cached page is served even if the data didn't change
+CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+
+# Pages kept per process (memory) or in the shared file (sqlite)
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+
+# File used by the sqlite backend
+CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "response_cache.sqlite3"))
+
+# Name of the data version row bumped by writes
+DATA_VERSION = 'content'
+
+class MemoryBackend:
+    """Cached pages in an LRU local to this process."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries):
+        self._entries = LRUCache(maxsize=max_entries)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+class SqliteBackend:
+    """Cached pages in a SQLite file shared by every process on the host."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS response_cache ("
+                         "key TEXT PRIMARY KEY, version INTEGER NOT NULL, stored_at REAL NOT NULL, "
+                         "mimetype TEXT NOT NULL, body BLOB NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT version, stored_at, mimetype, body FROM response_cache WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1], row[2], bytes(row[3])) if row else None
+
+    def set(self, key, entry):
+        version, stored_at, mimetype, body = entry
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO response_cache (key, version, stored_at, mimetype, body) "
+                     "VALUES (?, ?, ?, ?, ?)", (key, version, stored_at, mimetype, body))
+        self._writes += 1
+        if self._writes % 50 == 0:
+            # Drop pages of older data versions, then the oldest ones over the limit
+            conn.execute("DELETE FROM response_cache WHERE version < ?", (version,))
+            conn.execute("DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache "
+                         "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM response_cache")
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+def _create_backend():
+    if CACHE_BACKEND == 'off':
+        return None
+    if CACHE_BACKEND == 'sqlite':
+        return SqliteBackend(CACHE_PATH, MAX_ENTRIES)
+    if CACHE_BACKEND != 'memory':
+        logging.warning(f"Unknown RESPONSE_CACHE backend {CACHE_BACKEND}, using memory")
+    return MemoryBackend(MAX_ENTRIES)
+
+_backend = _create_backend()
+_stats = Counter()
+_lock = threading.Lock()
+
+def get_data_version():
+    """
+    Get the current data version
+
+    Must be called inside an app context.
+
+    Returns:
+        int: The version, 0 before the first write
+    """
+    version = db.session.query(DataVersion.version).filter_by(name=DATA_VERSION).scalar()
+    return version or 0
+
+def bump_data_version():
+    """
+    Mark the dashboard data as changed, invalidating every cached page
+
+    Call after committing writes to articles, keyword links, images or
+    keywords. Does nothing outside an app context. Commits.
+    """
+    if not has_app_context():
+        return
+    try:
+        bumped = db.session.execute(update(DataVersion).where(DataVersion.name == DATA_VERSION).values(
+            version=DataVersion.version + 1)).rowcount
+        if not bumped:
+            db.session.add(DataVersion(name=DATA_VERSION, version=1))
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error bumping data version: {str(e)}")
+        db.session.rollback()
+        return
+    with _lock:
+        _stats['invalidations'] += 1
+
+def _cache_key():
+    """The request path with its query parameters in a stable order."""
+    params = sorted(request.args.items(multi=True))
+    return f"{request.path}?{urlencode(params)}" if params else request.path
+
+def cached_view(view):
+    """
+    Cache a GET view's response until the data version changes or CACHE_TTL passes
+
+    Only 200 responses are stored. Responses carry an X-Cache header of HIT,
+    MISS or BYPASS.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if _backend is None or request.method != 'GET' or session.get('_flashes'):
+            with _lock:
+                _stats['bypassed'] += 1
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Cache'] = 'BYPASS'
+            return response
+
+        key = _cache_key()
+        try:
+            version = get_data_version()
+            entry = _backend.get(key)
+        except Exception as e:
+            logging.warning(f"Error reading response cache: {str(e)}")
+            db.session.rollback()
+            version, entry = None, None
+
+        if entry is not None:
+            entry_version, stored_at, mimetype, body = entry
+            if entry_version == version and time.time() - stored_at < CACHE_TTL:
+                with _lock:
+                    _stats['hits'] += 1
+                response = make_response(body)
+                response.mimetype = mimetype
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            with _lock:
+                _stats['stale'] += 1
+
+        with _lock:
+            _stats['misses'] += 1
+        response = make_response(view(*args, **kwargs))
+        if version is not None and response.status_code == 200 and not response.direct_passthrough:
+            try:
+                _backend.set(key, (version, time.time(), response.mimetype, response.get_data()))
+                with _lock:
+                    _stats['stores'] += 1
+            except Exception as e:
+                logging.warning(f"Error writing response cache: {str(e)}")
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+def get_response_cache_stats():
+    """
+    Get this process's response cache counters
+
+    Returns:
+        dict: backend, entries, data_version (inside an app context), hits,
+            misses (stale included), stale, stores, bypassed, invalidations
+            and hit_ratio
+    """
+    with _lock:
+        stats = {key: _stats[key] for key in ('hits', 'misses', 'stale', 'stores', 'bypassed', 'invalidations')}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+    stats['backend'] = _backend.name if _backend else 'off'
+    stats['entries'] = _backend.size() if _backend else 0
+    if has_app_context():
+        stats['data_version'] = get_data_version()
+    return stats
+
+def clear_response_cache():
+    """Drop every cached page."""
+    if _backend is not None:
+        _backend.clear()
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Show or clear the dashboard response cache")
+    parser.add_argument("--clear", action="store_true", help="Drop every cached page")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        if args.clear:
+            clear_response_cache()
+        stats = get_response_cache_stats()
+        print(f"Response cache: {stats['backend']} backend, {stats['entries']} pages, "
+              f"data version {stats['data_version']}")
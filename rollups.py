@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Daily article count rollups for the trends page
+
+/trends used to group the raw article and article_keyword rows by
+publication day on every page view, with one extra query per top keyword.
+The keyword_daily_count and source_daily_count tables hold those counts
+per day instead, so the page reads a 30-day range of each table.
+
+Counts are recomputed per publication day rather than adjusted by +1/-1:
+after articles are stored or linked to keywords, the days those articles
+were published on are re-aggregated from the raw rows. This keeps the
+rollups exact however an article was written (batch upserts, the
+one-by-one fallback, keyword links for known articles or the local
+tagger), and a day only costs a range scan of its own articles.
+
+Usage:
+  python rollups.py --rebuild
+
+Recomputes both tables from all articles. /trends also rebuilds them once
+if they are empty while articles exist.
+"""
+
+import logging
+import argparse
+import datetime
+import threading
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, Article, Keyword, article_keyword, KeywordDailyCount, SourceDailyCount
+
+# Article IDs per query when looking up publication days
+CHUNK_SIZE = 500
+
+_checked = False
+_check_lock = threading.Lock()
+
+def _as_date(value):
+    """date() returns a string on SQLite and a date on PostgreSQL."""
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+def _day_ranges(days):
+    """Group dates into contiguous (first, last) ranges."""
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and day == ranges[-1][1] + datetime.timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+def _aggregate_queries(start=None, end=None):
+    """Grouped (day, keyword_id, count) and (day, source, count) selects, optionally for [start, end)."""
+    day = func.date(Article.published_date)
+    source = func.coalesce(Article.source, '')
+    keywords = select(day, article_keyword.c.keyword_id, func.count()).select_from(Article).join(
+        article_keyword, article_keyword.c.article_id == Article.id)
+    sources = select(day, source, func.count()).select_from(Article)
+
+    conditions = [Article.published_date.isnot(None)]
+    if start is not None:
+        conditions += [Article.published_date >= start, Article.published_date < end]
+    keywords = keywords.where(*conditions).group_by(day, article_keyword.c.keyword_id)
+    sources = sources.where(*conditions).group_by(day, source)
+    return keywords, sources
+
+def refresh_daily_rollups(days):
+    """
+    Recompute the rollups of some publication days from the article tables
+
+    Must be called inside an app context. Commits.
+
+    Args:
+        days (iterable): Dates to recompute
+
+    Returns:
+        int: Number of days recomputed
+    """
+    from article_writer import dialect_insert
+
+    ranges = _day_ranges(days)
+    if not ranges:
+        return 0
+
+    try:
+        for first, last in ranges:
+            start = datetime.datetime.combine(first, datetime.time.min)
+            end = datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time.min)
+            keywords, sources = _aggregate_queries(start, end)
+            keyword_rows = [{'day': _as_date(day), 'keyword_id': keyword_id, 'article_count': count}
+                            for day, keyword_id, count in db.session.execute(keywords)]
+            source_rows = [{'day': _as_date(day), 'source': source, 'article_count': count}
+                           for day, source, count in db.session.execute(sources)]
+
+            for model, rows, key in ((KeywordDailyCount, keyword_rows, 'keyword_id'),
+                                     (SourceDailyCount, source_rows, 'source')):
+                table = model.__table__
+                db.session.execute(delete(table).where(table.c.day >= first, table.c.day <= last))
+                if rows:
+                    # Upsert in case another process recomputed the same day meanwhile
+                    stmt = dialect_insert(table).values(rows)
+                    stmt = stmt.on_conflict_do_update(index_elements=[table.c.day, table.c[key]],
+                                                      set_={'article_count': stmt.excluded.article_count})
+                    db.session.execute(stmt)
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error refreshing daily rollups: {str(e)}")
+        db.session.rollback()
+        return 0
+    return sum((last - first).days + 1 for first, last in ranges)
+
+def refresh_rollups_for_articles(article_ids):
+    """
+    Recompute the rollups of the days some articles were published on
+
+    Call after storing articles or changing their keyword links. Must be
+    called inside an app context. Commits.
+
+    Args:
+        article_ids (iterable): IDs of the changed articles
+
+    Returns:
+        int: Number of days recomputed
+    """
+    article_ids = list(set(article_ids))
+    days = set()
+    try:
+        for i in range(0, len(article_ids), CHUNK_SIZE):
+            chunk = article_ids[i:i + CHUNK_SIZE]
+            days.update(_as_date(day) for (day,) in db.session.query(func.date(Article.published_date)).filter(
+                Article.id.in_(chunk), Article.published_date.isnot(None)).distinct())
+    except Exception as e:
+        logging.error(f"Error finding publication days for rollups: {str(e)}")
+        db.session.rollback()
+        return 0
+    return refresh_daily_rollups(days)
+
+def delete_keyword_rollups(keyword_id):
+    """Remove a keyword's rollups; the caller deletes the keyword and commits."""
+    db.session.execute(delete(KeywordDailyCount).where(KeywordDailyCount.keyword_id == keyword_id))
+
+def rebuild_daily_rollups():
+    """
+    Recompute both rollup tables from all articles in one transaction
+
+    Must be called inside an app context.
+
+    Returns:
+        dict: Number of keyword and source rows written
+    """
+    keywords, sources = _aggregate_queries()
+    db.session.execute(delete(KeywordDailyCount))
+    db.session.execute(delete(SourceDailyCount))
+    db.session.execute(insert(KeywordDailyCount).from_select(['day', 'keyword_id', 'article_count'], keywords))
+    db.session.execute(insert(SourceDailyCount).from_select(['day', 'source', 'article_count'], sources))
+    db.session.commit()
+
+    counts = {'keyword_rows': KeywordDailyCount.query.count(), 'source_rows': SourceDailyCount.query.count()}
+    logging.info(f"Rebuilt daily rollups: {counts['keyword_rows']} keyword and {counts['source_rows']} source rows")
+    return counts
+
+def ensure_daily_rollups():
+    """
+    Build the rollups once if they are empty while dated articles exist
+
+    Covers databases from before the rollup tables. Checked once per process.
+    """
+    global _checked
+    if _checked:
+        return
+    with _check_lock:
+        if _checked:
+            return
+        empty = db.session.query(SourceDailyCount.day).first() is None
+        if empty and db.session.query(Article.id).filter(Article.published_date.isnot(None)).first() is not None:
+            rebuild_daily_rollups()
+        _checked = True
+
+def daily_source_counts(start, end):
+    """
+    Read the source rollups for a range of days
+
+    Args:
+        start (date): First day
+        end (date): Last day
+
+    Returns:
+        tuple: ({day: articles}, {source: articles}); the source is None for articles without one
+    """
+    per_day = {}
+    per_source = {}
+    rows = db.session.query(SourceDailyCount.day, SourceDailyCount.source, SourceDailyCount.article_count).filter(
+        SourceDailyCount.day >= start, SourceDailyCount.day <= end)
+    for day, source, count in rows:
+        per_day[day] = per_day.get(day, 0) + count
+        source = source or None
+        per_source[source] = per_source.get(source, 0) + count
+    return per_day, per_source
+
+def daily_keyword_counts(start, end):
+    """
+    Read the keyword rollups for a range of days, by keyword display name
+
+    Args:
+        start (date): First day
+        end (date): Last day
+
+    Returns:
+        dict: Maps display name to {day: articles}
+    """
+    counts = {}
+    rows = db.session.query(KeywordDailyCount.day, Keyword.display_name, KeywordDailyCount.article_count).join(
+        Keyword, Keyword.id == KeywordDailyCount.keyword_id
+    ).filter(KeywordDailyCount.day >= start, KeywordDailyCount.day <= end)
+    for day, name, count in rows:
+        days = counts.setdefault(name, {})
+        days[day] = days.get(day, 0) + count
+    return counts
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Maintain the daily article count rollups")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from all articles")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from main import app
+
+    args = parse_args()
+    with app.app_context():
+        if args.rebuild:
+            print(rebuild_daily_rollups())
+        else:
+            print(f"Daily rollups: {KeywordDailyCount.query.count()} keyword and "
+                  f"{SourceDailyCount.query.count()} source rows")
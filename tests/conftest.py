@@ -0,0 +1,29 @@
+"""Shared fixtures: the Flask app bound to a throwaway SQLite database."""
+
+import os
+import tempfile
+
+import pytest
+
+# main reads these at import time, so they are set before any test imports it
+_data_dir = tempfile.mkdtemp(prefix='social-commerce-news-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_data_dir, 'test.db')}"
+os.environ['IMAGE_PROXY_DIR'] = os.path.join(_data_dir, 'image_cache')
+
+@pytest.fixture
+def app():
+    """The app inside an app context; every table is emptied afterwards."""
+    from main import app
+    from models import db
+
+    with app.app_context():
+        yield app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,58 @@
+"""Upsert rules of ArticleBatchWriter for images and content of stored articles."""
+
+import datetime
+
+import pytest
+
+from article_writer import ArticleBatchWriter, MIN_CONTENT_LENGTH, PLACEHOLDER_CONTENT_MARKER
+from models import db, Article
+
+URL = 'https://publisher.example.com/story'
+PLACEHOLDER_IMAGE = 'https://placehold.co/600x400?text=Story'
+REAL_IMAGE = 'https://cdn.example.com/story.jpg'
+BETTER_IMAGE = 'https://cdn.example.com/story-large.jpg'
+THIN_CONTENT = 'Too short.'
+FULL_CONTENT = 'The full article text. ' * 20
+OTHER_CONTENT = 'A different full article text. ' * 20
+PLACEHOLDER_CONTENT = f"{PLACEHOLDER_CONTENT_MARKER}. " + 'Read more at the publisher. ' * 10
+
+def _article(image_url, content, summary='Summary'):
+    return {'title': 'Story', 'url': URL, 'source': 'Publisher', 'published_date': datetime.datetime(2026, 1, 1),
+            'image_url': image_url, 'content': content, 'summary': summary}
+
+def _write(article):
+    with ArticleBatchWriter() as writer:
+        writer.add(article, [])
+    return writer.stored[URL]
+
+def _stored():
+    db.session.expire_all()
+    return Article.query.filter_by(url=URL).one()
+
+@pytest.mark.parametrize('stored_image, new_image, expected', [
+    (PLACEHOLDER_IMAGE, REAL_IMAGE, REAL_IMAGE),
+    (None, REAL_IMAGE, REAL_IMAGE),
+    (REAL_IMAGE, PLACEHOLDER_IMAGE, REAL_IMAGE),
+    (REAL_IMAGE, BETTER_IMAGE, REAL_IMAGE),
+    (PLACEHOLDER_IMAGE, 'https://logo.clearbit.com/example.com?size=200', PLACEHOLDER_IMAGE),
+])
+def test_only_placeholder_images_are_upgraded_with_real_ones(app, stored_image, new_image, expected):
+    article_id = _write(_article(stored_image, FULL_CONTENT))
+    assert _write(_article(new_image, FULL_CONTENT)) == article_id
+    assert _stored().image_url == expected
+
+@pytest.mark.parametrize('stored_content, new_content, expected', [
+    (THIN_CONTENT, FULL_CONTENT, FULL_CONTENT),
+    ('', FULL_CONTENT, FULL_CONTENT),
+    (PLACEHOLDER_CONTENT, FULL_CONTENT, FULL_CONTENT),
+    (FULL_CONTENT, OTHER_CONTENT, FULL_CONTENT),
+    (FULL_CONTENT, THIN_CONTENT, FULL_CONTENT),
+    (THIN_CONTENT, PLACEHOLDER_CONTENT, THIN_CONTENT),
+    (THIN_CONTENT, 'x' * MIN_CONTENT_LENGTH, THIN_CONTENT),
+])
+def test_only_thin_content_is_upgraded_with_substantial_content(app, stored_content, new_content, expected):
+    _write(_article(REAL_IMAGE, stored_content, summary='Old summary'))
+    _write(_article(REAL_IMAGE, new_content, summary='New summary'))
+    stored = _stored()
+    assert stored.content == expected
+    assert stored.summary == ('New summary' if expected == new_content else 'Old summary')
@@ -0,0 +1,63 @@
+"""Checkpoints of collection runs and resuming a run where it stopped."""
+
+import datetime
+
+import pytest
+
+from collection_runs import RunTracker, RUN_STALE_MINUTES
+from models import db, CollectionRun, CollectionRunUrl, Keyword
+
+@pytest.fixture
+def keyword_ids(app):
+    keywords = [Keyword(name=name, display_name=name.title()) for name in ('live shopping', 'social commerce')]
+    db.session.add_all(keywords)
+    db.session.commit()
+    return [keyword.id for keyword in keywords]
+
+def _stop_run(keyword_ids, status):
+    """A run that finished one keyword and stopped in the middle of the other."""
+    tracker = RunTracker.start('serial', keyword_ids)
+    tracker.complete_keyword(keyword_ids[0], ['https://a.example.com/stored'], ['https://a.example.com/failed'])
+    tracker.record_error('content', 'page timed out')
+    tracker.record_urls(keyword_ids[1], ['https://b.example.com/stored'], ['https://b.example.com/failed'])
+    tracker.finish(status)
+    return tracker
+
+def test_resume_skips_finished_keywords_and_urls(keyword_ids):
+    stopped = _stop_run(keyword_ids, 'aborted')
+
+    tracker = RunTracker.start('async', keyword_ids, resume=True)
+    assert tracker.run_id == stopped.run_id
+    assert tracker.resumed
+    assert tracker.keyword_done(keyword_ids[0]) and not tracker.keyword_done(keyword_ids[1])
+    for url in ('https://a.example.com/stored', 'https://a.example.com/failed',
+                'https://b.example.com/stored', 'https://b.example.com/failed'):
+        assert tracker.url_done(url)
+    assert tracker.url_stored('https://b.example.com/stored')
+    assert not tracker.url_stored('https://b.example.com/failed')
+    assert not tracker.url_done('https://b.example.com/new')
+
+    run = db.session.get(CollectionRun, tracker.run_id)
+    assert (run.status, run.engine, run.resume_count) == ('running', 'async', 1)
+    assert run.articles_stored == 2
+    assert tracker.errors_by_stage['content'] == 1
+
+def test_completed_run_is_not_resumed_and_drops_its_checkpoints(keyword_ids):
+    completed = _stop_run(keyword_ids, 'completed')
+    assert CollectionRunUrl.query.filter_by(run_id=completed.run_id).count() == 0
+
+    tracker = RunTracker.start('serial', keyword_ids, resume=True)
+    assert tracker.run_id != completed.run_id
+    assert not tracker.resumed
+
+def test_live_run_is_not_taken_over(keyword_ids):
+    live = RunTracker.start('serial', keyword_ids)
+    assert RunTracker.start('serial', keyword_ids, resume=True).run_id != live.run_id
+
+def test_stale_running_run_is_resumed(keyword_ids):
+    crashed = RunTracker.start('serial', keyword_ids)
+    run = db.session.get(CollectionRun, crashed.run_id)
+    run.updated_at = datetime.datetime.utcnow() - datetime.timedelta(minutes=RUN_STALE_MINUTES + 1)
+    db.session.commit()
+
+    assert RunTracker.start('serial', keyword_ids, resume=True).run_id == crashed.run_id
@@ -0,0 +1,97 @@
+"""Thumbnail lookup against pages served from a local HTTP server."""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import domain_profiles
+from page_fetch import fetch_page, clear_page_cache
+from thumbnail_cache import lookup_thumbnail
+from fetch_thumbnails import get_thumbnail_from_url, is_placeholder_image, LOGO_HOST
+
+# Long enough that a whole-page read is clearly more than a head-only one
+FILLER = '<p>' + 'Lorem ipsum dolor sit amet. ' * 4000 + '</p>'
+
+PAGES = {
+    '/og-image': ('<html><head><title>Story</title>'
+                  '<meta property="og:image" content="https://cdn.example.com/story.jpg">'
+                  f'</head><body>{FILLER}</body></html>'),
+    '/no-image': f'<html><head><title>No image</title></head><body>{FILLER}</body></html>'
+}
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        html = PAGES.get(self.path.split('?')[0])
+        if html is None:
+            self.send_error(404)
+            return
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    clear_page_cache()
+    domain_profiles._registry.clear()
+    yield
+    clear_page_cache()
+    domain_profiles._registry.clear()
+
+def _profile(strategy):
+    return domain_profiles._registry.get(('127.0.0.1', 'thumbnail', strategy))
+
+def test_page_image_found_from_head_only_fetch(server):
+    url = f'{server}/og-image?case=head'
+
+    assert get_thumbnail_from_url(url) == 'https://cdn.example.com/story.jpg'
+
+    # The first strategy found the image in <head> without reading the body
+    head = _profile('head_preview')
+    assert head['attempts'] == 1 and head['successes'] == 1
+    assert _profile('page_preview') is None
+    page = fetch_page(url, head_only=True)
+    assert page['head_only'] and page['bytes_read'] < len(PAGES['/og-image'])
+
+    assert lookup_thumbnail(url) == ('found', 'https://cdn.example.com/story.jpg')
+
+def test_logo_is_the_fallback_after_page_strategies(server):
+    url = f'{server}/no-image?case=fallback'
+
+    image_url = get_thumbnail_from_url(url)
+
+    assert LOGO_HOST in image_url and is_placeholder_image(image_url)
+    # Every page strategy ran and was recorded as failing
+    for strategy in ('head_preview', 'page_preview', 'meta_images'):
+        profile = _profile(strategy)
+        assert profile['attempts'] == 1 and profile['successes'] == 0
+
+    # Cached as a negative entry, served as the same fallback
+    assert lookup_thumbnail(url) == ('missing', None)
+    assert get_thumbnail_from_url(url) == image_url
+
+def test_strategies_that_work_on_a_domain_run_first(server):
+    for _ in range(3):
+        domain_profiles.record_strategy(server, 'thumbnail', 'meta_images', True, 5.0)
+        domain_profiles.record_strategy(server, 'thumbnail', 'head_preview', False, 50.0)
+    url = f'{server}/og-image?case=order'
+
+    assert get_thumbnail_from_url(url) == 'https://cdn.example.com/story.jpg'
+
+    assert _profile('meta_images')['attempts'] == 4
+    assert _profile('head_preview')['attempts'] == 3
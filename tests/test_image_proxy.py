@@ -0,0 +1,93 @@
+"""Image proxy signing and the checks that keep it off the internal network."""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlencode
+
+import pytest
+
+import image_proxy
+
+# Smallest valid GIF: one transparent pixel
+PIXEL_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+             b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+class ImageHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        ImageHandler.requests.append(self.path)
+        if self.path.startswith('/to-internal'):
+            self.send_response(302)
+            self.send_header('Location', 'http://10.0.0.1/secret.gif')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(PIXEL_GIF)))
+        self.end_headers()
+        self.wfile.write(PIXEL_GIF)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def proxy(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_proxy, 'IMAGE_PROXY_ENABLED', True)
+    monkeypatch.setattr(image_proxy, 'IMAGE_PROXY_SECRET', 'test-secret')
+    monkeypatch.setattr(image_proxy, 'STORE_DIR', str(tmp_path))
+    image_proxy._memory.clear()
+    ImageHandler.requests.clear()
+
+def _allow_loopback(monkeypatch):
+    """Treat the local test server as public; everything else keeps the real check."""
+    real_check = image_proxy._is_public_address
+    monkeypatch.setattr(image_proxy, '_is_public_address',
+                        lambda address: address == '127.0.0.1' or real_check(address))
+
+def test_forged_signature_is_rejected(client, server):
+    query = urlencode({'url': f'{server}/forged.gif'})
+    assert client.get(f'/images/{"0" * 32}?{query}').status_code == 404
+    assert ImageHandler.requests == []
+
+def test_signed_internal_url_is_not_fetched(app, client, server):
+    link = image_proxy.proxied_image_url(f'{server}/internal.gif')
+    response = client.get(link)
+    assert response.status_code == 404
+    assert 'Location' not in response.headers
+    assert ImageHandler.requests == []
+
+def test_redirect_to_internal_address_is_not_followed(app, client, server, monkeypatch):
+    _allow_loopback(monkeypatch)
+    response = client.get(image_proxy.proxied_image_url(f'{server}/to-internal.gif'))
+    assert response.status_code == 404
+    assert ImageHandler.requests == ['/to-internal.gif']
+
+def test_public_image_is_served(app, client, server, monkeypatch):
+    _allow_loopback(monkeypatch)
+    response = client.get(image_proxy.proxied_image_url(f'{server}/pixel.gif'))
+    assert response.status_code == 200
+    assert response.data == PIXEL_GIF
+    assert response.mimetype == 'image/gif'
+
+def test_proxy_is_off_without_its_own_secret(app, client, monkeypatch):
+    monkeypatch.setattr(image_proxy, 'IMAGE_PROXY_SECRET', '')
+    url = 'https://cdn.example.com/story.jpg'
+    assert image_proxy.proxied_image_url(url) == url
+    query = urlencode({'url': url})
+    assert client.get(f'/images/{image_proxy.image_signature(url)}?{query}').status_code == 404
+
+@pytest.mark.parametrize('url', ['file:///etc/passwd', 'ftp://example.com/a.gif', 'http://169.254.169.254/latest',
+                                 'http://[::1]/a.gif', 'http://localhost/a.gif'])
+def test_non_public_urls_fail_the_check(url):
+    with pytest.raises(ValueError):
+        image_proxy.check_image_url(url)
@@ -0,0 +1,66 @@
+"""Job claiming under concurrency limits, and retries of failing jobs."""
+
+import datetime
+
+import pytest
+
+import job_queue
+from job_queue import enqueue_job, claim_job, run_job
+from models import db, Job
+
+@pytest.fixture
+def failing_job_type(monkeypatch):
+    """A job type whose handler always raises."""
+    def fail(payload, context):
+        raise RuntimeError(f"attempt {context.attempt} failed")
+
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, 'always_fails', fail)
+    monkeypatch.setitem(job_queue.JOB_CONCURRENCY, 'always_fails', 1)
+    monkeypatch.setattr(job_queue, 'RETRY_BACKOFF_SECONDS', 0)
+    return 'always_fails'
+
+def test_claim_respects_the_type_limit(app):
+    first = enqueue_job('collect')
+    enqueue_job('collect')
+
+    claimed = claim_job('worker-1')
+    assert claimed.id == first.id
+    assert claimed.status == 'running' and claimed.attempts == 1
+    assert claim_job('worker-2') is None
+
+def test_claim_rechecks_the_limit_in_the_update(app, monkeypatch):
+    enqueue_job('collect')
+    second = enqueue_job('collect')
+    assert claim_job('worker-1') is not None
+
+    # A worker that counted running jobs before the first claim committed
+    monkeypatch.setattr(job_queue, '_running_counts', lambda now: {})
+    assert claim_job('worker-2') is None
+    assert db.session.get(Job, second.id).status == 'queued'
+
+def test_job_with_expired_lease_is_claimed_again(app):
+    job = enqueue_job('collect')
+    claim_job('worker-1')
+    db.session.get(Job, job.id).lease_expires_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.session.commit()
+
+    reclaimed = claim_job('worker-2')
+    assert reclaimed.id == job.id
+    assert reclaimed.locked_by == 'worker-2' and reclaimed.attempts == 2
+
+def test_failing_job_is_retried_then_failed(app, failing_job_type):
+    job = enqueue_job(failing_job_type, max_attempts=2)
+
+    run_job(app, 'worker-1', claim_job('worker-1'))
+    retried = db.session.get(Job, job.id)
+    db.session.refresh(retried)
+    assert retried.status == 'queued'
+    assert retried.locked_by is None
+    assert 'attempt 1 failed' in retried.error
+
+    run_job(app, 'worker-1', claim_job('worker-1'))
+    db.session.refresh(retried)
+    assert retried.status == 'failed'
+    assert retried.attempts == 2
+    assert 'attempt 2 failed' in retried.error
+    assert claim_job('worker-1') is None
@@ -0,0 +1,41 @@
+"""Watermarks only move past feed entries whose article was handled."""
+
+import time
+
+from watermarks import advance_watermark, filter_entries_by_watermark, split_feed_entries, feed_entry_published
+
+def _entry(n):
+    return {'id': f'entry-{n}', 'link': f'https://news.google.com/rss/articles/{n}',
+            'published_parsed': time.gmtime(1767225600 + n * 3600)}
+
+def test_failed_entries_are_processed_again_next_run():
+    entries = [_entry(n) for n in range(5)]
+    failed = [entries[1], entries[3]]
+    handled = [entry for entry in entries if entry not in failed]
+
+    watermark = advance_watermark(None, handled, failed)
+    assert watermark['last_published_at'] == feed_entry_published(entries[1])
+    assert set(watermark['seen_ids']) == {entry['id'] for entry in handled}
+
+    again, skipped = filter_entries_by_watermark(entries + [_entry(5)], watermark)
+    assert [entry['id'] for entry in again] == ['entry-1', 'entry-3', 'entry-5']
+    assert skipped == 3
+
+def test_watermark_never_moves_back_past_earlier_runs():
+    earlier = advance_watermark(None, [_entry(n) for n in range(3)])
+    watermark = advance_watermark(earlier, [_entry(4)], [_entry(3)])
+    assert watermark['last_published_at'] == feed_entry_published(_entry(3))
+    assert filter_entries_by_watermark([_entry(n) for n in range(5)], watermark)[0] == [_entry(3)]
+
+def test_watermark_advances_fully_without_failures():
+    watermark = advance_watermark(None, [_entry(n) for n in range(3)], [])
+    assert watermark['last_published_at'] == feed_entry_published(_entry(2))
+
+def test_split_feed_entries_by_handled_article():
+    entries = [_entry(n) for n in range(3)]
+    articles_by_link = {entries[0]['link']: {'url': 'https://a.example.com/0'},
+                        entries[1]['link']: {'url': 'https://a.example.com/1'}}
+    # entries[2] failed to unwrap, entries[1] failed to store
+    handled, failed = split_feed_entries(entries, articles_by_link, lambda url: url.endswith('/0'))
+    assert handled == [entries[0]]
+    assert failed == [entries[1], entries[2]]
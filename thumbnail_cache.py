@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Two-tier thumbnail cache shared by every process
+
+get_thumbnail_from_url used to keep results in a per-process TTLCache, so
+each web worker and each image script started cold. Results now go to an
+in-process LRU in front of the thumbnail_cache_entry table, keyed by
+article URL, so every process and later run reuses them.
+
+Found images are kept for THUMBNAIL_CACHE_TTL_DAYS. Lookups that found no
+real image are cached as negative entries for a shorter time
+(THUMBNAIL_CACHE_NEGATIVE_TTL_HOURS) and answered with the branded
+placeholder until they are retried. New entries are buffered and written
+in batches; when the table grows past THUMBNAIL_CACHE_MAX_ENTRIES, expired
+entries and then the oldest ones are evicted.
+
+Hit and miss counters are kept per process and logged on every flush.
+
+Usage:
+  python thumbnail_cache.py
+
+Prints the size of the persistent cache.
+"""
+
+import os
+import logging
+import datetime
+import threading
+from collections import Counter
+from flask import has_app_context
+from cachetools import LRUCache
+from sqlalchemy import delete, func, select
+
+from models import db, ThumbnailCacheEntry
+
+# How long found and missing thumbnails are cached
+FOUND_TTL = datetime.timedelta(days=int(os.environ.get("THUMBNAIL_CACHE_TTL_DAYS", "7")))
+MISSING_TTL = datetime.timedelta(hours=int(os.environ.get("THUMBNAIL_CACHE_NEGATIVE_TTL_HOURS", "24")))
+
+# Entries kept in process memory, and in the table before eviction
+MEMORY_SIZE = int(os.environ.get("THUMBNAIL_CACHE_MEMORY_SIZE", "5000"))
+MAX_ENTRIES = int(os.environ.get("THUMBNAIL_CACHE_MAX_ENTRIES", "100000"))
+
+# Number of new entries buffered before they are written
+FLUSH_THRESHOLD = 50
+
+_memory = LRUCache(maxsize=MEMORY_SIZE)
+_pending = {}
+_stats = Counter()
+_lock = threading.Lock()
+
+def lookup_thumbnail(url):
+    """
+    Look up a cached thumbnail result, memory first, then the table
+
+    The table is only consulted inside an app context.
+
+    Args:
+        url (str): The article URL
+
+    Returns:
+        tuple or None: ('found', image_url) or ('missing', None), None on a miss
+    """
+    now = datetime.datetime.utcnow()
+
+    with _lock:
+        entry = _memory.get(url)
+    tier = 'memory'
+    if entry is None and has_app_context():
+        try:
+            row = ThumbnailCacheEntry.query.filter_by(url=url).first()
+            if row:
+                entry = (row.status, row.image_url, row.expires_at)
+                tier = 'db'
+                with _lock:
+                    _memory[url] = entry
+        except Exception as e:
+            logging.warning(f"Error reading thumbnail cache: {str(e)}")
+            db.session.rollback()
+
+    with _lock:
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        status, image_url, expires_at = entry
+        if expires_at <= now:
+            _stats['expired'] += 1
+            _stats['misses'] += 1
+            _memory.pop(url, None)
+            return None
+        _stats[f'{tier}_hits'] += 1
+        if status == 'missing':
+            _stats['negative_hits'] += 1
+    return status, image_url
+
+def remember_thumbnail(url, image_url):
+    """
+    Cache a thumbnail result in memory and queue it for the table
+
+    Args:
+        url (str): The article URL
+        image_url (str or None): The thumbnail found, None when the page had no real image
+    """
+    now = datetime.datetime.utcnow()
+    if image_url:
+        entry = ('found', image_url, now + FOUND_TTL)
+    else:
+        entry = ('missing', None, now + MISSING_TTL)
+
+    with _lock:
+        _memory[url] = entry
+        _pending[url] = entry + (now,)
+        should_flush = len(_pending) >= FLUSH_THRESHOLD
+
+    if should_flush:
+        flush_thumbnail_cache()
+
+def _evict():
+    """Delete expired entries, then the oldest ones, until the table fits MAX_ENTRIES."""
+    table = ThumbnailCacheEntry.__table__
+    now = datetime.datetime.utcnow()
+    evicted = db.session.execute(delete(table).where(table.c.expires_at <= now)).rowcount
+
+    excess = db.session.execute(select(func.count()).select_from(table)).scalar() - MAX_ENTRIES
+    if excess > 0:
+        oldest = select(table.c.id).order_by(table.c.cached_at).limit(excess)
+        evicted += db.session.execute(delete(table).where(table.c.id.in_(oldest))).rowcount
+    return evicted
+
+def flush_thumbnail_cache():
+    """
+    Write buffered entries to the thumbnail_cache_entry table
+
+    Does nothing outside an app context; the entries stay buffered until a
+    later flush inside one. Evicts entries when the table is over its limit.
+
+    Returns:
+        int: Number of rows written
+    """
+    from article_writer import dialect_insert
+
+    if not has_app_context():
+        return 0
+
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    rows = [{
+        'url': url,
+        'status': status,
+        'image_url': image_url,
+        'expires_at': expires_at,
+        'cached_at': cached_at
+    } for url, (status, image_url, expires_at, cached_at) in batch.items()]
+
+    try:
+        stmt = dialect_insert(ThumbnailCacheEntry.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ThumbnailCacheEntry.__table__.c.url],
+            set_={
+                'status': stmt.excluded.status,
+                'image_url': stmt.excluded.image_url,
+                'expires_at': stmt.excluded.expires_at,
+                'cached_at': stmt.excluded.cached_at
+            }
+        )
+        db.session.execute(stmt)
+        evicted = _evict()
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error saving thumbnail cache: {str(e)}")
+        db.session.rollback()
+        # Put the entries back so a later flush can retry them
+        with _lock:
+            for url, entry in batch.items():
+                _pending.setdefault(url, entry)
+        return 0
+
+    with _lock:
+        _stats['writes'] += len(rows)
+        _stats['evicted'] += evicted
+    log_thumbnail_cache_stats()
+    return len(rows)
+
+def get_thumbnail_cache_stats():
+    """
+    Get this process's thumbnail cache counters
+
+    Returns:
+        dict: memory_hits, db_hits, negative_hits (also counted as hits),
+            misses, expired, writes, evicted and hit_ratio
+    """
+    with _lock:
+        stats = {key: _stats[key] for key in ('memory_hits', 'db_hits', 'negative_hits', 'misses', 'expired', 'writes', 'evicted')}
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_ratio'] = round((stats['memory_hits'] + stats['db_hits']) / lookups, 3) if lookups else None
+    return stats
+
+def log_thumbnail_cache_stats():
+    """Log a one-line summary of the cache counters."""
+    stats = get_thumbnail_cache_stats()
+    if stats['hit_ratio'] is None:
+        return
+    logging.info(f"Thumbnail cache: {stats['memory_hits']} memory hits, {stats['db_hits']} database hits "
+                 f"({stats['negative_hits']} negative), {stats['misses']} misses, "
+                 f"hit ratio {stats['hit_ratio']:.1%}, {stats['evicted']} evicted")
+
+if __name__ == "__main__":
+    from main import app
+
+    with app.app_context():
+        now = datetime.datetime.utcnow()
+        counts = dict(db.session.query(ThumbnailCacheEntry.status, func.count()).group_by(ThumbnailCacheEntry.status).all())
+        expired = ThumbnailCacheEntry.query.filter(ThumbnailCacheEntry.expires_at <= now).count()
+        print(f"Thumbnail cache: {counts.get('found', 0)} found, {counts.get('missing', 0)} missing, "
+              f"{expired} expired, limit {MAX_ENTRIES}")
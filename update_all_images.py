@@ -4,11 +4,13 @@ Script to batch update all article images in the database
 Uses the improved thumbnail extraction functionality to get better article images
 
 Usage:
-  python update_all_images.py [--limit=100] [--delay=0.5]
+  python update_all_images.py [--limit=100] [--delay=0.5] [--workers=8] [--per-host=2]
 
 Options:
   --limit=N     Limit processing to N articles (default: process all)
-  --delay=0.5   Seconds to wait between requests (default: 0.5)
+  --delay=0.5   Seconds to wait between requests to the same host (default: IMAGE_UPDATE_DELAY or 0.5)
+  --workers=N   Number of articles looked up in parallel (default: IMAGE_UPDATE_WORKERS or 8)
+  --per-host=N  Maximum lookups in flight per host (default: IMAGE_UPDATE_PER_HOST or 2)
 """
 
 import sys
@@ -16,26 +18,35 @@ import time
 import argparse
 from main import app, db
 from models import Article
-from fetch_thumbnails import update_article_images_from_urls
+from fetch_thumbnails import (update_article_images_from_urls, DEFAULT_IMAGE_DELAY, DEFAULT_IMAGE_WORKERS,
+                              DEFAULT_IMAGE_PER_HOST)
 
 def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Update article images with enhanced extraction")
     parser.add_argument("--limit", type=int, help="Limit processing to N articles (default: all)")
-    parser.add_argument("--delay", type=float, default=0.5, help="Seconds to wait between requests (default: 0.5)")
+    parser.add_argument("--delay", type=float, default=DEFAULT_IMAGE_DELAY,
+                        help=f"Seconds to wait between requests to the same host (default: {DEFAULT_IMAGE_DELAY})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_IMAGE_WORKERS,
+                        help=f"Number of articles looked up in parallel (default: {DEFAULT_IMAGE_WORKERS})")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_IMAGE_PER_HOST,
+                        help=f"Maximum lookups in flight per host (default: {DEFAULT_IMAGE_PER_HOST})")
     return parser.parse_args()
 
-def update_all_article_images(limit=None, delay=0.5):
+def update_all_article_images(limit=None, delay=DEFAULT_IMAGE_DELAY, workers=DEFAULT_IMAGE_WORKERS, per_host=DEFAULT_IMAGE_PER_HOST):
     """
     Update all article images using the improved thumbnail extraction
     
     Args:
         limit (int, optional): Limit processing to this many articles
-        delay (float, optional): Seconds to wait between requests
+        delay (float, optional): Seconds to wait between requests to the same host
+        workers (int, optional): Number of articles looked up in parallel
+        per_host (int, optional): Maximum lookups in flight per host
     """
     with app.app_context():
         # Use the improved batch update function from fetch_thumbnails.py
-        results = update_article_images_from_urls(db, Article)
+        results = update_article_images_from_urls(db, Article, limit=limit, delay=delay,
+                                                  workers=workers, per_host=per_host)
         
         # Display summary
         print("\n===== Image Update Summary =====")
@@ -46,4 +57,4 @@ def update_all_article_images(limit=None, delay=0.5):
 
 if __name__ == "__main__":
     args = parse_args()
-    update_all_article_images(limit=args.limit, delay=args.delay)
\ No newline at end of file
+    update_all_article_images(limit=args.limit, delay=args.delay, workers=args.workers, per_host=args.per_host)
\ No newline at end of file
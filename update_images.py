@@ -2,7 +2,9 @@ import logging
 import time
 from flask import Flask
 from main import app, db, Article, get_image_from_og_tags, generate_placeholder_image, extract_actual_url_from_google_news
-from fetch_thumbnails import get_thumbnail_from_url, unwrap_google_link
+from fetch_thumbnails import get_thumbnail_from_url, unwrap_google_link, placeholder_image_condition
+from thumbnail_cache import flush_thumbnail_cache
+from response_cache import bump_data_version
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,11 +30,7 @@ def update_article_images():
     """
     with app.app_context():
         # Get all articles that have no image or have a placeholder image
-        articles = Article.query.filter(
-            (Article.image_url.is_(None)) | 
-            (Article.image_url == "") | 
-            (Article.image_url.like('%data:image/svg+xml;base64%'))
-        ).all()
+        articles = Article.query.filter(placeholder_image_condition(Article.image_url)).all()
         
         total_count = len(articles)
         updated_count = 0
@@ -63,15 +61,18 @@ def update_article_images():
                         logging.info(f"Created placeholder for article: {article.title[:30]}...")
                     failed_count += 1
                 
-                # Be nice to servers - don't hammer them
-                time.sleep(0.5)
-                
             except Exception as e:
                 logging.error(f"Error updating image for article {article.id}: {str(e)}")
                 failed_count += 1
                 # Continue with the next article
                 continue
         
+        # Share this run's thumbnail lookups with other processes
+        flush_thumbnail_cache()
+        
+        # Cached dashboard pages show the old images
+        bump_data_version()
+        
         # Final summary
         logging.info(f"Image update complete: {total_count} articles processed")
         logging.info(f"Successfully updated: {updated_count}")
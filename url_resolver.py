@@ -0,0 +1,157 @@
+"""
+Persistent cache for Google News URL resolution
+
+Google News redirect URLs used to be resolved over the network on every
+run. This module keeps a durable mapping from Google News URL to canonical
+article URL in the resolved_url table, checked before any network call.
+Failed resolutions are cached too, with an expiry, so the same dead links
+are not retried every day.
+
+New results are buffered and written in batches; collectors call
+flush_resolved_urls() at the end of a run.
+"""
+
+import os
+import logging
+import datetime
+import threading
+from flask import has_app_context
+from cachetools import LRUCache
+
+from models import db, ResolvedUrl
+
+# How long a failed resolution is remembered before it is retried
+FAILURE_TTL = datetime.timedelta(hours=int(os.environ.get("RESOLVED_URL_FAILURE_TTL_HOURS", "24")))
+
+# Number of new results buffered before they are written
+FLUSH_THRESHOLD = 50
+
+# In-process copy of recent lookups, in front of the table
+_memory = LRUCache(maxsize=10000)
+_pending = {}
+_lock = threading.Lock()
+
+def is_google_news_url(url):
+    """Check if a URL is a Google redirect or Google News URL that needs resolving."""
+    return bool(url) and ('news.google.com' in url or 'google.com/url' in url)
+
+def _lookup(google_url):
+    """Get a cached (status, resolved_url) pair, or None if unknown or expired."""
+    now = datetime.datetime.utcnow()
+
+    with _lock:
+        entry = _memory.get(google_url)
+    if entry is None and has_app_context():
+        try:
+            row = ResolvedUrl.query.filter_by(google_url=google_url).first()
+            if row:
+                entry = (row.status, row.resolved_url, row.expires_at)
+                with _lock:
+                    _memory[google_url] = entry
+        except Exception as e:
+            logging.warning(f"Error reading resolved URL cache: {str(e)}")
+            db.session.rollback()
+
+    if entry is None:
+        return None
+    status, resolved_url, expires_at = entry
+    if status == 'failed' and expires_at and expires_at <= now:
+        return None
+    return status, resolved_url
+
+def _remember(google_url, resolved_url):
+    """Record a resolution result in memory and queue it for the database."""
+    now = datetime.datetime.utcnow()
+    if resolved_url and resolved_url != google_url:
+        entry = ('resolved', resolved_url, None)
+    else:
+        entry = ('failed', None, now + FAILURE_TTL)
+
+    with _lock:
+        _memory[google_url] = entry
+        _pending[google_url] = entry + (now,)
+        should_flush = len(_pending) >= FLUSH_THRESHOLD
+
+    if should_flush:
+        flush_resolved_urls()
+
+def cached_resolution(google_url):
+    """Get the cached article URL of a Google News URL without making a request, or None."""
+    cached = _lookup(google_url)
+    return cached[1] if cached and cached[0] == 'resolved' else None
+
+def resolve_google_news_url(google_url):
+    """
+    Resolve a Google News URL to the article URL, using the persistent cache first
+
+    Args:
+        google_url (str): Possibly a Google News URL that needs unwrapping
+
+    Returns:
+        str: The resolved article URL, or the original URL if it couldn't be resolved
+    """
+    from fetch_thumbnails import unwrap_google_link
+
+    if not is_google_news_url(google_url):
+        return unwrap_google_link(google_url)
+
+    cached = _lookup(google_url)
+    if cached:
+        status, resolved_url = cached
+        return resolved_url if status == 'resolved' else google_url
+
+    resolved_url = unwrap_google_link(google_url)
+    _remember(google_url, resolved_url)
+    return resolved_url or google_url
+
+def flush_resolved_urls():
+    """
+    Write buffered resolution results to the resolved_url table
+
+    Does nothing outside an app context; the results stay buffered until a
+    later flush inside one.
+
+    Returns:
+        int: Number of rows written
+    """
+    from article_writer import dialect_insert
+
+    if not has_app_context():
+        return 0
+
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    rows = [{
+        'google_url': google_url,
+        'status': status,
+        'resolved_url': resolved_url,
+        'expires_at': expires_at,
+        'resolved_at': resolved_at
+    } for google_url, (status, resolved_url, expires_at, resolved_at) in batch.items()]
+
+    try:
+        stmt = dialect_insert(ResolvedUrl.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ResolvedUrl.__table__.c.google_url],
+            set_={
+                'status': stmt.excluded.status,
+                'resolved_url': stmt.excluded.resolved_url,
+                'expires_at': stmt.excluded.expires_at,
+                'resolved_at': stmt.excluded.resolved_at
+            }
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+        return len(rows)
+    except Exception as e:
+        logging.error(f"Error saving resolved URLs: {str(e)}")
+        db.session.rollback()
+        # Put the results back so a later flush can retry them
+        with _lock:
+            for google_url, entry in batch.items():
+                _pending.setdefault(google_url, entry)
+        return 0
@@ -0,0 +1,170 @@
+"""
+Per-keyword high-water marks for incremental collection
+
+Each keyword remembers the newest published date it has collected and the
+IDs of recently seen feed entries. Collectors drop feed entries that are
+already seen or older than the watermark before any URL unwrapping or
+content fetch, so steady-state runs only process genuinely new entries.
+Entries published exactly at the watermark are still processed unless
+their ID was seen, since several stories can share a timestamp. Entries
+whose article could not be unwrapped or stored don't move the watermark,
+so the next run retries them.
+
+Pass full_rescan=True (or set COLLECT_FULL_RESCAN=1 for main.py) to ignore
+the watermarks for a run.
+"""
+
+import json
+import logging
+import datetime
+
+from models import db, KeywordWatermark
+
+# Number of recent entry IDs remembered per keyword
+MAX_SEEN_ENTRY_IDS = 500
+
+def feed_entry_id(entry):
+    """Get a stable ID for a feed entry: its guid, falling back to the link."""
+    return entry.get('id') or entry.get('link')
+
+def feed_entry_published(entry):
+    """Get a feed entry's published date, or None if the feed has none."""
+    parsed = entry.get('published_parsed')
+    return datetime.datetime(*parsed[:6]) if parsed else None
+
+def load_keyword_watermarks(keyword_ids):
+    """
+    Load the watermarks for a set of keywords
+
+    Args:
+        keyword_ids (iterable): Keyword IDs
+
+    Returns:
+        dict: Maps keyword ID to a dict with last_published_at and seen_ids
+            (a list, oldest first). Keywords without a watermark are absent.
+    """
+    rows = KeywordWatermark.query.filter(KeywordWatermark.keyword_id.in_(list(keyword_ids))).all()
+    watermarks = {}
+    for row in rows:
+        try:
+            seen_ids = json.loads(row.seen_entry_ids) if row.seen_entry_ids else []
+        except ValueError:
+            seen_ids = []
+        watermarks[row.keyword_id] = {
+            'last_published_at': row.last_published_at,
+            'seen_ids': seen_ids
+        }
+    return watermarks
+
+def filter_entries_by_watermark(entries, watermark):
+    """
+    Drop feed entries at or below a keyword's watermark
+
+    Args:
+        entries (list): Feed entries from fetch_google_news_entries
+        watermark (dict or None): The keyword's watermark, None to keep everything
+
+    Returns:
+        tuple: (entries to process, number of entries skipped)
+    """
+    if not watermark:
+        return list(entries), 0
+
+    seen_ids = set(watermark['seen_ids'])
+    last_published_at = watermark['last_published_at']
+
+    new_entries = []
+    for entry in entries:
+        if feed_entry_id(entry) in seen_ids:
+            continue
+        published = feed_entry_published(entry)
+        if last_published_at and published and published < last_published_at:
+            continue
+        new_entries.append(entry)
+    return new_entries, len(entries) - len(new_entries)
+
+def split_feed_entries(entries, articles_by_link, is_handled):
+    """
+    Split a keyword's feed entries by whether their article was handled
+
+    Args:
+        entries (list): The keyword's feed entries from this run
+        articles_by_link (dict): Maps feed links to unwrapped article dicts;
+            entries that failed to unwrap are absent
+        is_handled (callable): Called with an article URL, True if the
+            article was stored or deliberately skipped (e.g. already stored)
+
+    Returns:
+        tuple: (handled entries, failed entries)
+    """
+    handled, failed = [], []
+    for entry in entries:
+        article = articles_by_link.get(entry.get('link'))
+        (handled if article is not None and is_handled(article['url']) else failed).append(entry)
+    return handled, failed
+
+def advance_watermark(watermark, entries, failed_entries=()):
+    """
+    Move a watermark past a batch of processed feed entries
+
+    Failed entries are not marked as seen, and the published date of the
+    watermark stays at or below the oldest of them, so they pass
+    filter_entries_by_watermark again on the next run.
+
+    Args:
+        watermark (dict or None): The keyword's current watermark
+        entries (list): Feed entries that were stored or deliberately skipped this run
+        failed_entries (list): Feed entries whose article failed this run
+
+    Returns:
+        dict: The new watermark
+    """
+    watermark = watermark or {'last_published_at': None, 'seen_ids': []}
+    last_published_at = watermark['last_published_at']
+    seen_ids = list(watermark['seen_ids'])
+    known = set(seen_ids)
+
+    for entry in entries:
+        entry_id = feed_entry_id(entry)
+        if entry_id and entry_id not in known:
+            seen_ids.append(entry_id)
+            known.add(entry_id)
+        published = feed_entry_published(entry)
+        if published and (last_published_at is None or published > last_published_at):
+            last_published_at = published
+
+    failed_published = [published for published in map(feed_entry_published, failed_entries) if published]
+    if failed_published and last_published_at is not None:
+        last_published_at = min(last_published_at, min(failed_published))
+
+    return {
+        'last_published_at': last_published_at,
+        'seen_ids': seen_ids[-MAX_SEEN_ENTRY_IDS:]
+    }
+
+def save_keyword_watermarks(updates):
+    """
+    Persist advanced watermarks and per-keyword run stats
+
+    Args:
+        updates (dict): Maps keyword ID to a dict with watermark, new_count
+            and skipped_count
+    """
+    now = datetime.datetime.utcnow()
+    try:
+        for keyword_id, update in updates.items():
+            row = db.session.get(KeywordWatermark, keyword_id) or KeywordWatermark(keyword_id=keyword_id)
+            row.last_published_at = update['watermark']['last_published_at']
+            row.seen_entry_ids = json.dumps(update['watermark']['seen_ids'])
+            row.last_run_at = now
+            row.last_new_count = update['new_count']
+            row.last_skipped_count = update['skipped_count']
+            db.session.add(row)
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error saving keyword watermarks: {str(e)}")
+        db.session.rollback()
+
+    total_skipped = sum(update['skipped_count'] for update in updates.values())
+    total_new = sum(update['new_count'] for update in updates.values())
+    logging.info(f"Watermarks: {total_new} new feed entries processed, {total_skipped} skipped as already collected")